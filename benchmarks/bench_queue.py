@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+"""
+Microbenchmark: the cost per event of EventQueue and DequeEventQueue.
+
+Runs without a display, using a Tcl interpreter (no Tk) to drive the
+file handlers.   For each queue class and configuration it reports the
+time per event spent in ``put`` (the producer side), and in handling
+(the Tk side), with each of the wakeup channels that are available.
+
+Usage::
+
+    python benchmarks/bench_queue.py [events]
+
+"""
+
+import sys
+import time
+
+import tkinter as tk
+import _tkinter
+
+from rjgtoys.tkthread import EventQueue, DequeEventQueue
+from rjgtoys.tkthread.wakeup import available_backends
+
+
+CONFIGS = [
+    ("one per wakeup", dict()),
+    ("batched", dict(max_batch=0)),
+    ("batched, edge-triggered", dict(max_batch=0, edge_triggered=True)),
+]
+
+
+def measure(interp, cls, count, options):
+    """Return the put and handle times per event, in nanoseconds."""
+
+    handled = []
+
+    with cls(handler=handled.append, widget=interp, **options) as q:
+        put = q.put
+
+        start = time.perf_counter()
+        for i in range(count):
+            put(i)
+        put_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        while len(handled) < count:
+            interp.tk.dooneevent(_tkinter.DONT_WAIT)
+        handle_time = time.perf_counter() - start
+
+    return put_time * 1e9 / count, handle_time * 1e9 / count
+
+
+def main(argv=None):
+
+    argv = argv or sys.argv[1:]
+    # Stay well below the size of the wakeup pipe, so level-triggered
+    # puts do not block
+    count = int(argv[0]) if argv else 50000
+
+    interp = tk.Tcl()
+
+    print("%-16s %-26s %-11s %12s %12s" % ("class", "mode", "wakeup", "put ns/ev", "handle ns/ev"))
+    for label, options in CONFIGS:
+        for cls in (EventQueue, DequeEventQueue):
+            for wakeup in available_backends():
+                if wakeup == 'socketpair' and not options.get('edge_triggered'):
+                    # A socket buffer holds only a few hundred one-byte
+                    # writes, so a level-triggered put would block
+                    continue
+                put_ns, handle_ns = measure(interp, cls, count, dict(options, wakeup=wakeup))
+                print("%-16s %-26s %-11s %12.0f %12.0f" % (cls.__name__, label, wakeup, put_ns, handle_ns))
+
+
+if __name__ == "__main__":
+    main()
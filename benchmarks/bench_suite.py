@@ -0,0 +1,416 @@
+#!/usr/bin/python3
+
+"""
+Benchmark suite: rjgtoys.tkthread compared with polling.
+
+Each case runs one or more producer threads that send events to the
+Tk thread, and measures:
+
+ - throughput, in events per second;
+ - the latency from ``put`` to handling of each event (p50, p99, max);
+ - how long the producers spent blocked in ``put``;
+ - the CPU time used by the main (Tk) thread, and by the whole process.
+
+The delivery methods compared are:
+
+``eventqueue``
+    An :class:`~rjgtoys.tkthread.EventQueue` with default settings.
+
+``eventqueue-batched``
+    An :class:`~rjgtoys.tkthread.EventQueue` with ``max_batch=0`` and
+    ``edge_triggered=True``.
+
+``dequeeventqueue``
+    A batched, edge-triggered :class:`~rjgtoys.tkthread.DequeEventQueue`
+    (unbounded cases only).
+
+``eventgenerator``
+    One :class:`~rjgtoys.tkthread.EventGenerator` per producer, sharing an
+    :class:`~rjgtoys.tkthread.EventQueue`.
+
+``poll-idle``
+    A :class:`queue.Queue` emptied by an ``after_idle`` handler that
+    always reschedules itself, as in ``examples/udev_polled.py`` with
+    the delay removed.
+
+``poll-after``
+    A :class:`queue.Queue` emptied by an ``after(10)`` timer.
+
+Cases run in 'flat out' mode, where producers put events as fast as
+they can, and in 'paced' mode, where each producer puts events at a
+fixed rate; paced runs show the CPU cost of waiting for events.
+
+If there is an X display (for example under ``xvfb-run``) a real Tk
+interpreter is used, otherwise a Tcl interpreter without Tk, which
+has the same event loop.
+
+Usage::
+
+    python benchmarks/bench_suite.py [--quick] [--output results.json]
+    python benchmarks/bench_suite.py --compare old.json new.json
+
+The JSON output contains one record per case, so that results from
+different versions can be compared (see ``--compare``).
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+
+import tkinter as tk
+import _tkinter
+
+from rjgtoys.tkthread import EventQueue, DequeEventQueue, EventGenerator
+from rjgtoys.tkthread.wakeup import available_backends
+
+
+POLL_INTERVAL_MS = 10
+
+# Options for every queue; see --wakeup
+
+QUEUE_OPTIONS = {}
+
+
+def make_interp(use_tk=None):
+    """Create an interpreter to run the event loop."""
+
+    if use_tk is None:
+        use_tk = bool(os.environ.get('DISPLAY'))
+
+    if use_tk:
+        root = tk.Tk()
+        root.withdraw()
+        return root
+
+    return tk.Tcl()
+
+
+class Recorder:
+    """Collects the results of a run, in the Tk thread."""
+
+    def __init__(self, total):
+        self.total = total
+        self.latencies = []
+
+    @property
+    def done(self):
+        return len(self.latencies) >= self.total
+
+    def handle(self, event):
+        self.latencies.append(time.perf_counter() - event[0])
+
+
+class Producer:
+    """Generates stamped events, optionally at a fixed rate.
+
+    Each event carries a new payload of ``payload_size`` bytes, so that
+    the cost of allocating and freeing payloads is part of the measurement.
+    """
+
+    def __init__(self, count, payload_size, rate):
+        self.count = count
+        self.payload_size = payload_size
+        self.interval = 1.0 / rate if rate else 0.0
+        self.blocked = 0.0
+        self.max_blocked = 0.0
+
+    def _record(self, elapsed):
+        self.blocked += elapsed
+        if elapsed > self.max_blocked:
+            self.max_blocked = elapsed
+
+    def _pace(self, start, i):
+        if self.interval:
+            delay = start + i * self.interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def feed(self, put):
+        """Put events by calling ``put``, timing each call."""
+
+        start = time.perf_counter()
+        for i in range(self.count):
+            self._pace(start, i)
+            payload = bytes(self.payload_size)
+            t = time.perf_counter()
+            put((t, payload))
+            self._record(time.perf_counter() - t)
+
+    def generate(self):
+        """Yield events; the time until the next call is counted as blocked."""
+
+        start = time.perf_counter()
+        for i in range(self.count):
+            self._pace(start, i)
+            payload = bytes(self.payload_size)
+            t = time.perf_counter()
+            yield (t, payload)
+            self._record(time.perf_counter() - t)
+
+
+def run_loop(interp, recorder):
+    """Run the event loop until all the events have been handled."""
+
+    while not recorder.done:
+        interp.tk.dooneevent(_tkinter.ALL_EVENTS)
+
+
+def _with_threads(producers, put):
+    threads = [threading.Thread(target=p.feed, args=(put,), daemon=True) for p in producers]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def run_eventqueue(interp, recorder, producers, maxsize, cls=EventQueue, **options):
+
+    options = dict(QUEUE_OPTIONS, **options)
+    with cls(handler=recorder.handle, widget=interp, **dict(options, **({'maxsize': maxsize} if maxsize else {}))) as q:
+        threads = _with_threads(producers, q.put)
+        run_loop(interp, recorder)
+        for t in threads:
+            t.join()
+
+
+def run_eventgenerator(interp, recorder, producers, maxsize):
+
+    with EventQueue(handler=recorder.handle, widget=interp, maxsize=maxsize, **QUEUE_OPTIONS) as q:
+        generators = [EventGenerator(generator=p.generate(), queue=q) for p in producers]
+        run_loop(interp, recorder)
+        for g in generators:
+            g.join()
+
+
+def _drain_queue(q, recorder):
+    while True:
+        try:
+            event = q.get_nowait()
+        except queue.Empty:
+            return
+        recorder.handle(event)
+
+
+def run_poll_idle(interp, recorder, producers, maxsize):
+
+    q = queue.Queue(maxsize)
+
+    def poll():
+        _drain_queue(q, recorder)
+        if not recorder.done:
+            interp.after_idle(poll)
+
+    interp.after_idle(poll)
+    threads = _with_threads(producers, q.put)
+    run_loop(interp, recorder)
+    for t in threads:
+        t.join()
+
+
+def run_poll_after(interp, recorder, producers, maxsize):
+
+    q = queue.Queue(maxsize)
+
+    def poll():
+        _drain_queue(q, recorder)
+        if not recorder.done:
+            interp.after(POLL_INTERVAL_MS, poll)
+
+    interp.after(POLL_INTERVAL_MS, poll)
+    threads = _with_threads(producers, q.put)
+    run_loop(interp, recorder)
+    for t in threads:
+        t.join()
+
+
+METHODS = {
+    'eventqueue': run_eventqueue,
+    'eventqueue-batched': lambda *args: run_eventqueue(
+        *args, max_batch=0, edge_triggered=True
+    ),
+    'dequeeventqueue': lambda interp, recorder, producers, maxsize: run_eventqueue(
+        interp, recorder, producers, 0, cls=DequeEventQueue, max_batch=0, edge_triggered=True
+    ),
+    'eventgenerator': run_eventgenerator,
+    'poll-idle': run_poll_idle,
+    'poll-after': run_poll_after,
+}
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_case(interp, method, producers, count, payload_size, maxsize, rate):
+    """Run one case, and return a dictionary of results."""
+
+    if method == 'dequeeventqueue' and maxsize:
+        return None
+
+    workers = [Producer(count, payload_size, rate) for _ in range(producers)]
+    recorder = Recorder(count * producers)
+
+    cpu_main = time.thread_time()
+    cpu_process = time.process_time()
+    start = time.perf_counter()
+
+    METHODS[method](interp, recorder, workers, maxsize)
+
+    elapsed = time.perf_counter() - start
+    cpu_main = time.thread_time() - cpu_main
+    cpu_process = time.process_time() - cpu_process
+
+    latencies = sorted(recorder.latencies)
+
+    return dict(
+        method=method,
+        producers=producers,
+        count=count,
+        payload_size=payload_size,
+        maxsize=maxsize,
+        rate=rate,
+        elapsed=elapsed,
+        throughput=recorder.total / elapsed,
+        latency_p50=percentile(latencies, 0.5),
+        latency_p99=percentile(latencies, 0.99),
+        latency_max=latencies[-1],
+        producer_blocked=sum(w.blocked for w in workers),
+        producer_blocked_max=max(w.max_blocked for w in workers),
+        cpu_main=cpu_main,
+        cpu_main_fraction=cpu_main / elapsed,
+        cpu_process=cpu_process,
+    )
+
+
+def cases(quick=False):
+    """Generate the parameters of each case."""
+
+    producer_counts = (1, 4) if quick else (1, 2, 4, 8)
+    payload_sizes = (16, 65536)
+    maxsizes = (0, 100)
+
+    flat_count = 2000 if quick else 20000
+    paced_count, paced_rate = (200, 1000) if quick else (1000, 1000)
+
+    for method in METHODS:
+        for producers in producer_counts:
+            for payload_size in payload_sizes:
+                for maxsize in maxsizes:
+                    yield dict(
+                        method=method, producers=producers, count=flat_count // producers,
+                        payload_size=payload_size, maxsize=maxsize, rate=0
+                    )
+        # Paced: what does it cost to wait for events?
+        yield dict(
+            method=method, producers=1, count=paced_count,
+            payload_size=16, maxsize=0, rate=paced_rate
+        )
+
+
+def case_key(result):
+    return (
+        result['method'], result['producers'], result['payload_size'],
+        result['maxsize'], result['rate']
+    )
+
+
+def print_result(r, out=sys.stdout):
+    print(
+        "%-20s p=%d size=%-6d max=%-4d rate=%-5d %10.0f ev/s  p50 %8.1fus  p99 %9.1fus  "
+        "blocked %7.3fs  main cpu %5.1f%%" % (
+            r['method'], r['producers'], r['payload_size'], r['maxsize'], r['rate'],
+            r['throughput'], r['latency_p50'] * 1e6, r['latency_p99'] * 1e6,
+            r['producer_blocked'], r['cpu_main_fraction'] * 100
+        ),
+        file=out
+    )
+
+
+def compare(old_path, new_path, threshold=0.2):
+    """Report cases whose throughput or latency got worse by more than ``threshold``.
+
+    Returns the number of regressions.
+    """
+
+    with open(old_path) as f:
+        old = {case_key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {case_key(r): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for key, n in sorted(new.items()):
+        o = old.get(key)
+        if o is None:
+            continue
+        worse = []
+        if n['throughput'] < o['throughput'] * (1 - threshold):
+            worse.append("throughput %.0f -> %.0f ev/s" % (o['throughput'], n['throughput']))
+        if n['latency_p99'] > o['latency_p99'] * (1 + threshold):
+            worse.append("p99 %.1f -> %.1f us" % (o['latency_p99'] * 1e6, n['latency_p99'] * 1e6))
+        if worse:
+            regressions += 1
+            print("%s: %s" % (" ".join(str(k) for k in key), "; ".join(worse)))
+
+    print("%d regression(s)" % (regressions,))
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark rjgtoys.tkthread")
+    parser.add_argument('--quick', action='store_true', help="Run fewer, smaller cases")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--method', action='append', choices=sorted(METHODS),
+        help="Run only this method (may be repeated)")
+    parser.add_argument('--tk', action='store_true', default=None,
+        help="Require a real Tk interpreter (needs a display)")
+    parser.add_argument('--wakeup', choices=available_backends(),
+        help="Use this wakeup channel for the rjgtoys.tkthread queues")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+        help="Compare two result files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare) else 0
+
+    if args.wakeup:
+        QUEUE_OPTIONS['wakeup'] = args.wakeup
+
+    interp = make_interp(args.tk)
+
+    results = []
+    for case in cases(args.quick):
+        if args.method and case['method'] not in args.method:
+            continue
+        result = run_case(interp, **case)
+        if result is None:
+            continue
+        print_result(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(
+                dict(
+                    python=platform.python_version(),
+                    tcl=interp.tk.call('info', 'patchlevel'),
+                    tk=isinstance(interp, tk.Tk),
+                    platform=platform.platform(),
+                    wakeup=QUEUE_OPTIONS.get('wakeup', 'default'),
+                    time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    results=results,
+                ),
+                f, indent=1
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+"""
+Microbenchmark: the cost of each kind of wakeup channel.
+
+Measures the time per wakeup to signal a channel and consume the wakeup,
+both one at a time (as a level-triggered queue with ``max_batch=1`` does)
+and in bursts of 100 consumed together (as a batched queue does).
+It also measures consuming wakeups one at a time from a backlog, as a
+level-triggered queue with ``max_batch=1`` does when producers get ahead
+of the Tk thread; the channel is created as such a queue creates it.
+No Tcl interpreter is involved, so this isolates the system calls.
+
+Usage::
+
+    python benchmarks/bench_wakeup.py [wakeups]
+
+"""
+
+import sys
+import time
+
+from rjgtoys.tkthread.wakeup import available_backends, make_wakeup
+
+
+BURST = 100
+
+# The backlog for the backlog case; a pipe holds at most 64KiB of wakeups
+
+BACKLOG = 20000
+
+
+def measure(backend, count, burst):
+    """Return the time per wakeup, in nanoseconds."""
+
+    channel = make_wakeup(backend)
+    try:
+        start = time.perf_counter()
+        for _ in range(count // burst):
+            for _ in range(burst):
+                channel.signal(1)
+            channel.consume(burst)
+        return (time.perf_counter() - start) * 1e9 / count
+    finally:
+        channel.close()
+
+
+def measure_backlog(backend, count):
+    """Return the time to consume one wakeup from a backlog, in nanoseconds."""
+
+    channel = make_wakeup(backend, one_at_a_time=True)
+    try:
+        elapsed = 0.0
+        for _ in range(max(count // BACKLOG, 1)):
+            channel.signal(BACKLOG)
+            start = time.perf_counter()
+            for _ in range(BACKLOG):
+                channel.consume(1)
+            elapsed += time.perf_counter() - start
+        return elapsed * 1e9 / (max(count // BACKLOG, 1) * BACKLOG)
+    finally:
+        channel.close()
+
+
+def main(argv=None):
+
+    argv = argv or sys.argv[1:]
+    count = int(argv[0]) if argv else 200000
+
+    print("%-11s %14s %14s %14s" % ("wakeup", "single ns", "burst ns", "backlog ns"))
+    for backend in available_backends():
+        single = min(measure(backend, count, 1) for _ in range(3))
+        burst = min(measure(backend, count, BURST) for _ in range(3))
+        backlog = min(measure_backlog(backend, count) for _ in range(3))
+        print("%-11s %14.0f %14.0f %14.0f" % (backend, single, burst, backlog))
+
+
+if __name__ == "__main__":
+    main()
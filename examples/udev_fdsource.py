@@ -0,0 +1,66 @@
+"""
+Monitor udev, with tkinter and tkthread.fdsource.FdEventSource
+
+There is no thread here at all: the Tk event loop watches the netlink
+socket of the udev monitor, and reads each event when it arrives.
+
+"""
+
+import tkinter as tk
+
+import pyudev
+
+from rjgtoys.tkthread.fdsource import FdEventSource
+
+
+class UdevTracer:
+
+    def __init__(self, widget):
+
+        self.widget = widget
+
+        self.cleanup()
+
+        context = pyudev.Context()
+        monitor = pyudev.Monitor.from_netlink(context)
+        monitor.start()
+
+        self.source = FdEventSource(
+            monitor,
+            handler=self.notify,
+            reader=lambda: monitor.poll(timeout=0),
+            widget=widget
+        )
+
+    def notify(self, device):
+
+        msg = "Event: {0}".format(device)
+        self.add_message(msg)
+
+    def cleanup(self):
+        self.reset()
+        self.widget.update()
+        self.widget.after(5000, self.cleanup)
+
+    def reset(self):
+        self.widget.delete('1.0','end')
+        self.widget.insert('1.0','Wait, or kill the window\n')
+
+    def add_message(self, msg):
+        self.widget.insert('end',msg)
+        self.widget.insert('end', '\n')
+
+
+def main():
+
+    root = tk.Tk()
+
+    w = tk.Text(root)
+
+    tracer = UdevTracer(w)
+
+    w.pack()
+    w.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,436 @@
 
 .. autoclass:: EventQueue
 
+.. autoclass:: DequeEventQueue
+
+.. autoclass:: ConflatingEventQueue
+
+.. autoclass:: PriorityEventQueue
+
+.. autoclass:: Throttle
+
 .. autoclass:: EventGenerator
 
 """
 
-import os
+import concurrent.futures
+import math
 import queue
 import threading
+import time
+
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from itertools import islice
 
 import tkinter as tk
 
+from rjgtoys.tkthread.wakeup import WakeupHub, make_wakeup
+
 import logging
 
 log = logging.getLogger(__name__)
 
+# Upper limit on the number of wakeups consumed at once
+
+_READ_ALL = 65536
+
+# Overflow policies for bounded queues
+
+_BLOCK = 'block'
+_DROP_NEWEST = 'drop_newest'
+_DROP_OLDEST = 'drop_oldest'
+_COALESCE = 'coalesce'
+
+
+# Weight given to each new measurement in the running average of handler cost
+
+_COST_SMOOTHING = 0.25
+
+
+class _Stamped:
+    """An event, with the time at which it was put into a queue."""
+
+    __slots__ = ('event', 'time')
+
+    def __init__(self, event, when=None):
+        self.event = event
+        self.time = time.perf_counter() if when is None else when
+
+
+def _stamp_all(events):
+    """Return a list of :class:`_Stamped` events, all with the current time."""
+
+    now = time.perf_counter()
+    return [_Stamped(event, now) for event in events]
+
+
+def _payload(item):
+    """Return the event from an item that may have been stamped."""
+
+    return item.event if type(item) is _Stamped else item
+
+
+# Upper bounds of the buckets of the latency histogram, in seconds
+
+_LATENCY_BOUNDS = (
+    0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5, 1.0, 2.0, 5.0, math.inf
+)
+
+
+class _QueueStats:
+    """Statistics collected by an instrumented queue.
+
+    All the updates happen in the Tk thread, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.wakeups = 0
+        self.max_depth = 0
+        self.handler_time = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_counts = [0] * len(_LATENCY_BOUNDS)
+
+    def wakeup(self, depth):
+        self.wakeups += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def unwrap(self, items):
+        """Record the latency of some stamped events, and return the events."""
+
+        now = time.perf_counter()
+        counts = self.latency_counts
+        events = []
+        for item in items:
+            latency = now - item.time
+            self.latency_total += latency
+            if latency > self.latency_max:
+                self.latency_max = latency
+            counts[bisect_left(_LATENCY_BOUNDS, latency)] += 1
+            events.append(item.event)
+        return events
+
+    def handled(self, count, elapsed):
+        self.events += count
+        self.handler_time += elapsed
+
+    def percentile(self, fraction):
+        """Estimate a percentile of the latency, from the histogram."""
+
+        target = fraction * self.events
+        seen = 0
+        for bound, count in zip(_LATENCY_BOUNDS, self.latency_counts):
+            seen += count
+            if count and seen >= target:
+                return min(bound, self.latency_max)
+        return 0.0
+
+    def snapshot(self, depth):
+        return dict(
+            events=self.events,
+            wakeups=self.wakeups,
+            events_per_wakeup=self.events / self.wakeups if self.wakeups else 0.0,
+            depth=depth,
+            max_depth=max(self.max_depth, depth),
+            handler_time=self.handler_time,
+            latency=dict(
+                mean=self.latency_total / self.events if self.events else 0.0,
+                max=self.latency_max,
+                p50=self.percentile(0.5),
+                p99=self.percentile(0.99),
+                histogram=list(zip(_LATENCY_BOUNDS, self.latency_counts)),
+            ),
+        )
+
+
+class _EventDispatcher:
+    """The parts of an event queue that deal with the Tk event loop.
+
+    Subclasses provide the storage for events, by implementing
+    ``put``, ``put_many``, ``qsize`` and ``_take``.
+    """
+
+    def __init__(
+        self, handler=None, widget=None, *,
+        max_batch=1, edge_triggered=False, batch_handler=None, time_budget=None,
+        max_rate=None, throttle_key=None,
+        instrument=False, stats_callback=None, stats_interval=1.0,
+        shared_wakeup=False, wakeup=None
+        ):
+
+        if (handler is None) == (batch_handler is None):
+            raise ValueError(
+                "%s needs exactly one of handler and batch_handler" % (type(self).__name__)
+            )
+
+        widget = widget or tk._default_root
+
+        if max_rate is not None:
+            if handler is None:
+                raise ValueError("max_rate can only be used with a handler, not a batch_handler")
+            handler = Throttle(handler, max_rate, widget=widget, key=throttle_key)
+
+        self._handler = handler
+        self._batch_handler = batch_handler
+        self._max_batch = max_batch if max_batch > 0 else _READ_ALL
+        self._edge_triggered = edge_triggered
+        self._wakeup_pending = False
+        self._time_budget = time_budget
+        self._resume_pending = False
+        self._event_cost = None
+        self._room_waiters = []
+
+        self._widget = widget
+        if shared_wakeup:
+            self._channel = None
+            self._hub = WakeupHub.for_widget(widget)
+            self._hub.register(self)
+        else:
+            self._hub = None
+            one_at_a_time = not edge_triggered and self._max_batch == 1 and time_budget is None
+            self._channel = make_wakeup(wakeup, one_at_a_time=one_at_a_time)
+            widget.tk.createfilehandler(self._channel.fileno(), tk.READABLE, self._readable)
+
+        self._stats = _QueueStats() if (instrument or stats_callback) else None
+        self._stats_callback = stats_callback
+        self._stats_interval = int(stats_interval * 1000)
+        self._stats_timer = None
+        if stats_callback is not None:
+            self._stats_timer = widget.after(self._stats_interval, self._report_stats)
+
+    def stats(self):
+        """Return a snapshot of the statistics of an instrumented queue; see :meth:`EventQueue.stats`."""
+
+        if self._stats is None:
+            raise RuntimeError("%s was not created with instrument=True" % (type(self).__name__))
+
+        return self._stats.snapshot(self.qsize())
+
+    def drain(self):
+        """Close the queue for further events, and process any that are waiting."""
+
+        # Stop watching the wakeup channel, and close it; nothing
+        # may be put once it is closed, so forget anyone waiting for room.
+
+        self._room_waiters = []
+        if self._hub is not None:
+            self._hub.unregister(self)
+        else:
+            self._widget.tk.deletefilehandler(self._channel.fileno())
+            self._channel.close()
+
+        # Process all pending events
+
+        self._flush()
+
+        if isinstance(self._handler, Throttle):
+            self._handler.flush()
+
+        if self._stats_timer is not None:
+            self._widget.after_cancel(self._stats_timer)
+            self._stats_timer = None
+            self._stats_callback(self.stats())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.drain()
+
+    def _flush(self):
+        """Process all the events that are waiting, without closing the queue."""
+
+        while True:
+            events = self._take(self._max_batch)
+            if not events:
+                break
+            self._dispatch(events)
+
+    def _readable(self, what, how):
+
+        if self._stats is not None:
+            self._stats.wakeup(self.qsize())
+
+        if self._time_budget is not None:
+            # Anything waiting is dealt with by _run_slice, which
+            # arranges to be called again if it runs out of time.
+
+            self._consume(_READ_ALL)
+            self._wakeup_pending = False
+            if not self._resume_pending:
+                self._run_slice()
+            return
+
+        if self._edge_triggered:
+            # Clear the pending flag before looking at the queue, so that
+            # anything put after this point will signal again.
+
+            self._consume(_READ_ALL)
+            self._wakeup_pending = False
+            events = self._take(self._max_batch)
+        else:
+            # There is one wakeup in the channel for each event in the queue,
+            # so consuming up to max_batch of them says how many events to
+            # handle.   Any left over will cause another callback.
+
+            events = self._take(self._consume(self._max_batch))
+
+        self._dispatch(events)
+
+        # If max_batch left some events behind, make sure there
+        # will be another callback to deal with them.
+
+        if self._edge_triggered and self._pending():
+            self._wakeup()
+
+    def _hub_ready(self):
+        """Called by a :class:`~rjgtoys.tkthread.wakeup.WakeupHub` when this queue has been signalled."""
+
+        self._readable(None, None)
+
+    def _consume(self, limit):
+        """Consume up to ``limit`` wakeups, and return the number consumed."""
+
+        if self._hub is not None:
+            return self._hub.consume(self, limit)
+        return self._channel.consume(limit)
+
+    def _run_slice(self):
+        """Handle events until the queue is empty or the time budget is spent.
+
+        Events are taken in batches sized so that each batch should fit in the
+        time remaining, according to a running average of the cost per event.
+        If the budget runs out, the rest of the queue is left for another
+        slice, which is started only after Tk has had a chance to deal with
+        pending redraws and input.
+        """
+
+        now = time.perf_counter()
+        deadline = now + self._time_budget
+
+        while now < deadline:
+            if self._event_cost is None:
+                count = 1
+            elif self._event_cost > 0:
+                count = int((deadline - now) / self._event_cost) or 1
+            else:
+                count = self._max_batch
+            events = self._take(min(count, self._max_batch))
+            if not events:
+                break
+
+            self._dispatch(events)
+
+            done = time.perf_counter()
+            cost = (done - now) / len(events)
+            if self._event_cost is None:
+                self._event_cost = cost
+            else:
+                self._event_cost += (cost - self._event_cost) * _COST_SMOOTHING
+            now = done
+
+        self._resume_pending = bool(self._pending())
+        if self._resume_pending:
+            # 'after idle' lets redraws happen, then 'after 0'
+            # waits for any other events that are pending.
+
+            self._widget.after_idle(self._widget.after, 0, self._resume)
+
+    def _resume(self):
+        self._resume_pending = False
+        self._run_slice()
+
+    def _pending(self):
+        """Return the number of events waiting for the next dispatch cycle."""
+
+        return self.qsize()
+
+    def _wakeup(self, count=1):
+        """Make sure the Tk event loop will notice ``count`` new events."""
+
+        if self._edge_triggered:
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+            count = 1
+
+        if self._hub is not None:
+            self._hub.signal(self, count)
+        else:
+            self._channel.signal(count)
+
+    def _dispatch(self, events):
+        """Pass a list of events to the handler."""
 
-class EventQueue(queue.Queue):
+        if self._stats is None:
+            self._deliver(events)
+        else:
+            events = self._stats.unwrap(events)
+            start = time.perf_counter()
+            self._deliver(events)
+            self._stats.handled(len(events), time.perf_counter() - start)
+
+        if self._room_waiters:
+            self._check_room()
+
+    def _when_room(self, callback, level):
+        """Call ``callback()``, once, when a dispatch leaves ``level`` or fewer events waiting.
+
+        This lets something that puts events from the Tk thread wait for
+        the queue to empty without polling it.
+        """
+
+        self._room_waiters.append((level, callback))
+
+    def _check_room(self):
+        depth = self.qsize()
+        waiters = self._room_waiters
+        self._room_waiters = [w for w in waiters if w[0] < depth]
+        for level, callback in waiters:
+            if level < depth:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                log.exception("Exception raised by room callback")
+
+    def _deliver(self, events):
+        if self._batch_handler is not None:
+            if not events:
+                return
+            try:
+                self._batch_handler(events)
+            except Exception as e:
+                log.exception("Exception raised by event handler")
+            return
+
+        for event in events:
+            try:
+                self._handler(event)
+            except Exception as e:
+                log.exception("Exception raised by event handler")
+
+    def _report_stats(self):
+        self._stats_timer = self._widget.after(self._stats_interval, self._report_stats)
+        try:
+            self._stats_callback(self.stats())
+        except Exception as e:
+            log.exception("Exception raised by stats callback")
+
+    def put_nowait(self, event):
+        """Add an event to the queue without waiting.
+
+        Either puts the event, or raises :exc:`queue.Full` immediately.
+        """
+
+        return self.put(event, block=False)
+
+
+class EventQueue(_EventDispatcher, queue.Queue):
     """This is a subclass of the standard library :class:`queue.Queue`.
 
     An :class:`~rjgtoys.tkthread.EventQueue` feeds any objects sent to it into a
@@ -34,6 +448,13 @@ class EventQueue(queue.Queue):
         event loop and may interact with tkinter objects, however note that it is
         *not* passed the ``widget`` that was passed to the :class:`EventQueue` constructor.
 
+    ``batch_handler``
+        An alternative to ``handler``, for handlers that can deal with many events
+        more cheaply than one at a time.
+        It is called as ``batch_handler(events)`` where ``events`` is a list of all
+        the events taken from the queue in one dispatch cycle (see ``max_batch``).
+        Exactly one of ``handler`` and ``batch_handler`` must be passed.
+
     ``widget``
         A tkinter widget, or ``None`` to use the default root widget.
         This widget reference is used to create a Tk event handler; it
@@ -44,6 +465,101 @@ class EventQueue(queue.Queue):
         The maximum size of the queue.
         If ``maxsize <= 0`` the size is not limited.
 
+    ``overflow``
+        What to do with an event that is put when the queue already holds
+        ``maxsize`` events:
+
+        ``'block'``
+            The default: wait for room, as :meth:`queue.Queue.put` does
+            (or raise :exc:`queue.Full`; see :meth:`put`).
+
+        ``'drop_newest'``
+            Discard the new event.
+
+        ``'drop_oldest'``
+            Discard the oldest waiting event to make room for the new one.
+
+        ``'coalesce'``
+            Merge the new event into the newest waiting event, by replacing that
+            event with ``coalesce(waiting, new)``, which might for example
+            return a summary of both.
+
+        With any policy other than ``'block'``, putting an event never
+        waits, and never raises :exc:`queue.Full`.   The number of events
+        that were dropped or coalesced is available as :attr:`dropped`,
+        and is included in :meth:`stats`.
+
+    ``coalesce``
+        The function that merges events, for ``overflow='coalesce'``.
+
+    ``max_batch``
+        The maximum number of events to handle each time the Tk event
+        loop notices that events are waiting.
+        The default, ``1``, handles one event per wakeup.   Larger values
+        let a burst of events be handled in a single callback, which is
+        much cheaper than a trip through the Tk event loop per event.
+        If ``max_batch <= 0`` every waiting event is handled at once.
+
+    ``edge_triggered``
+        If ``False`` (the default), every :meth:`put` signals the
+        channel that wakes up the Tk event loop (see ``wakeup``).
+        If ``True``, the channel is signalled only when no wakeup is already
+        pending, and the Tk side handles everything that is waiting
+        (subject to ``max_batch``) when it wakes.   That reduces the
+        cost of a burst of events to about one system call, and means
+        a fast producer can never be blocked by a full wakeup pipe.
+        This is normally combined with a ``max_batch`` other than ``1``.
+
+    ``time_budget``
+        If not ``None``, the maximum time, in seconds, to spend handling events
+        before giving Tk a chance to redraw and respond to input - for example
+        ``0.008`` to leave most of each 60Hz frame to Tk.
+        When the budget is spent the queue reschedules itself using ``after_idle``
+        and continues later, so a large backlog cannot freeze the UI.
+        Events are handled in batches sized from the measured cost of the handler,
+        and ``max_batch`` limits the size of each batch rather than the number of
+        events per wakeup.
+
+    ``max_rate``
+        If not ``None``, the maximum number of times per second to call
+        the ``handler``.   Events that arrive faster than this are not all
+        delivered: the handler is called with the latest event when the
+        interval since the previous call has passed, so the final event
+        of a burst is always delivered.   See :class:`Throttle`.
+
+    ``throttle_key``
+        A callable that returns a key for an event, to apply ``max_rate``
+        separately to each key instead of to all events together.
+
+    ``instrument``
+        If ``True``, the queue collects statistics about its performance,
+        such as the time between :meth:`put` and handling of each event.
+        See :meth:`stats`.   The default is ``False``, which avoids the
+        (small) cost of doing so.
+
+    ``stats_callback``
+        A callable to be called from the Tk event loop, as ``stats_callback(stats)``,
+        every ``stats_interval`` seconds, and once more when the queue is drained,
+        where ``stats`` is the result of :meth:`stats`.   Passing a ``stats_callback``
+        implies ``instrument=True``.
+
+    ``stats_interval``
+        The interval, in seconds, between calls of ``stats_callback``.
+        The default is ``1.0``.
+
+    ``shared_wakeup``
+        If ``True``, the queue does not have a wakeup channel of its own, but
+        shares one (and a single Tk file handler) with all the other queues
+        for the same Tcl interpreter that were created with ``shared_wakeup=True``.
+        This saves file descriptors, and makes the Tk event loop cheaper,
+        in an application that has many queues.
+        See :class:`~rjgtoys.tkthread.wakeup.WakeupHub`.
+
+    ``wakeup``
+        The kind of channel used to wake up the Tk event loop: ``'eventfd'``
+        (only on Linux), ``'pipe'`` or ``'socketpair'``, or ``None`` (the default)
+        for the fastest that is available.   See :mod:`rjgtoys.tkthread.wakeup`.
+
 
     TODO: talk about exceptions from handler, and how to feed events in.
 
@@ -58,62 +574,38 @@ class EventQueue(queue.Queue):
 
     .. automethod:: put
     .. automethod:: put_nowait
+    .. automethod:: put_many
     .. automethod:: drain
+    .. automethod:: stats
 
     """
 
-    def __init__(self, handler, widget=None, maxsize=0):
-
-        super().__init__(maxsize)
-        self._pipe_r, self._pipe_w = os.pipe()
-        self._handler = handler
-
-        widget = widget or tk._default_root
-        widget.tk.createfilehandler(self._pipe_r, tk.READABLE, self._readable)
-
-    def drain(self):
-        """Close the queue for further events, and process any that are waiting."""
-
-        # Close the pipe
-
-        for p in (self._pipe_r, self._pipe_w):
-            try:
-                os.close(p)
-            except OSError:
-                pass
+    # The overflow policies that the storage supports
 
-        # Process all pending events
-
-        while True:
-            try:
-                event = self.get(block=False)
-            except queue.Empty:
-                break
-
-            try:
-                self._handler(event)
-            except Exception as e:
-                log.exception("Exception raised by event handler")
+    _overflow_policies = (_BLOCK, _DROP_NEWEST, _DROP_OLDEST, _COALESCE)
 
-    def __enter__(self):
-        return self
+    def __init__(self, handler=None, widget=None, maxsize=0, overflow=_BLOCK, coalesce=None, **options):
 
-    def __exit__(self, typ, val, tbk):
-        self.drain()
+        if overflow not in self._overflow_policies:
+            raise ValueError("overflow must be one of %s" % (', '.join(map(repr, self._overflow_policies)),))
+        if (overflow == _COALESCE) != (coalesce is not None):
+            raise ValueError("coalesce must be given if, and only if, overflow is 'coalesce'")
 
-    def _readable(self, what, how):
+        self._overflow = overflow if maxsize > 0 else _BLOCK
+        self._coalesce = coalesce
+        self.dropped = 0
 
-        _ = os.read(self._pipe_r, 1)
+        queue.Queue.__init__(self, maxsize)
+        _EventDispatcher.__init__(self, handler=handler, widget=widget, **options)
 
-        try:
-            event = self.get(block=False)
-        except queue.Empty:
-            return
+    def _take(self, count):
+        """Remove up to ``count`` events from the queue, and return them as a list."""
 
-        try:
-            self._handler(event)
-        except Exception as e:
-            log.exception("Exception raised by event handler")
+        with self.not_full:
+            events = [self._get() for _ in range(min(count, self._qsize()))]
+            if events:
+                self.not_full.notify(len(events))
+        return events
 
     def put(self, event, block=True, timeout=None):
         """Add an event to the queue.
@@ -129,16 +621,619 @@ class EventQueue(queue.Queue):
            Ignored if ``block`` is ``False``.
         """
 
+        if self._overflow != _BLOCK:
+            self.put_many((event,))
+            return
+
+        if self._stats is not None:
+            event = _Stamped(event)
         super().put(event, block=block, timeout=timeout)
-        os.write(self._pipe_w, b"x")
+        self._wakeup()
 
-    def put_nowait(self, event):
+    def put_many(self, events, block=True, timeout=None):
+        """Add a number of events to the queue.
+
+        ``events``
+           An iterable that provides the events to add, in order.
+
+        ``block`` and ``timeout`` are as for :meth:`put`.
+
+        The whole batch is added under a single acquisition of the
+        queue lock, and needs only one write to wake up the Tk event loop.
+        If the queue has a ``maxsize`` and the batch does not fit, as
+        many events as will fit are added (and made available to the
+        handler) before waiting for more space.   If :exc:`queue.Full`
+        is raised, the events before the one that did not fit will
+        already have been queued.
+        """
+
+        if self._stats is not None:
+            events = _stamp_all(events)
+        self._put_items(events, block, timeout)
+
+    def _put_items(self, items, block, timeout):
+        """Add items to the storage, without timestamping them."""
+
+        events = list(items)
+
+        if timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        endtime = None if timeout is None else time.monotonic() + timeout
+
+        while events:
+            with self.not_full:
+                if self._overflow != _BLOCK:
+                    batch, events = events, []
+                elif self.maxsize > 0:
+                    while self._qsize() >= self.maxsize:
+                        if not block:
+                            raise queue.Full
+                        if endtime is None:
+                            self.not_full.wait()
+                        else:
+                            remaining = endtime - time.monotonic()
+                            if remaining <= 0.0:
+                                raise queue.Full
+                            self.not_full.wait(remaining)
+                    room = self.maxsize - self._qsize()
+                    batch, events = events[:room], events[room:]
+                else:
+                    batch, events = events, []
+
+                # Subclasses may merge events, so count what was really added
+
+                before = self._qsize()
+                if self._overflow != _BLOCK:
+                    for event in batch:
+                        self._offer(event)
+                else:
+                    for event in batch:
+                        self._put(event)
+                added = self._qsize() - before
+                self.unfinished_tasks += added
+                self.not_empty.notify(added)
+
+            # Not while holding the lock: the Tk side needs it to make
+            # room in the wakeup channel if this write has to block.
+
+            if added:
+                self._wakeup(added)
+
+
+    def _offer(self, item):
+        """Add an item to the storage, applying the overflow policy if it is full."""
+
+        if self._qsize() < self.maxsize:
+            self._put(item)
+            return
+
+        self.dropped += 1
+        if self._overflow == _DROP_OLDEST:
+            self._get()
+            self._put(item)
+        elif self._overflow == _COALESCE:
+            self._coalesce_newest(item)
+
+    def _coalesce_newest(self, item):
+        """Merge an item into the newest item in the storage."""
+
+        newest = self.queue[-1]
+        if type(newest) is _Stamped:
+            # Keep the older time, so that latency covers both events
+            newest.event = self._coalesce(newest.event, _payload(item))
+        else:
+            self.queue[-1] = self._coalesce(newest, item)
+
+    def stats(self):
+        """Return a snapshot of the statistics of an instrumented queue.
+
+        The queue must have been created with ``instrument=True`` (or a
+        ``stats_callback``).   The result is a dictionary:
+
+        ``events``
+            The number of events handled.
+
+        ``wakeups``
+            The number of times the Tk event loop has woken up to handle events.
+
+        ``events_per_wakeup``
+            The average number of events handled per wakeup.
+
+        ``depth``
+            The number of events currently waiting.
+
+        ``max_depth``
+            The largest number of events found waiting at a wakeup.
+
+        ``handler_time``
+            The total time, in seconds, spent in the handler.
+
+        ``latency``
+            A dictionary describing the time from :meth:`put` to the
+            start of handling of each event, in seconds:
+            ``mean``, ``max``, ``p50`` and ``p99``, and ``histogram``, a list
+            of ``(upper_bound, count)`` pairs.   The percentiles are
+            estimated from the histogram, and so are really upper bounds.
+
+        ``dropped``
+            The number of events that were dropped or coalesced by the
+            ``overflow`` policy.
+        """
+
+        result = super().stats()
+        result['dropped'] = self.dropped
+        return result
+
+
+class DequeEventQueue(_EventDispatcher):
+    """An unbounded event queue built on :class:`collections.deque`.
+
+    A :class:`DequeEventQueue` behaves like an :class:`EventQueue` with
+    no ``maxsize``, but is not a :class:`queue.Queue`: it relies on the
+    atomic ``append`` and ``popleft`` operations of a deque rather than
+    on locks and condition variables, which makes each event cheaper
+    to put and to handle.
+
+    The constructor parameters are the same as for :class:`EventQueue`,
+    except that there is no ``maxsize``.
+
+    Because the queue can never be full, :meth:`put` never blocks, and the
+    ``block`` and ``timeout`` parameters of :meth:`put` and :meth:`put_many`
+    are accepted only for compatibility with :class:`EventQueue`.
+    There is no ``get``: events can only be consumed by the handler.
+
+    .. automethod:: put
+    .. automethod:: put_nowait
+    .. automethod:: put_many
+    .. automethod:: drain
+
+    """
+
+    def __init__(self, handler=None, widget=None, **options):
+
+        self._events = deque()
+        super().__init__(handler=handler, widget=widget, **options)
+
+    def qsize(self):
+        """Return the number of events waiting to be handled."""
+
+        return len(self._events)
+
+    def _take(self, count):
+        """Remove up to ``count`` events from the queue, and return them as a list."""
+
+        events = []
+        popleft = self._events.popleft
+        try:
+            for _ in range(count):
+                events.append(popleft())
+        except IndexError:
+            pass
+        return events
+
+    def put(self, event, block=True, timeout=None):
+        """Add an event to the queue."""
+
+        if self._stats is not None:
+            event = _Stamped(event)
+        self._events.append(event)
+        self._wakeup()
+
+    def put_many(self, events, block=True, timeout=None):
+        """Add a number of events to the queue, with a single wakeup."""
+
+        events = _stamp_all(events) if self._stats is not None else list(events)
+        if not events:
+            return
+        self._events.extend(events)
+        self._wakeup(len(events))
+
+
+class ConflatingEventQueue(EventQueue):
+    """An :class:`EventQueue` that keeps only the latest event for each key.
+
+    Each event has a key.  If an event is put while another event with
+    the same key is still waiting to be handled, the new event replaces
+    the old one (keeping its place in the queue).   The handler therefore
+    sees at most one event per key in each dispatch cycle, and the amount
+    of work and memory needed is bounded by the number of distinct keys,
+    however fast events are produced.
+
+    This is useful for things like progress reports, where only the
+    most recent value matters.
+
+    The constructor accepts the same parameters as :class:`EventQueue`, and also:
+
+    ``key``
+        A callable that returns the key of an event, as ``key(event)``.
+        If ``None`` (the default), each event must be a ``(key, value)``
+        tuple.   Either way, the handler receives the whole event.
+
+    If there is a ``maxsize``, it limits the number of distinct keys that
+    can be waiting.   The only ``overflow`` policy is ``'block'``.
+
+    The number of events that have been replaced before they could be
+    handled is available as :attr:`conflated`.
+
+    .. automethod:: put
+    .. automethod:: put_nowait
+    .. automethod:: put_many
+    .. automethod:: drain
+
+    """
+
+    _overflow_policies = (_BLOCK,)
+
+    def __init__(self, handler=None, widget=None, maxsize=0, key=None, **options):
+
+        self._key = key or _first
+        self.conflated = 0
+        super().__init__(handler=handler, widget=widget, maxsize=maxsize, **options)
+
+    def put(self, event, block=True, timeout=None):
+        """Add an event to the queue, replacing any waiting event with the same key.
+
+        ``block`` and ``timeout`` are as for :meth:`EventQueue.put`.
+        """
+
+        self.put_many((event,), block=block, timeout=timeout)
+
+    def _put_items(self, items, block, timeout):
+        """Add items to the storage, waiting for room only for new keys.
+
+        An item whose key is already waiting replaces the waiting item,
+        so it needs no room, and never waits or raises :exc:`queue.Full`.
+        """
+
+        if self.maxsize <= 0:
+            super()._put_items(items, block, timeout)
+            return
+
+        events = list(items)
+
+        if timeout is not None and timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        endtime = None if timeout is None else time.monotonic() + timeout
+
+        i = 0
+        while i < len(events):
+            added = 0
+            with self.not_full:
+                while i < len(events):
+                    item = events[i]
+                    if self._key(_payload(item)) not in self.queue:
+                        if self._qsize() >= self.maxsize:
+                            # Make what has been added available before waiting
+                            if added:
+                                break
+                            if not block:
+                                raise queue.Full
+                            if endtime is None:
+                                self.not_full.wait()
+                            else:
+                                remaining = endtime - time.monotonic()
+                                if remaining <= 0.0:
+                                    raise queue.Full
+                                self.not_full.wait(remaining)
+                            continue
+                        added += 1
+                    self._put(item)
+                    i += 1
+                self.unfinished_tasks += added
+                self.not_empty.notify(added)
+
+            if added:
+                self._wakeup(added)
+
+    # The queue.Queue storage hooks
+
+    def _init(self, maxsize):
+        self.queue = OrderedDict()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        k = self._key(_payload(item))
+        if k in self.queue:
+            self.conflated += 1
+        self.queue[k] = item
+
+    def _get(self):
+        return self.queue.popitem(last=False)[1]
+
+    def stats(self):
+        """Return a snapshot of statistics; see :meth:`EventQueue.stats`.
+
+        The result also includes ``conflated``, the number of events that
+        were replaced before they were handled.
+        """
+
+        result = super().stats()
+        result['conflated'] = self.conflated
+        return result
+
+
+class PriorityEventQueue(EventQueue):
+    """An :class:`EventQueue` that handles urgent events first.
+
+    Events are put into one of a number of *lanes*, each of which is a
+    FIFO.   Lane ``0`` is the most urgent; when the handler is called, it
+    is passed events from the most urgent lane that has any waiting.
+    Putting and taking an event costs the same however many are queued.
+
+    The constructor accepts the same parameters as :class:`EventQueue`, and also:
+
+    ``lanes``
+        The number of lanes (priority levels).   The default is ``3``.
+
+    ``idle_lane``
+        If ``True``, the least urgent lane is handled only when Tk is idle
+        (using ``after_idle``), so that events in it never delay input
+        handling or redraws, nor events in the other lanes.
+
+    ``starvation_limit``
+        The number of events that may be taken from more urgent lanes
+        while a less urgent lane is waiting.   When the limit is reached,
+        one event is taken from the waiting lane that has been served least
+        recently.   ``None`` or ``0`` disables this guard.
+        The idle lane is not covered by the guard.
+
+    If there is a ``maxsize``, it applies to the total number of events
+    in all the lanes.   The only ``overflow`` policy is ``'block'``.
+
+    .. automethod:: put
+    .. automethod:: put_nowait
+    .. automethod:: put_many
+    .. automethod:: drain
+
+    """
+
+    _overflow_policies = (_BLOCK,)
+
+    def __init__(
+        self, handler=None, widget=None, maxsize=0,
+        lanes=3, idle_lane=False, starvation_limit=100, **options
+        ):
+
+        if lanes < 1:
+            raise ValueError("PriorityEventQueue needs at least one lane")
+
+        self._lane_count = lanes
+        self._idle_lane = idle_lane and lanes > 1
+        self._starvation_limit = starvation_limit or 0
+        self._idle_scheduled = False
+        super().__init__(handler=handler, widget=widget, maxsize=maxsize, **options)
+
+    def put(self, event, block=True, timeout=None, priority=0):
+        """Add an event to the queue.
+
+        ``priority``
+            The lane for the event: an integer from ``0`` (the most urgent)
+            up to one less than the number of lanes.
+
+        ``block`` and ``timeout`` are as for :meth:`EventQueue.put`.
+        """
+
+        self.put_many((event,), block=block, timeout=timeout, priority=priority)
+
+    def put_nowait(self, event, priority=0):
         """Add an event to the queue without waiting.
 
         Either puts the event, or raises :exc:`queue.Full` immediately.
         """
 
-        return self.put(event, block=False)
+        return self.put(event, block=False, priority=priority)
+
+    def put_many(self, events, block=True, timeout=None, priority=0):
+        """Add a number of events, all with the same ``priority``, to the queue.
+
+        See :meth:`EventQueue.put_many` and :meth:`put`.
+        """
+
+        if not 0 <= priority < self._lane_count:
+            raise ValueError("priority must be between 0 and %d" % (self._lane_count - 1))
+
+        if self._stats is not None:
+            events = _stamp_all(events)
+        self._put_items(
+            ((priority, event) for event in events),
+            block, timeout
+        )
+
+    def drain(self):
+        """Close the queue for further events, and process any that are waiting.
+
+        Events in the idle lane are processed last.
+        """
+
+        super().drain()
+
+        while True:
+            events = self._take(self._max_batch, idle=True)
+            if not events:
+                break
+            self._dispatch(events)
+
+    def _pending(self):
+        if self._idle_lane:
+            return self.qsize() - len(self.queue[-1])
+        return self.qsize()
+
+    def _take(self, count, idle=False):
+        """Remove up to ``count`` events from the queue, and return them as a list.
+
+        If ``idle`` is true, the events are taken from the idle lane;
+        otherwise they come from the other lanes.
+        """
+
+        with self.not_full:
+            events = []
+            if idle:
+                lane = self.queue[-1]
+                while lane and len(events) < count:
+                    events.append(lane.popleft())
+            else:
+                while len(events) < count:
+                    lane = self._next_lane()
+                    if lane is None:
+                        break
+                    events.append(lane.popleft())
+            if events:
+                self._count -= len(events)
+                self.not_full.notify(len(events))
+            idle_waiting = self._idle_lane and self.queue[-1]
+
+        if idle_waiting and not self._idle_scheduled:
+            self._idle_scheduled = True
+            self._widget.after_idle(self._idle)
+
+        return events
+
+    def _next_lane(self):
+        """Choose the lane from which to take the next event, or return ``None``."""
+
+        waiting = [
+            i for i in range(self._lane_count - self._idle_lane)
+            if self.queue[i]
+        ]
+        if not waiting:
+            return None
+
+        chosen = waiting[0]
+        if len(waiting) == 1 or not self._starvation_limit:
+            self._skipped = 0
+        elif self._skipped < self._starvation_limit:
+            self._skipped += 1
+        else:
+            chosen = min(waiting[1:], key=self._served.__getitem__)
+            self._skipped = 0
+
+        self._serial += 1
+        self._served[chosen] = self._serial
+        return self.queue[chosen]
+
+    def _idle(self):
+        """Handle a batch of events from the idle lane."""
+
+        self._idle_scheduled = False
+        self._dispatch(self._take(self._max_batch, idle=True))
+
+    # The queue.Queue storage hooks
+
+    def _init(self, maxsize):
+        self.queue = [deque() for _ in range(self._lane_count)]
+        self._count = 0
+        self._served = [0] * self._lane_count
+        self._serial = 0
+        self._skipped = 0
+
+    def _qsize(self):
+        return self._count
+
+    def _put(self, item):
+        priority, event = item
+        self.queue[priority].append(event)
+        self._count += 1
+
+    def _get(self):
+        lane = self._next_lane() or self.queue[-1]
+        self._count -= 1
+        return lane.popleft()
+
+
+class Throttle:
+    """Limit the rate at which a handler is called.
+
+    A :class:`Throttle` is a callable that can be used in place of a
+    ``handler``: when called with an event it passes the event on to the
+    wrapped handler, but no more than ``rate`` times per second.
+    An event that arrives too soon is held back, replacing any event that
+    was already being held, and is delivered from a Tk ``after`` timer
+    when the interval has passed.   The last event of any burst is therefore
+    always delivered, no more than ``1/rate`` seconds late.
+
+    A :class:`Throttle` must be created, and called, from the main Tk thread.
+    It uses no threads of its own.
+
+    ``handler``
+        The handler to call, as ``handler(event)``.
+
+    ``rate``
+        The maximum rate, in calls per second (for each key).
+
+    ``widget``
+        The widget used to set timers, or ``None`` to use the default root widget.
+
+    ``key``
+        If not ``None``, a callable that returns a key for an event;
+        the rate is then limited separately for each key, so a busy key
+        does not hold back events with other keys.
+
+    The number of events that were replaced without being delivered is
+    available as :attr:`suppressed`.
+
+    .. automethod:: flush
+
+    """
+
+    def __init__(self, handler, rate, widget=None, key=None):
+
+        if rate <= 0:
+            raise ValueError("Throttle rate must be positive")
+
+        self._handler = handler
+        self._interval = 1.0 / rate
+        self._widget = widget or tk._default_root
+        self._key = key
+        self._last = {}     # key -> time of the latest delivery
+        self._held = {}     # key -> event waiting for its timer
+        self._timers = {}   # key -> id of the timer
+        self.suppressed = 0
+
+    def __call__(self, event):
+
+        key = self._key(event) if self._key else None
+
+        if key in self._timers:
+            self.suppressed += 1
+            self._held[key] = event
+            return
+
+        now = time.monotonic()
+        wait = self._last.get(key, now - self._interval) + self._interval - now
+        if wait <= 0:
+            self._deliver(key, event, now)
+            return
+
+        self._held[key] = event
+        self._timers[key] = self._widget.after(
+            int(math.ceil(wait * 1000)), self._trailing, key
+        )
+
+    def flush(self):
+        """Cancel all timers and deliver any events that are being held back."""
+
+        for key, timer in list(self._timers.items()):
+            self._widget.after_cancel(timer)
+            self._trailing(key)
+
+    def _trailing(self, key):
+        del self._timers[key]
+        self._deliver(key, self._held.pop(key), time.monotonic())
+
+    def _deliver(self, key, event, now):
+        self._last[key] = now
+        try:
+            self._handler(event)
+        except Exception as e:
+            log.exception("Exception raised by event handler")
+
+
+def _first(event):
+    """Return the key of a ``(key, value)`` event."""
+
+    return event[0]
 
 """
 
@@ -180,12 +1275,31 @@ class EventGenerator(threading.Thread):
         It will be called from a new thread, and each value that it generates
         will be put into a queue.
 
+        The ``generator`` may instead be an asynchronous iterable, such as the
+        result of calling an ``async def`` generator function.   In that case
+        no new thread is started: all asynchronous generators are run on a
+        single shared thread that runs an :mod:`asyncio` event loop (see
+        :mod:`rjgtoys.tkthread.aio`).   The ``chunk_size`` is ignored for
+        these generators.
+
     ``queue``
         The queue into which to put the generated events.
 
         If `None` is passed, a new :class:`~rjgtoys.tkthread.EventQueue` is created,
         using the ``handler``, ``widget`` and ``maxsize`` parameters - see
         :class:`~rjgtoys.tkthread.EventQueue` for descriptions of those.
+        Any other keyword arguments, such as ``batch_handler`` or ``max_batch``,
+        are also passed to the :class:`~rjgtoys.tkthread.EventQueue` constructor.
+
+    ``chunk_size``
+        The number of values to take from the ``generator`` before
+        passing them to the queue in a single :meth:`~rjgtoys.tkthread.EventQueue.put_many`.
+
+        The default, ``1``, passes each value on as soon as it is
+        generated.   Larger values are much cheaper for generators that
+        produce values quickly, but note that a chunk is not passed on
+        until it is complete (or the generator is exhausted), so a slow
+        generator will delay its values.
 
     ``start``
         A boolean that indicates whether the thread should be started.
@@ -226,7 +1340,8 @@ class EventGenerator(threading.Thread):
     .. py:method:: start()
 
       Starts the event collection thread (a loop that calls the ``generator``
-      specified in the constructor).
+      specified in the constructor), or for an asynchronous generator, a task
+      on the shared :mod:`asyncio` thread.
 
       This call is unnecessary if ``start=True`` was passed (or defaulted) to
       the constructor.
@@ -236,6 +1351,10 @@ class EventGenerator(threading.Thread):
        Waits (for up to ``timeout`` seconds, or indefinitely if ``timeout is None``)
        for completion of the event generator.   Note: does *not* drain the queue.
 
+    .. py:method:: is_alive()
+
+       Returns ``True`` if the generator has been started and is not exhausted.
+
     .. automethod:: drain
 
     .. automethod:: run
@@ -252,14 +1371,50 @@ class EventGenerator(threading.Thread):
         group=None,
         name=None,
         maxsize=0,
+        chunk_size=1,
+        **options
         ):
         name = str(name or _newname())
         super().__init__(group=group, name=name, daemon=True)
         self._generator = generator
-        self._queue = queue or EventQueue(handler=handler, widget=widget, maxsize=maxsize)
+        self._chunk_size = chunk_size
+        self._queue = queue or EventQueue(handler=handler, widget=widget, maxsize=maxsize, **options)
+        self._task = None
         if start:
             self.start()
 
+    def start(self):
+        """Start the generator; see the class description."""
+
+        from rjgtoys.tkthread import aio
+
+        if not aio.is_async_iterable(self._generator):
+            super().start()
+            return
+
+        if self._task is not None:
+            raise RuntimeError("threads can only be started once")
+        self._task = aio.loop_thread().submit(aio.feed(self._generator, self._queue))
+
+    def join(self, timeout=None):
+        """Wait for the generator to be exhausted; see the class description."""
+
+        if self._task is None:
+            super().join(timeout)
+            return
+
+        try:
+            self._task.result(timeout)
+        except concurrent.futures.TimeoutError:
+            pass
+
+    def is_alive(self):
+        """Return ``True`` if the generator has been started and has not finished."""
+
+        if self._task is None:
+            return super().is_alive()
+        return not self._task.done()
+
     def run(self):
         """Consumes the generator iterable and sends each value to the queue.
 
@@ -269,8 +1424,17 @@ class EventGenerator(threading.Thread):
         that have unusual ways of signalling (early?) completion.
         """
 
-        for work in self._generator:
-            self._queue.put(work)
+        if self._chunk_size <= 1:
+            for work in self._generator:
+                self._queue.put(work)
+            return
+
+        source = iter(self._generator)
+        while True:
+            chunk = list(islice(source, self._chunk_size))
+            if not chunk:
+                break
+            self._queue.put_many(chunk)
 
     def __enter__(self):
         return self
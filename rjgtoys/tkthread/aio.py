@@ -0,0 +1,106 @@
+"""
+
+Support for sources of events that are asynchronous generators.
+
+An :class:`~rjgtoys.tkthread.EventGenerator` whose ``generator`` is an
+asynchronous iterable (such as the result of calling an ``async def``
+generator function) does not start a thread of its own.   Instead, it
+is run as a task on a single, shared, background thread that runs an
+:mod:`asyncio` event loop, so any number of asynchronous sources cost
+only that one thread.
+
+.. autofunction:: loop_thread
+
+.. autoclass:: LoopThread
+
+"""
+
+import asyncio
+import queue
+import threading
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class LoopThread(threading.Thread):
+    """A daemon thread that runs an :mod:`asyncio` event loop.
+
+    .. py:attribute:: loop
+
+       The event loop.
+
+    .. automethod:: submit
+    .. automethod:: stop
+
+    """
+
+    def __init__(self, name='tkthread-asyncio'):
+        super().__init__(name=name, daemon=True)
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self.start()
+        self._ready.wait()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop, from any thread.
+
+        Returns a :class:`concurrent.futures.Future` for its result.
+        """
+
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Stop the loop, and wait for the thread to finish."""
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def loop_thread():
+    """Return the shared :class:`LoopThread`, starting it if necessary."""
+
+    global _loop_thread
+
+    with _loop_lock:
+        if _loop_thread is None or not _loop_thread.is_alive():
+            _loop_thread = LoopThread()
+        return _loop_thread
+
+
+def is_async_iterable(source):
+    """Return ``True`` if ``source`` should be consumed with ``async for``."""
+
+    return hasattr(source, '__aiter__')
+
+
+async def feed(source, target):
+    """Put each value from an asynchronous iterable into an event queue.
+
+    The loop thread must never block, so if the queue is full the
+    put is passed to the loop's default executor, where it waits for
+    room; the generator is suspended until it has been done.
+    """
+
+    loop = asyncio.get_running_loop()
+    try:
+        async for work in source:
+            try:
+                target.put(work, block=False)
+            except queue.Full:
+                await loop.run_in_executor(None, target.put, work)
+    except Exception:
+        log.exception("Exception raised by asynchronous generator")
@@ -0,0 +1,196 @@
+"""
+
+.. autofunction:: run_in_background
+
+.. autoclass:: BackgroundRunner
+
+.. autoclass:: BackgroundTask
+
+"""
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+
+from rjgtoys.tkthread import DequeEventQueue
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundTask:
+    """A call made by a :class:`BackgroundRunner`.
+
+    .. automethod:: cancel
+
+    .. py:attribute:: future
+
+       The :class:`concurrent.futures.Future` for the call.
+
+    .. py:attribute:: cancelled
+
+       ``True`` if :meth:`cancel` has been called.
+
+    """
+
+    def __init__(self, key, on_result, on_error):
+        self.key = key
+        self.future = None
+        self.cancelled = False
+        self._on_result = on_result
+        self._on_error = on_error
+
+    def cancel(self):
+        """Cancel the call.
+
+        If the call has not started, it will not be made.   If it has started,
+        it runs to completion but neither ``on_result`` nor ``on_error`` will
+        be called.
+        """
+
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+    def _complete(self):
+        """Deliver the outcome of the call; runs in the Tk thread."""
+
+        if self.cancelled or self.future.cancelled():
+            return
+
+        error = self.future.exception()
+        if error is None:
+            if self._on_result is not None:
+                self._on_result(self.future.result())
+        elif self._on_error is not None:
+            self._on_error(error)
+        else:
+            log.error("Exception raised by background call", exc_info=error)
+
+
+class BackgroundRunner:
+    """Run functions in a pool of threads, and deliver their results to the Tk thread.
+
+    A handler running in the Tk event loop can use a :class:`BackgroundRunner`
+    to do slow work without freezing the UI: the work is done by one of a fixed
+    number of threads, and the result (or exception) is passed to a callback that
+    runs in the Tk event loop.
+
+    **NOTE**:
+
+      The constructor, :meth:`run` and :meth:`shutdown` must be called from
+      the main Tk thread.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``max_workers``
+        The number of threads in the pool.   Calls that are made while all the
+        threads are busy wait for one to become free.
+
+    Results are delivered through a single :class:`~rjgtoys.tkthread.DequeEventQueue`;
+    any other keyword arguments, such as ``time_budget``, are passed to its constructor.
+
+    :class:`BackgroundRunner` implements the context manager protocol; exiting the
+    context calls :meth:`shutdown`.
+
+    .. automethod:: run
+    .. automethod:: shutdown
+
+    """
+
+    def __init__(self, widget=None, max_workers=4, **options):
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='BackgroundRunner'
+        )
+        self._queue = DequeEventQueue(
+            batch_handler=self._deliver, widget=widget, max_batch=0,
+            edge_triggered=True, **options
+        )
+        self._latest = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.shutdown()
+
+    def run(self, fn, *args, on_result=None, on_error=None, key=None, **kwargs):
+        """Call ``fn(*args, **kwargs)`` in a background thread.
+
+        ``on_result``
+            A callable that is called, from the Tk event loop, as ``on_result(result)``
+            where ``result`` is the value returned by ``fn``.
+
+        ``on_error``
+            A callable that is called, from the Tk event loop, as ``on_error(exc)``
+            if ``fn`` raises the exception ``exc``.   If this is ``None``, the
+            exception is logged.
+
+        ``key``
+            If not ``None``, a key that identifies a kind of request, for example
+            ``'search'``.   Starting a call cancels any earlier call with the same
+            key, so that only the latest result is delivered.   This suits
+            requests that are superseded by newer ones, such as a search
+            that is repeated each time a key is pressed.
+
+        Returns a :class:`BackgroundTask`.
+        """
+
+        task = BackgroundTask(key, on_result, on_error)
+
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = task
+
+        task.future = self._pool.submit(fn, *args, **kwargs)
+        task.future.add_done_callback(lambda future: self._queue.put(task))
+        return task
+
+    def shutdown(self, cancel=False):
+        """Stop the pool, after waiting for all calls to finish.
+
+        If ``cancel`` is true, calls that have not started are cancelled.
+        The outcome of every call that is not cancelled is delivered before
+        this returns.
+        """
+
+        self._pool.shutdown(wait=True, cancel_futures=cancel)
+        self._queue.drain()
+
+    def _deliver(self, tasks):
+        for task in tasks:
+            if task.key is not None and self._latest.get(task.key) is task:
+                del self._latest[task.key]
+            try:
+                task._complete()
+            except Exception as e:
+                log.exception("Exception raised by background result handler")
+
+
+_default_runner = None
+_default_lock = threading.Lock()
+
+
+def run_in_background(fn, *args, on_result=None, on_error=None, key=None, **kwargs):
+    """Call ``fn(*args, **kwargs)`` in a background thread, and deliver the result to the Tk thread.
+
+    This uses a shared :class:`BackgroundRunner` that is attached to the default root
+    widget, and is created by the first call.   See :meth:`BackgroundRunner.run`
+    for a description of the parameters.   Must be called from the main Tk thread.
+    """
+
+    global _default_runner
+
+    with _default_lock:
+        if _default_runner is None:
+            _default_runner = BackgroundRunner()
+
+    return _default_runner.run(
+        fn, *args, on_result=on_result, on_error=on_error, key=key, **kwargs
+    )
@@ -0,0 +1,301 @@
+"""
+
+Run child processes, and show their output as it arrives, without threads.
+
+Reading the output of a child process in an :class:`~rjgtoys.tkthread.EventGenerator`
+costs a thread for each child, and an event for each line.   A :class:`ChildProcess`
+instead registers the child's ``stdout`` and ``stderr`` pipes with Tk, using
+:class:`~rjgtoys.tkthread.fdsource.FdEventSource`.   Whenever a pipe is readable
+the Tk thread reads large chunks from it without blocking, decodes each chunk as
+a whole, splits it into lines, and passes the lines to the handler in one batch::
+
+    def show(stream, lines):
+        text.insert('end', '\\n'.join(lines) + '\\n')
+
+    ChildProcess(['make', '-k'], show, on_exit=lambda code: print("done", code))
+
+Since there are no threads, dozens of children can run at once at the cost
+of two file descriptors each.
+
+The amount of output held in memory is bounded: each callback reads at most
+``read_size * max_reads`` bytes from each pipe, and a line that grows longer
+than ``max_line`` is delivered in pieces.   A child that writes faster than
+the user interface wants to show its output can be slowed down with ``interval``,
+or stopped with :meth:`ChildProcess.pause`; when a child's pipe is full,
+it waits until the pipe is read again.
+
+.. autoclass:: ChildProcess
+
+"""
+
+import os
+import subprocess
+
+import tkinter as tk
+
+import logging
+
+from rjgtoys.tkthread.fdsource import FdEventSource, LineSplitter
+
+log = logging.getLogger(__name__)
+
+
+class _Stream:
+    """Split one output stream of a child into lines, counting as it goes."""
+
+    def __init__(self, name, splitter):
+        self.name = name
+        self._splitter = splitter
+        self.bytes = 0
+        self.lines = 0
+
+    def __call__(self, data):
+        self.bytes += len(data)
+        lines = self._splitter(data)
+        self.lines += len(lines)
+        return lines
+
+    def flush(self):
+        lines = self._splitter.flush()
+        self.lines += len(lines)
+        return lines
+
+
+class ChildProcess:
+    """Run a child process, and pass its output to a handler in the Tk thread.
+
+    **NOTE**:
+
+      The constructor, and all the methods, must be called from the main Tk thread.
+
+    ``args``
+        The program to run, and its arguments, as for :class:`subprocess.Popen`.
+
+    ``handler``
+        A function that is called with two arguments: the name of the stream
+        (``'stdout'`` or ``'stderr'``), and a list of the lines that have been
+        read from it.   The line endings are removed.
+
+    ``on_exit``
+        A function that is called with the exit code of the child, after it has
+        exited and all its output has been handled.
+
+    ``stderr``
+        What to do with the standard error of the child: :data:`subprocess.PIPE`
+        (the default) to pass it to the handler, :data:`subprocess.STDOUT` to
+        merge it with the standard output, or anything else that :class:`subprocess.Popen`
+        accepts.
+
+    ``encoding``
+        The encoding of the output, or ``None`` to pass lines to the handler
+        as bytes.   Undecodable bytes are replaced.
+
+    ``read_size``, ``max_reads``, ``interval``
+        See :class:`~rjgtoys.tkthread.fdsource.FdEventSource`.
+
+    ``max_line``
+        The longest line that is kept; see :class:`~rjgtoys.tkthread.fdsource.LineSplitter`.
+
+    ``poll_interval``
+        How often, in seconds, to check whether the child has exited once it has
+        closed its output but has not yet exited.   Where the system can provide
+        a file descriptor for the child (:func:`os.pidfd_open`, on Linux), Tk
+        watches that instead and this is not used.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    Any other keyword arguments are passed to :class:`subprocess.Popen`; its
+    ``stdin`` defaults to :data:`subprocess.DEVNULL`.
+
+    :class:`ChildProcess` implements the context manager protocol; exiting the
+    context calls :meth:`close`.
+
+    .. py:attribute:: process
+
+       The :class:`subprocess.Popen` object for the child.
+
+    .. py:attribute:: returncode
+
+       The exit code of the child, or ``None`` if the child has not yet exited.
+
+    .. automethod:: pause
+    .. automethod:: resume
+    .. automethod:: terminate
+    .. automethod:: kill
+    .. automethod:: stats
+    .. automethod:: close
+
+    """
+
+    def __init__(
+        self, args, handler, *,
+        on_exit=None,
+        stderr=subprocess.PIPE,
+        encoding='utf-8',
+        read_size=65536,
+        max_reads=4,
+        interval=0,
+        max_line=65536,
+        poll_interval=0.05,
+        widget=None,
+        **options
+        ):
+
+        self._handler = handler
+        self._on_exit = on_exit
+        self._widget = widget or tk._default_root
+        self._poll_interval = int(poll_interval * 1000)
+        self._timer = None
+        self._pidfd = None
+        self.returncode = None
+
+        options.setdefault('stdin', subprocess.DEVNULL)
+        self.process = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=stderr, **options
+        )
+
+        self._streams = {}
+        self._sources = {}
+        for name in ('stdout', 'stderr'):
+            pipe = getattr(self.process, name)
+            if pipe is None:
+                continue
+            stream = _Stream(name, LineSplitter(max_line=max_line, encoding=encoding))
+            self._streams[name] = stream
+            self._sources[name] = FdEventSource(
+                pipe,
+                batch_handler=lambda lines, name=name: self._deliver(name, lines),
+                parser=stream,
+                read_size=read_size,
+                max_reads=max_reads,
+                interval=interval,
+                on_eof=self._closed_stream,
+                close_fd=True,
+                widget=self._widget
+            )
+
+    @property
+    def pid(self):
+        """The process id of the child."""
+
+        return self.process.pid
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.close()
+
+    def pause(self):
+        """Stop reading the output of the child.
+
+        The child can carry on until its pipes are full, and then waits.
+        """
+
+        for source in self._sources.values():
+            source.pause()
+
+    def resume(self):
+        """Start reading the output of the child again, after :meth:`pause`."""
+
+        for source in self._sources.values():
+            source.resume()
+
+    def terminate(self):
+        """Ask the child to stop, by sending it ``SIGTERM``."""
+
+        if self.returncode is None:
+            self.process.terminate()
+
+    def kill(self):
+        """Stop the child, by sending it ``SIGKILL``."""
+
+        if self.returncode is None:
+            self.process.kill()
+
+    def stats(self):
+        """Return a snapshot of statistics, as a dictionary:
+
+        ``pid``
+            The process id of the child.
+
+        ``returncode``
+            The exit code of the child, or ``None`` if it is still running.
+
+        ``stdout_bytes``, ``stdout_lines``, ``stderr_bytes``, ``stderr_lines``
+            The amount of output that has been read from each stream.
+        """
+
+        result = dict(pid=self.pid, returncode=self.returncode)
+        for name in ('stdout', 'stderr'):
+            stream = self._streams.get(name)
+            result[name + '_bytes'] = stream.bytes if stream else 0
+            result[name + '_lines'] = stream.lines if stream else 0
+        return result
+
+    def close(self):
+        """Stop reading the output of the child, and close the pipes.
+
+        The child is not stopped; a child that writes more output after
+        this call receives ``SIGPIPE``.   Call :meth:`terminate` first to stop it.
+        """
+
+        for source in self._sources.values():
+            source.close()
+        if self._timer is not None:
+            self._widget.after_cancel(self._timer)
+            self._timer = None
+        self._close_pidfd()
+
+    def _deliver(self, name, lines):
+        try:
+            self._handler(name, lines)
+        except Exception:
+            log.exception("Exception raised by event handler")
+
+    def _closed_stream(self):
+        if not all(source.closed for source in self._sources.values()):
+            return
+        if self.process.poll() is not None:
+            self._exited()
+            return
+
+        # Wait for the child to exit; a pidfd becomes readable when it does.
+
+        try:
+            self._pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            self._timer = self._widget.after(self._poll_interval, self._check_exit)
+            return
+        self._widget.tk.createfilehandler(self._pidfd, tk.READABLE, self._pidfd_readable)
+
+    def _close_pidfd(self):
+        if self._pidfd is None:
+            return
+        self._widget.tk.deletefilehandler(self._pidfd)
+        os.close(self._pidfd)
+        self._pidfd = None
+
+    def _pidfd_readable(self, fd, mask):
+        if self.process.poll() is None:
+            return
+        self._close_pidfd()
+        self._exited()
+
+    def _check_exit(self):
+        self._timer = None
+        if self.process.poll() is None:
+            self._timer = self._widget.after(self._poll_interval, self._check_exit)
+            return
+        self._exited()
+
+    def _exited(self):
+        self.returncode = self.process.returncode
+        if self._on_exit is None:
+            return
+        try:
+            self._on_exit(self.returncode)
+        except Exception:
+            log.exception("Exception raised by exit handler")
@@ -0,0 +1,179 @@
+"""
+
+.. autoclass:: TkExecutor
+
+"""
+
+import threading
+import time
+
+from concurrent.futures import Executor, Future
+
+from rjgtoys.tkthread import DequeEventQueue
+
+
+class _WorkItem:
+    """A call to be made in the Tk thread, and the future for its result."""
+
+    __slots__ = ('future', 'fn', 'args', 'kwargs')
+
+    def __init__(self, future, fn, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self, cancel=False):
+        if cancel:
+            self.future.cancel()
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+def _call_chunk(fn, chunk):
+    return [fn(*args) for args in chunk]
+
+
+class TkExecutor(Executor):
+    """A :class:`concurrent.futures.Executor` that runs callables in the Tk thread.
+
+    Other threads can use a :class:`TkExecutor` to have functions
+    called from the main Tk event loop, where they can safely interact
+    with tkinter objects, and to get their results back through
+    :class:`concurrent.futures.Future` objects::
+
+        executor = TkExecutor(widget=root)
+
+        # ... and then, in some other thread:
+
+        text = executor.submit(entry.get).result()
+
+    All the calls that are waiting when the Tk event loop wakes up are made in
+    a single callback, so a burst of small calls is cheap.
+
+    **NOTE**:
+
+      The constructor, and :meth:`shutdown`, must be called from the main Tk thread.
+
+      A function running in the Tk thread must not wait for the result of a
+      call that it has submitted, because that call cannot run until it returns.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``max_batch``
+        The maximum number of calls to make in each callback from the Tk event loop;
+        the default, ``0``, makes all those that are waiting.
+
+    Any other keyword arguments, such as ``time_budget``, are passed to the
+    :class:`~rjgtoys.tkthread.DequeEventQueue` that carries the calls.
+
+    :class:`TkExecutor` implements the context manager protocol; exiting the
+    context calls :meth:`shutdown`.
+
+    .. automethod:: submit
+    .. automethod:: map
+    .. automethod:: shutdown
+
+    """
+
+    def __init__(self, widget=None, max_batch=0, **options):
+
+        self._shutdown = False
+        self._cancel = False
+        self._lock = threading.Lock()
+        self._queue = DequeEventQueue(
+            batch_handler=self._run, widget=widget, max_batch=max_batch,
+            edge_triggered=True, **options
+        )
+
+    def submit(self, fn, /, *args, **kwargs):
+        """Arrange for ``fn(*args, **kwargs)`` to be called in the Tk thread.
+
+        Returns a :class:`concurrent.futures.Future` for the result.
+        """
+
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.put(_WorkItem(future, fn, args, kwargs))
+        return future
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):
+        """Return an iterator equivalent to ``map(fn, *iterables)``, with calls made in the Tk thread.
+
+        All the calls are queued at once, and so they cost only one wakeup of
+        the Tk event loop.   If ``chunksize`` is greater than one, the calls
+        are also grouped into chunks that share a single :class:`~concurrent.futures.Future`,
+        which reduces the cost of each call further.
+
+        ``timeout`` is as for :meth:`concurrent.futures.Executor.map`.
+        """
+
+        if chunksize < 1:
+            raise ValueError("chunksize must be >= 1.")
+
+        end_time = None if timeout is None else time.monotonic() + timeout
+
+        calls = list(zip(*iterables))
+        if chunksize > 1:
+            items = [
+                _WorkItem(Future(), _call_chunk, (fn, calls[i:i + chunksize]), {})
+                for i in range(0, len(calls), chunksize)
+            ]
+        else:
+            items = [_WorkItem(Future(), fn, args, {}) for args in calls]
+
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.put_many(items)
+
+        futures = [item.future for item in items]
+
+        def result_iterator():
+            try:
+                futures.reverse()
+                while futures:
+                    if end_time is None:
+                        result = futures.pop().result()
+                    else:
+                        result = futures.pop().result(end_time - time.monotonic())
+                    if chunksize > 1:
+                        yield from result
+                    else:
+                        yield result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return result_iterator()
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """Stop accepting calls, and deal with any that are waiting.
+
+        Must be called from the Tk thread.   The waiting calls are made
+        before this returns, unless ``cancel_futures`` is true, in which
+        case they are cancelled instead.   Since the calls are made in the
+        calling thread, ``wait`` makes no difference.
+        """
+
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            self._cancel = cancel_futures
+        self._queue.drain()
+
+    def _run(self, items):
+        cancel = self._cancel
+        for item in items:
+            item.run(cancel)
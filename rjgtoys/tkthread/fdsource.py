@@ -0,0 +1,369 @@
+"""
+
+Handle data from a file descriptor in the Tk thread, without a thread.
+
+Many sources of events already have a file descriptor that becomes readable
+when there is something to read: pipes, sockets, netlink sockets such as the
+one behind a ``pyudev.Monitor``, and so on.   Running a thread that waits on
+such a source, only to put what it reads into an :class:`~rjgtoys.tkthread.EventQueue`,
+costs a thread, a queue, a wakeup channel and two context switches per event.
+
+An :class:`FdEventSource` instead registers the file descriptor itself with
+Tk, and reads from it in the Tk thread whenever it is readable::
+
+    monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+    monitor.start()
+
+    FdEventSource(
+        monitor,
+        reader=lambda: monitor.poll(timeout=0),
+        handler=show_device
+    )
+
+.. autoclass:: FdEventSource
+
+.. autoclass:: LineSplitter
+
+"""
+
+import codecs
+import os
+
+import tkinter as tk
+
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class LineSplitter:
+    """A parser that splits a stream of bytes into lines.
+
+    It is called with each chunk of data that is read, and returns a list of
+    the complete lines in it (including any partial line left over from the
+    previous chunk).   The line endings are removed.
+
+    ``max_line``
+        If a line grows longer than this without an end, it is returned in
+        pieces of this size, so that a stream without line endings cannot
+        use unlimited memory.
+
+    ``encoding``
+        If not ``None``, the lines are returned as strings, decoded using this
+        encoding.   Each chunk is decoded as a whole, before it is split,
+        by an incremental decoder, so a character that is split between two
+        chunks is decoded correctly.
+
+    ``errors``
+        The error handling scheme for decoding; see :func:`codecs.decode`.
+
+    .. automethod:: flush
+
+    """
+
+    def __init__(self, max_line=65536, encoding=None, separator=b"\n", errors='replace'):
+        self._max_line = max_line
+        self._decoder = None
+        self._separator = separator
+        self._partial = b""
+        if encoding is not None:
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+            self._separator = separator.decode(encoding)
+            self._partial = ""
+
+    def __call__(self, data):
+        if self._decoder is not None:
+            data = self._decoder.decode(data)
+        data = self._partial + data
+        lines = data.split(self._separator)
+        self._partial = lines.pop()
+        while len(self._partial) > self._max_line:
+            lines.append(self._partial[:self._max_line])
+            self._partial = self._partial[self._max_line:]
+        return lines
+
+    def flush(self):
+        """Return any partial line that is left over, as a list of zero or one lines."""
+
+        partial = self._partial
+        if self._decoder is not None:
+            partial += self._decoder.decode(b"", final=True)
+        self._partial = partial[:0]
+        return [partial] if partial else []
+
+
+def _whole(data):
+    return (data,)
+
+
+class FdEventSource:
+    """Read from a file descriptor in the Tk thread, and handle what is read.
+
+    Whenever the file descriptor is readable, Tk calls the :class:`FdEventSource`,
+    which reads everything that is available (without blocking), passes it
+    to the ``parser`` to be turned into events, and passes the events
+    to the ``handler``.
+
+    **NOTE**:
+
+      The constructor, and :meth:`close`, must be called from the main Tk thread.
+
+    ``source``
+        A file descriptor, or an object with a ``fileno()`` method.
+
+    ``handler``
+        A function to call with each event.
+
+    ``batch_handler``
+        A function to call with a list of all the events found each time
+        the source is readable, instead of ``handler``;
+        exactly one of ``handler`` and ``batch_handler`` must be given.
+
+    ``parser``
+        A function that is called with each piece of data that is read,
+        and returns an iterable of events.   If it has a ``flush()`` method,
+        that is called at the end of the data, and should return any
+        remaining events.   See :class:`LineSplitter`.
+        The default treats each piece of data as one event.
+
+    ``reader``
+        A function that reads from the source without blocking, and returns
+        the data that it read, or ``None`` if nothing more is available,
+        or an empty string at the end of the data.   The default is to read
+        up to ``read_size`` bytes with :func:`os.read`, having made the file
+        descriptor non-blocking.
+
+    ``read_size``
+        The number of bytes to ask for in each read, for the default ``reader``.
+
+    ``max_reads``
+        The maximum number of reads to do each time Tk calls back, so that a
+        source that is always readable cannot lock up the user interface.
+        Anything not yet read causes another callback.
+
+    ``interval``
+        If not zero, the minimum time in seconds between callbacks.   After
+        each callback that reads something, the source stops watching the
+        file descriptor for this long.   Events are then delivered in larger
+        batches, and a producer that writes faster than that fills its pipe
+        or socket buffer and has to wait: the amount of data held in memory
+        stays bounded however fast the producer is.
+
+    ``on_eof``
+        A function to call, with no arguments, when the end of the data is
+        reached.   The source is then closed.   If the ``reader`` or the
+        ``parser`` raises an exception, it is logged, the events already
+        parsed are delivered, and the source is closed as if at the end
+        of the data.
+
+    ``close_fd``
+        If ``True``, the file descriptor (or object) is closed when the source is closed.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    :class:`FdEventSource` implements the context manager protocol; exiting the
+    context calls :meth:`close`.
+
+    .. automethod:: pause
+    .. automethod:: resume
+    .. automethod:: close
+
+    """
+
+    def __init__(
+        self, source, handler=None, *,
+        batch_handler=None,
+        parser=None,
+        reader=None,
+        read_size=65536,
+        max_reads=16,
+        interval=0,
+        on_eof=None,
+        close_fd=False,
+        widget=None
+        ):
+
+        if (handler is None) == (batch_handler is None):
+            raise ValueError("Exactly one of handler and batch_handler must be given")
+
+        self._source = source
+        self._fd = source if isinstance(source, int) else source.fileno()
+        self._handler = handler
+        self._batch_handler = batch_handler
+        self._parser = parser or _whole
+        self._read_size = read_size
+        self._max_reads = max(max_reads, 1)
+        self._interval = int(interval * 1000)
+        self._on_eof = on_eof
+        self._close_fd = close_fd
+        self._widget = widget or tk._default_root
+        self._closed = False
+        self._watching = False
+        self._paused = False
+        self._timer = None
+
+        self._was_blocking = None
+        if reader is None:
+            self._was_blocking = os.get_blocking(self._fd)
+            os.set_blocking(self._fd, False)
+            reader = self._read
+        self._reader = reader
+
+        self._watch()
+
+    def fileno(self):
+        """Return the file descriptor that is being watched."""
+
+        return self._fd
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.close()
+
+    @property
+    def closed(self):
+        """``True`` once the source has been closed."""
+
+        return self._closed
+
+    @property
+    def paused(self):
+        """``True`` if the source has been paused by :meth:`pause`."""
+
+        return self._paused
+
+    def pause(self):
+        """Stop reading from the file descriptor until :meth:`resume` is called.
+
+        Nothing more is read, so a producer that keeps writing eventually
+        fills its pipe or socket buffer, and has to wait.
+        """
+
+        self._paused = True
+        self._unwatch()
+
+    def resume(self):
+        """Start reading from the file descriptor again, after :meth:`pause`."""
+
+        self._paused = False
+        if self._timer is None:
+            self._watch()
+
+    def close(self):
+        """Stop watching the file descriptor (and close it, if ``close_fd`` was passed)."""
+
+        if self._closed:
+            return
+        self._unwatch()
+        self._closed = True
+
+        if self._timer is not None:
+            self._widget.after_cancel(self._timer)
+            self._timer = None
+
+        self._deliver(self._flush_parser())
+
+        if self._close_fd:
+            if isinstance(self._source, int):
+                os.close(self._fd)
+            else:
+                self._source.close()
+        elif self._was_blocking:
+            try:
+                os.set_blocking(self._fd, True)
+            except OSError:
+                pass
+
+    def _watch(self):
+        if self._watching or self._paused or self._closed:
+            return
+        self._widget.tk.createfilehandler(self._fd, tk.READABLE, self._readable)
+        self._watching = True
+
+    def _unwatch(self):
+        if self._watching:
+            self._widget.tk.deletefilehandler(self._fd)
+            self._watching = False
+
+    def _wake(self):
+        self._timer = None
+        self._watch()
+
+    def _read(self):
+        """The default reader."""
+
+        try:
+            return os.read(self._fd, self._read_size)
+        except BlockingIOError:
+            return None
+
+    def _readable(self, what, how):
+
+        events = []
+        eof = False
+        got = False
+
+        for _ in range(self._max_reads):
+            try:
+                data = self._reader()
+            except Exception:
+                log.exception("Exception raised reading from file descriptor %d" % (self._fd,))
+                eof = True
+                break
+            if data is None:
+                break
+            if isinstance(data, (bytes, str)) and not data:
+                eof = True
+                break
+            got = True
+            try:
+                events.extend(self._parser(data))
+            except Exception:
+                log.exception("Exception raised parsing data from file descriptor %d" % (self._fd,))
+                eof = True
+                break
+
+        self._deliver(events)
+
+        if got and self._interval and not eof and not self._closed:
+            self._unwatch()
+            self._timer = self._widget.after(self._interval, self._wake)
+
+        if eof:
+            self.close()
+            if self._on_eof is not None:
+                try:
+                    self._on_eof()
+                except Exception:
+                    log.exception("Exception raised by end of file handler")
+
+    def _flush_parser(self):
+        flush = getattr(self._parser, 'flush', None)
+        if flush is None:
+            return []
+        try:
+            return list(flush())
+        except Exception:
+            log.exception("Exception raised parsing data from file descriptor %d" % (self._fd,))
+            return []
+
+    def _deliver(self, events):
+        if not events:
+            return
+
+        if self._batch_handler is not None:
+            try:
+                self._batch_handler(events)
+            except Exception:
+                log.exception("Exception raised by event handler")
+            return
+
+        for event in events:
+            try:
+                self._handler(event)
+            except Exception:
+                log.exception("Exception raised by event handler")
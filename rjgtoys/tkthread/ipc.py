@@ -0,0 +1,552 @@
+"""
+
+Let other processes send events into an :class:`~rjgtoys.tkthread.EventQueue`
+through a Unix-domain socket.
+
+An :class:`EventListener` listens on a socket path, and registers the listening
+socket, and each connection that it accepts, with Tk.   Whenever a connection
+is readable, the Tk thread reads what is available without blocking, splits it
+into frames, decodes the batch of events in each frame, and puts the events into
+the queue::
+
+    events = EventQueue(handler=show_reading)
+
+    listener = EventListener('/run/user/1000/acquire.sock', events)
+
+A producer, which need not use Tk at all, sends batches of events with an
+:class:`EventClient`::
+
+    with EventClient('/run/user/1000/acquire.sock') as client:
+        while True:
+            client.send(instrument.read_block())
+
+Each frame is a 4-byte length, in network byte order, followed by that many
+bytes of payload: a batch of events, encoded by the codec.   The codecs are:
+
+``'pickle'``
+    :class:`PickleCodec`; any picklable events.   Only accept connections from
+    clients that you trust: unpickling can run arbitrary code.
+
+``'msgpack'``
+    :class:`MsgpackCodec`; needs the ``msgpack`` package.
+
+``'raw'``
+    :class:`RawCodec`; each event is a bytes object, passed on unchanged.
+
+Any other object with ``encode(events)`` and ``decode(payload)`` methods
+can be used as a codec.
+
+.. autoclass:: EventListener
+
+.. autoclass:: EventClient
+
+.. autoclass:: PickleCodec
+
+.. autoclass:: MsgpackCodec
+
+.. autoclass:: RawCodec
+
+"""
+
+import os
+import pickle
+import queue
+import socket
+import stat
+import struct
+import time
+
+import tkinter as tk
+
+import logging
+
+from rjgtoys.tkthread.fdsource import FdEventSource
+
+log = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct('!I')
+
+
+class PickleCodec:
+    """Encode a batch of events as a pickled list."""
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self._protocol = protocol
+
+    def encode(self, events):
+        return pickle.dumps(list(events), protocol=self._protocol)
+
+    def decode(self, payload):
+        return pickle.loads(payload)
+
+
+class MsgpackCodec:
+    """Encode a batch of events as a MessagePack array.
+
+    Needs the ``msgpack`` package; :exc:`ImportError` is raised if it is not installed.
+    """
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def encode(self, events):
+        return self._msgpack.packb(list(events), use_bin_type=True)
+
+    def decode(self, payload):
+        return self._msgpack.unpackb(payload, raw=False)
+
+
+class RawCodec:
+    """Pass events that are bytes objects unchanged.
+
+    Within the payload of a frame, each event has a 4-byte length of its own.
+    """
+
+    def encode(self, events):
+        return b"".join(_LENGTH.pack(len(event)) + bytes(event) for event in events)
+
+    def decode(self, payload):
+        payload = memoryview(payload)
+        events = []
+        offset = 0
+        while offset < len(payload):
+            (length,) = _LENGTH.unpack_from(payload, offset)
+            offset += _LENGTH.size
+            if offset + length > len(payload):
+                raise ValueError("Event extends beyond the end of the frame")
+            events.append(bytes(payload[offset:offset + length]))
+            offset += length
+        return events
+
+
+_CODECS = {
+    'pickle': PickleCodec,
+    'msgpack': MsgpackCodec,
+    'raw': RawCodec,
+}
+
+
+def _make_codec(codec):
+    if isinstance(codec, str):
+        try:
+            return _CODECS[codec]()
+        except KeyError:
+            raise ValueError("Unknown codec %r" % (codec,)) from None
+    return codec
+
+
+class _Client:
+    """A connection accepted by an :class:`EventListener`, and its frame parser."""
+
+    def __init__(self, number, sock, codec, max_frame):
+        self.number = number
+        self.sock = sock
+        self.pid = _peer_pid(sock)
+        self.connected = time.monotonic()
+        self.source = None
+        self.pending = []
+        self.stalled = False
+        self.disconnected = False
+        self._codec = codec
+        self._max_frame = max_frame
+        self._buffer = bytearray()
+        self._skip = 0
+        self.bytes = 0
+        self.frames = 0
+        self.events = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def __call__(self, data):
+        """Return the events in all the complete frames that have been read."""
+
+        self.bytes += len(data)
+
+        if self._skip:
+            # Discarding the rest of a frame that was too big
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            data = data[skipped:]
+
+        buffer = self._buffer
+        buffer += data
+        events = []
+        offset = 0
+        while len(buffer) - offset >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(buffer, offset)
+            if length > self._max_frame:
+                log.warning("Frame of %d bytes from client %d is too big", length, self.number)
+                self.errors += 1
+                offset += _LENGTH.size
+                skipped = min(length, len(buffer) - offset)
+                self._skip = length - skipped
+                offset += skipped
+                continue
+            end = offset + _LENGTH.size + length
+            if end > len(buffer):
+                break
+            self.frames += 1
+            try:
+                events.extend(self._codec.decode(bytes(buffer[offset + _LENGTH.size:end])))
+            except Exception:
+                log.exception("Exception raised decoding frame from client %d" % (self.number,))
+                self.errors += 1
+            offset = end
+        del buffer[:offset]
+
+        self.events += len(events)
+        return events
+
+    def stats(self):
+        elapsed = time.monotonic() - self.connected
+        return dict(
+            client=self.number,
+            pid=self.pid,
+            duration=elapsed,
+            bytes=self.bytes,
+            frames=self.frames,
+            events=self.events,
+            dropped=self.dropped,
+            errors=self.errors,
+            pending=len(self.pending),
+            events_per_second=self.events / elapsed if elapsed > 0 else 0.0,
+            bytes_per_second=self.bytes / elapsed if elapsed > 0 else 0.0
+        )
+
+
+def _peer_pid(sock):
+    """Return the process id of the peer of a Unix socket, or ``None`` if it is not known."""
+
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    except OSError:
+        return None
+    return struct.unpack('3i', creds)[0]
+
+
+class EventListener:
+    """Accept connections on a Unix-domain socket, and put the events that
+    clients send into an event queue.
+
+    **NOTE**:
+
+      The constructor, and :meth:`close`, must be called from the main Tk thread.
+
+    ``path``
+        The path of the socket.   An existing socket at that path is removed.
+
+    ``queue``
+        The queue to put events into; usually an :class:`~rjgtoys.tkthread.EventQueue`.
+        Events are put without blocking, because they are read in the Tk thread,
+        which is the thread that empties the queue.   Events that do not fit are
+        dropped, and counted for the client that sent them.   A queue with an
+        ``overflow`` policy never refuses events; it counts what it drops itself.
+
+    ``max_pending``
+        The most events that may be waiting in the queue before the listener
+        stops putting more.   A level-triggered queue writes a wakeup for each
+        event into a channel that only the Tk thread empties; with a pipe,
+        which holds 64KiB of wakeups, the Tk thread would block forever if it
+        put too many.   Events beyond the limit are held, and the client is
+        not read again, until Tk has handled half of the waiting events.   A client
+        that keeps sending then fills its socket buffer, and has to wait.
+
+    ``codec``
+        The name of a codec (``'pickle'``, ``'msgpack'`` or ``'raw'``),
+        or a codec object; see above.   Clients must use the same codec.
+
+    ``max_frame``
+        The largest frame that is accepted, in bytes.   Bigger frames are
+        discarded, and counted as errors.
+
+    ``read_size``, ``max_reads``
+        See :class:`~rjgtoys.tkthread.fdsource.FdEventSource`.
+
+    ``mode``
+        The permissions for the socket; by default only the owner may connect.
+
+    ``backlog``
+        The number of connections that may wait to be accepted.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    :class:`EventListener` implements the context manager protocol; exiting the
+    context calls :meth:`close`.
+
+    .. automethod:: stats
+    .. automethod:: close
+
+    """
+
+    def __init__(
+        self, path, queue, *,
+        codec='pickle',
+        max_frame=16 * 1024 * 1024,
+        read_size=65536,
+        max_reads=16,
+        max_pending=4096,
+        mode=0o600,
+        backlog=16,
+        widget=None
+        ):
+
+        self.path = path
+        self._queue = queue
+        self._codec = _make_codec(codec)
+        self._max_frame = max_frame
+        self._read_size = read_size
+        self._max_reads = max_reads
+        self._max_pending = max_pending
+        self._widget = widget or tk._default_root
+        self._bounded = getattr(queue, 'maxsize', 0) > 0
+        self._clients = {}
+        self._stalled = []
+        self._waiting = False
+        self._closed = False
+
+        self.accepted = 0
+        self.events = 0
+        self.dropped = 0
+        self.errors = 0
+
+        try:
+            if stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.bind(path)
+            os.chmod(path, mode)
+            self._sock.listen(backlog)
+        except OSError:
+            self._sock.close()
+            raise
+        self._sock.setblocking(False)
+
+        self._widget.tk.createfilehandler(self._sock.fileno(), tk.READABLE, self._accept)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.close()
+
+    def stats(self):
+        """Return a snapshot of statistics, as a dictionary:
+
+        ``accepted``
+            The number of connections that have been accepted.
+
+        ``events``, ``dropped``, ``errors``
+            Totals over all clients, including those that have disconnected;
+            see below.
+
+        ``clients``
+            A list with a dictionary for each client that is connected,
+            or that still has events pending:
+
+            ``client``
+                A number that identifies the connection.
+
+            ``pid``
+                The process id of the client, if it is known.
+
+            ``duration``
+                How long the client has been connected, in seconds.
+
+            ``bytes``, ``frames``, ``events``
+                The amount of data received from the client.
+
+            ``dropped``
+                The number of events that did not fit into the queue.
+
+            ``errors``
+                The number of frames that were too big or could not be decoded.
+
+            ``pending``
+                The number of events held back until there is room in the queue;
+                see ``max_pending``.
+
+            ``events_per_second``, ``bytes_per_second``
+                The average throughput since the client connected.
+        """
+
+        clients = [client.stats() for client in self._clients.values()]
+        return dict(
+            accepted=self.accepted,
+            events=self.events + sum(c['events'] for c in clients),
+            dropped=self.dropped + sum(c['dropped'] for c in clients),
+            errors=self.errors + sum(c['errors'] for c in clients),
+            clients=clients
+        )
+
+    def close(self):
+        """Stop listening, disconnect all the clients, and remove the socket.
+
+        Events already read from the clients are put into the queue first,
+        as far as ``max_pending`` allows; the rest are counted as dropped.
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+
+        self._widget.tk.deletefilehandler(self._sock.fileno())
+        self._sock.close()
+        self._stalled = []
+        for client in list(self._clients.values()):
+            client.stalled = False
+            client.source.close()
+            self._put_pending(client)
+            client.dropped += len(client.pending)
+            client.pending = []
+            self._disconnected(client)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _accept(self, what, how):
+        while True:
+            try:
+                sock, _ = self._sock.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                log.exception("Exception raised accepting a connection")
+                return
+
+            sock.setblocking(False)
+            self.accepted += 1
+            client = _Client(self.accepted, sock, self._codec, self._max_frame)
+            self._clients[client.number] = client
+            client.source = FdEventSource(
+                sock,
+                batch_handler=lambda events, client=client: self._deliver(client, events),
+                parser=client,
+                read_size=self._read_size,
+                max_reads=self._max_reads,
+                on_eof=lambda client=client: self._disconnected(client),
+                close_fd=True,
+                widget=self._widget
+            )
+
+    def _deliver(self, client, events):
+        client.pending.extend(events)
+        self._put_pending(client)
+        if client.pending and not client.stalled:
+            # Stop reading from the client until Tk has caught up
+            client.source.pause()
+            self._stall(client)
+
+    def _stall(self, client):
+        """Hold a client back until the queue has emptied by half."""
+
+        client.stalled = True
+        self._stalled.append(client)
+        if not self._waiting:
+            self._waiting = True
+            self._queue._when_room(self._room, self._max_pending // 2)
+
+    def _room(self):
+        self._waiting = False
+        stalled, self._stalled = self._stalled, []
+        for client in stalled:
+            client.stalled = False
+            self._put_pending(client)
+            if client.pending:
+                self._stall(client)
+            elif client.disconnected:
+                self._retire(client)
+            else:
+                client.source.resume()
+
+    def _put_pending(self, client):
+        """Put as many of the client's pending events as ``max_pending`` allows."""
+
+        room = self._max_pending - self._queue.qsize()
+        if room <= 0 or not client.pending:
+            return
+        events, client.pending = client.pending[:room], client.pending[room:]
+
+        if not self._bounded:
+            self._queue.put_many(events)
+            return
+
+        for event in events:
+            try:
+                self._queue.put(event, block=False)
+            except queue.Full:
+                client.dropped += 1
+
+    def _disconnected(self, client):
+        client.disconnected = True
+        if not client.pending:
+            self._retire(client)
+
+    def _retire(self, client):
+        if self._clients.pop(client.number, None) is None:
+            return
+        self.events += client.events
+        self.dropped += client.dropped
+        self.errors += client.errors
+
+
+class EventClient:
+    """Send events to an :class:`EventListener`.
+
+    This uses an ordinary blocking socket, and does not need Tk.   If the
+    listener cannot keep up, :meth:`send` waits.
+
+    ``path``
+        The path of the listener's socket.
+
+    ``codec``
+        The codec that the listener uses.
+
+    :class:`EventClient` implements the context manager protocol; exiting the
+    context calls :meth:`close`.
+
+    .. automethod:: send
+    .. automethod:: put
+    .. automethod:: close
+
+    """
+
+    def __init__(self, path, codec='pickle'):
+        self._codec = _make_codec(codec)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(path)
+        except OSError:
+            self._sock.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.close()
+
+    def send(self, events):
+        """Send a batch of events, as a single frame."""
+
+        payload = self._codec.encode(events)
+        self._sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+    def put(self, event):
+        """Send a single event."""
+
+        self.send((event,))
+
+    def close(self):
+        """Close the connection."""
+
+        self._sock.close()
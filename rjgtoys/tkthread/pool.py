@@ -0,0 +1,291 @@
+"""
+
+.. autoclass:: GeneratorPool
+
+.. autoclass:: PooledGenerator
+
+"""
+
+import threading
+
+from collections import deque
+
+import logging
+
+from rjgtoys.tkthread import DequeEventQueue
+
+log = logging.getLogger(__name__)
+
+
+class GeneratorPool:
+    """Run many event generators on a fixed number of threads.
+
+    Each :class:`~rjgtoys.tkthread.EventGenerator` has a thread of its own,
+    which is expensive when there are hundreds of sources of events.
+    A :class:`GeneratorPool` instead shares a fixed set of worker threads
+    between any number of :class:`PooledGenerator` sources.   Each worker
+    takes the next source in turn, takes up to ``chunk_size`` values from
+    it, and then puts it back at the end of the line, so that every source
+    gets a fair share of the workers.
+
+    The values from all the sources are delivered through a single
+    :class:`~rjgtoys.tkthread.DequeEventQueue`, and so share one file
+    handler in the Tk event loop.
+
+    A source that blocks waiting for its next value holds on to a worker while
+    it does so; there should be enough workers to cover the number of sources
+    that are likely to be waiting at the same time.
+
+    **NOTE**:
+
+      The constructor, and :meth:`shutdown`, must be called from the main Tk thread.
+
+    ``workers``
+        The number of worker threads.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``chunk_size``
+        The number of values to take from a source before moving on to the next.
+
+    Any other keyword arguments, such as ``time_budget``, are passed to the
+    :class:`~rjgtoys.tkthread.DequeEventQueue` constructor.
+
+    :class:`GeneratorPool` implements the context manager protocol; exiting the
+    context calls :meth:`shutdown`.
+
+    .. automethod:: add
+    .. automethod:: shutdown
+
+    """
+
+    def __init__(self, workers=4, widget=None, chunk_size=16, **options):
+
+        self._chunk_size = chunk_size
+        self._queue = DequeEventQueue(
+            batch_handler=self._deliver, widget=widget, max_batch=0,
+            edge_triggered=True, **options
+        )
+        self._ready = deque()
+        self._sources = set()
+        self._lock = threading.Condition()
+        self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._work, name='GeneratorPool-%d' % (i,), daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.shutdown()
+
+    def add(self, *, generator=None, handler=None, batch_handler=None):
+        """Create and start a :class:`PooledGenerator` that uses this pool."""
+
+        return PooledGenerator(
+            generator=generator, handler=handler, batch_handler=batch_handler, pool=self
+        )
+
+    def shutdown(self, timeout=None):
+        """Wait for all the sources to finish, process their events, and stop the workers.
+
+        ``timeout`` limits the time spent waiting for each source.
+        """
+
+        for source in list(self._sources):
+            source.join(timeout)
+
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+
+        self._queue.drain()
+
+    def _start(self, source):
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("GeneratorPool has been shut down")
+            self._sources.add(source)
+            self._ready.append(source)
+            self._lock.notify()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._ready:
+                    if self._stopping:
+                        return
+                    self._lock.wait()
+                source = self._ready.popleft()
+
+            if source._step(self._chunk_size, self._queue.put):
+                with self._lock:
+                    self._ready.append(source)
+                    self._lock.notify()
+            else:
+                with self._lock:
+                    self._sources.discard(source)
+
+    def _deliver(self, items):
+        """Pass events to their handlers; items are ``(source, event)`` pairs."""
+
+        batches = {}
+        for source, event in items:
+            if source._batch_handler is None:
+                source._handle(event)
+            else:
+                batches.setdefault(source, []).append(event)
+
+        for source, events in batches.items():
+            source._handle_batch(events)
+
+    def _flush(self):
+        """Process every event that is waiting."""
+
+        self._queue._flush()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def _get_default_pool():
+    global _default_pool
+
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = GeneratorPool()
+        return _default_pool
+
+
+class PooledGenerator:
+    """A source of events that runs on a :class:`GeneratorPool`.
+
+    A :class:`PooledGenerator` is used like an :class:`~rjgtoys.tkthread.EventGenerator`,
+    but does not have a thread of its own.
+
+    **NOTE**:
+
+      The constructor must be called from the main Tk thread.
+
+    ``generator``
+        An iterable that will provide the events to be processed.
+
+    ``handler``
+        A callable that will be called, from the Tk event loop, as ``handler(event)``
+        for each value taken from the ``generator``.
+
+    ``batch_handler``
+        An alternative to ``handler``, that is called as ``batch_handler(events)``
+        with a list of all the values from this source that were waiting.
+        Exactly one of ``handler`` and ``batch_handler`` must be passed.
+
+    ``pool``
+        The :class:`GeneratorPool` on which to run, or ``None`` to use a
+        shared pool that is created (attached to the default root widget)
+        the first time it is needed.
+
+    ``start``
+        A boolean that indicates whether to start taking values from the
+        ``generator``.   The default is to start immediately.
+
+    An exception raised by the ``generator`` is logged, and ends the source.
+
+    :class:`PooledGenerator` implements the context manager protocol.
+    If used as a context manager, exiting the context implies calling :meth:`drain`.
+
+    .. automethod:: start
+    .. automethod:: join
+    .. automethod:: is_alive
+    .. automethod:: drain
+
+    """
+
+    def __init__(self, *, generator=None, handler=None, batch_handler=None, pool=None, start=True):
+
+        if (handler is None) == (batch_handler is None):
+            raise ValueError("PooledGenerator needs exactly one of handler and batch_handler")
+
+        self._generator = generator
+        self._iterator = None
+        self._handler = handler
+        self._batch_handler = batch_handler
+        self._pool = pool or _get_default_pool()
+        self._done = threading.Event()
+        self._started = False
+        if start:
+            self.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.drain()
+
+    def start(self):
+        """Start taking values from the generator."""
+
+        if self._started:
+            raise RuntimeError("PooledGenerator can only be started once")
+        self._started = True
+        self._iterator = iter(self._generator)
+        self._pool._start(self)
+
+    def join(self, timeout=None):
+        """Wait (for up to ``timeout`` seconds, or indefinitely) for the generator to be exhausted.
+
+        Does *not* process the events.
+        """
+
+        self._done.wait(timeout)
+
+    def is_alive(self):
+        """Return ``True`` if the generator has been started and is not yet exhausted."""
+
+        return self._started and not self._done.is_set()
+
+    def drain(self, timeout=None):
+        """Wait until the generator has been exhausted, and its events processed.
+
+        Calls ``join(timeout)`` and then processes all the events waiting in the
+        pool (even if the ``join`` timed out).   Must be called from the Tk thread.
+        """
+
+        self.join(timeout)
+        self._pool._flush()
+
+    def _step(self, count, put):
+        """Take up to ``count`` values, passing them to ``put``.
+
+        Runs in a worker thread.   Returns ``True`` if there may be more values.
+        """
+
+        try:
+            for _ in range(count):
+                put((self, next(self._iterator)))
+            return True
+        except StopIteration:
+            pass
+        except Exception as e:
+            log.exception("Exception raised by pooled generator")
+
+        self._done.set()
+        return False
+
+    def _handle(self, event):
+        try:
+            self._handler(event)
+        except Exception as e:
+            log.exception("Exception raised by event handler")
+
+    def _handle_batch(self, events):
+        try:
+            self._batch_handler(events)
+        except Exception as e:
+            log.exception("Exception raised by event handler")
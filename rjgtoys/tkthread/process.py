@@ -0,0 +1,346 @@
+"""
+
+.. autoclass:: ProcessEventGenerator
+
+"""
+
+import multiprocessing
+import time
+import traceback
+
+import tkinter as tk
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# Messages sent by the child process
+
+_EVENTS = 'events'
+_ERROR = 'error'
+_DONE = 'done'
+
+
+class _RemoteTraceback(Exception):
+    """Carries the formatted traceback of an exception raised in the child."""
+
+    def __init__(self, tb):
+        self.tb = tb
+
+    def __str__(self):
+        return self.tb
+
+
+def _produce(generator, args, kwargs, events, acks, chunk_size, maxsize):
+    """The body of the child process.
+
+    Sends the values from ``generator(*args, **kwargs)`` as lists of up to
+    ``chunk_size`` values.   If ``maxsize`` is set, no more than that many
+    values may have been sent and not yet acknowledged by the parent.
+    """
+
+    outstanding = 0
+    chunk = []
+
+    def send(chunk):
+        nonlocal outstanding
+        if maxsize:
+            while acks.poll():
+                outstanding -= acks.recv()
+            while outstanding + len(chunk) > maxsize:
+                outstanding -= acks.recv()
+            outstanding += len(chunk)
+        events.send((_EVENTS, chunk))
+
+    try:
+        for work in generator(*args, **kwargs):
+            chunk.append(work)
+            if len(chunk) >= chunk_size:
+                full, chunk = chunk, []
+                send(full)
+        if chunk:
+            full, chunk = chunk, []
+            send(full)
+    except (BrokenPipeError, EOFError):
+        # The parent has gone away
+        return
+    except Exception as e:
+        tb = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+        try:
+            # Values are only left in the chunk if the generator failed,
+            # rather than sending them; pass them on before the error
+            # if they can be sent at all.
+            if chunk:
+                try:
+                    send(chunk)
+                except Exception:
+                    pass
+            try:
+                events.send((_ERROR, e, tb))
+            except Exception:
+                events.send((_ERROR, RuntimeError(repr(e)), tb))
+        except (BrokenPipeError, EOFError):
+            pass
+        return
+
+    events.send((_DONE,))
+
+
+class ProcessEventGenerator:
+    """Run an event generator in a child process.
+
+    An :class:`~rjgtoys.tkthread.EventGenerator` runs its generator in a thread,
+    which has to share the GIL with the Tk thread; a generator that does a lot
+    of computation (parsing, decoding, image processing and so on) can make
+    the user interface stutter.   A :class:`ProcessEventGenerator` runs the
+    generator in a child process instead, and sends the values it produces
+    back to the Tk thread through a pipe.
+
+    The values are pickled and sent in batches (frames) of up to ``chunk_size``
+    values.   The receiving end of the pipe is registered directly with Tk,
+    so no thread is needed in the parent process, and the Tk event loop is
+    woken once per frame rather than once per value.
+
+    **NOTE**:
+
+      The ``generator`` is called in the child process, so it must be
+      a function (such as a generator function) that can be pickled, rather
+      than a generator object: it must be defined at the top level of
+      a module, and the ``args`` and ``kwargs`` must be picklable, as must
+      the values that it produces.
+
+      The constructor, :meth:`drain` and :meth:`cancel` must be called from
+      the main Tk thread.
+
+    ``generator``
+        A function that will be called, in the child process, as
+        ``generator(*args, **kwargs)`` and that should return an iterable
+        of the values to be handled.
+
+    ``args``, ``kwargs``
+        The arguments for ``generator``.
+
+    ``handler``
+        The function to call, in the Tk thread, for each value.
+
+    ``batch_handler``
+        A function to call with a list of values instead;
+        exactly one of ``handler`` and ``batch_handler`` must be given.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``maxsize``
+        If this is greater than zero, the child process is not allowed to
+        get more than ``maxsize`` values ahead of the handler: it blocks
+        until the Tk thread has handled earlier values, as a producer would
+        on a full :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``chunk_size``
+        The maximum number of values in each frame.   Values are sent as soon as
+        a frame is full (or the generator ends), so a generator that produces
+        values slowly should use a small ``chunk_size``.
+
+    ``max_frames``
+        The maximum number of frames to handle each time the Tk event loop
+        calls back; any others are handled on later calls, so that the user
+        interface stays responsive.
+
+    ``start_method``
+        The :mod:`multiprocessing` start method, ``'forkserver'`` or ``'spawn'``.
+        The default is ``'forkserver'`` where it is available.
+        Forking a process that has threads is unsafe, so ``'fork'`` is best avoided.
+
+    ``start``
+        If ``True`` (the default) the child process is started immediately;
+        otherwise, :meth:`start` must be called.
+
+    If the generator raises an exception, the exception is raised again by
+    :meth:`drain`, with the child's traceback as its cause.   If the child
+    process exits unexpectedly, :meth:`drain` raises :exc:`RuntimeError`.
+    If a value sent by the child cannot be unpickled, the child is stopped,
+    and :meth:`drain` raises the exception from unpickling it.
+
+    :class:`ProcessEventGenerator` implements the context manager protocol;
+    exiting the context calls :meth:`drain`.
+
+    .. automethod:: start
+    .. automethod:: is_alive
+    .. automethod:: drain
+    .. automethod:: cancel
+
+    """
+
+    def __init__(
+        self, *,
+        generator,
+        args=(),
+        kwargs=None,
+        handler=None,
+        batch_handler=None,
+        widget=None,
+        maxsize=0,
+        chunk_size=16,
+        max_frames=1,
+        start_method=None,
+        name=None,
+        start=True
+        ):
+
+        if (handler is None) == (batch_handler is None):
+            raise ValueError("Exactly one of handler and batch_handler must be given")
+
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'forkserver' if 'forkserver' in methods else 'spawn'
+
+        if maxsize > 0:
+            chunk_size = min(chunk_size, maxsize)
+
+        self._handler = handler
+        self._batch_handler = batch_handler
+        self._widget = widget or tk._default_root
+        self._maxsize = maxsize
+        self._max_frames = max(max_frames, 1)
+        self._exception = None
+        self._finished = False
+
+        context = multiprocessing.get_context(start_method)
+        self._events, events = context.Pipe(duplex=False)
+        acks, self._acks = context.Pipe(duplex=False)
+        self._child_ends = (events, acks)
+        self._process = context.Process(
+            target=_produce,
+            args=(generator, args, kwargs or {}, events, acks, chunk_size, maxsize),
+            name=name,
+            daemon=True
+        )
+
+        if start:
+            self.start()
+
+    def start(self):
+        """Start the child process."""
+
+        self._process.start()
+        for conn in self._child_ends:
+            conn.close()
+        self._child_ends = ()
+        self._widget.tk.createfilehandler(self._events.fileno(), tk.READABLE, self._readable)
+
+    def is_alive(self):
+        """Return ``True`` if the child process is running."""
+
+        return self._process.is_alive()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.drain()
+
+    def drain(self, timeout=None):
+        """Handle all the remaining values, and wait for the child process to finish.
+
+        If the child has not finished after ``timeout`` seconds, it is terminated.
+        If the generator raised an exception, it is raised here; if the child
+        exited without finishing, :exc:`RuntimeError` is raised.
+        """
+
+        if not self._finished:
+            self._widget.tk.deletefilehandler(self._events.fileno())
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._finished:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                if not self._events.poll(remaining):
+                    break
+                self._receive()
+
+        self._close(timeout=0 if not self._finished else timeout)
+
+        if self._exception is not None:
+            e, self._exception = self._exception, None
+            raise e
+
+    def cancel(self):
+        """Stop the child process, discarding any values that have not been handled."""
+
+        if not self._finished:
+            self._widget.tk.deletefilehandler(self._events.fileno())
+            self._finished = True
+        self._close(timeout=0)
+
+    def _close(self, timeout=None):
+        """Wait for up to ``timeout`` seconds for the child to exit, then terminate it."""
+
+        self._finished = True
+        if self._process.pid is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+        self._events.close()
+        self._acks.close()
+
+    def _readable(self, what, how):
+        for _ in range(self._max_frames):
+            self._receive()
+            if self._finished:
+                self._widget.tk.deletefilehandler(self._events.fileno())
+                break
+            if not self._events.poll():
+                break
+
+    def _receive(self):
+        """Receive and handle one frame."""
+
+        try:
+            message = self._events.recv()
+        except (EOFError, OSError):
+            # The child went away without saying that it had finished
+            self._process.join()
+            self._exception = RuntimeError(
+                "Event generator process exited unexpectedly (exit code %s)" % (self._process.exitcode,)
+            )
+            self._finished = True
+            return
+        except Exception as e:
+            # Something the child sent cannot be unpickled here; the child
+            # cannot carry on usefully, so stop it
+            self._exception = e
+            self._finished = True
+            self._process.terminate()
+            return
+
+        kind = message[0]
+        if kind == _EVENTS:
+            events = message[1]
+            self._deliver(events)
+            if self._maxsize:
+                try:
+                    self._acks.send(len(events))
+                except OSError:
+                    pass
+        elif kind == _ERROR:
+            e, tb = message[1:]
+            e.__cause__ = _RemoteTraceback(tb)
+            self._exception = e
+            self._finished = True
+        else:
+            self._finished = True
+
+    def _deliver(self, events):
+        if self._batch_handler is not None:
+            try:
+                self._batch_handler(events)
+            except Exception:
+                log.exception("Exception raised by event handler")
+            return
+
+        for event in events:
+            try:
+                self._handler(event)
+            except Exception:
+                log.exception("Exception raised by event handler")
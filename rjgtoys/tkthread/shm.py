@@ -0,0 +1,392 @@
+"""
+
+Pass large binary payloads, such as video frames or arrays, to the Tk thread
+without copying them.
+
+Putting a large buffer into an :class:`~rjgtoys.tkthread.EventQueue` is cheap
+within a process, but sending it from another process means pickling it, and
+even within a process a producer that allocates a new buffer for every frame
+keeps the allocator busy.
+
+A :class:`SharedFrameQueue` instead owns a block of shared memory divided into
+a fixed number of equal-sized slots, used as a ring buffer.   A producer (in
+another thread, or in a child process) uses a :class:`FrameWriter` to reserve
+a slot, fills it in place, and commits it; only a small descriptor (the slot
+number and the length of the data) is sent through a pipe, which also wakes
+up the Tk event loop.   The handler is passed a :class:`Frame`, whose
+:attr:`~Frame.data` is a :class:`memoryview` of the slot itself::
+
+    def show(frame):
+        image = numpy.frombuffer(frame.data, dtype=numpy.uint8).reshape(480, 640, 3)
+        ...
+
+    frames = SharedFrameQueue(handler=show, slots=4, slot_size=640 * 480 * 3)
+
+    def capture(writer):
+        while True:
+            with writer.reserve() as slot:
+                length = camera.readinto(slot.data)
+                slot.commit(length)
+
+    process = multiprocessing.get_context('spawn').Process(
+        target=capture, args=(frames.writer(),)
+    )
+
+The slot is released when the handler returns, unless the handler calls
+:meth:`Frame.retain`, in which case it remains valid until :meth:`Frame.release`
+is called.   A producer that finds all the slots in use waits for one to be released.
+
+.. autoclass:: SharedFrameQueue
+
+.. autoclass:: FrameWriter
+
+.. autoclass:: Frame
+
+"""
+
+import multiprocessing
+import queue
+import struct
+import threading
+
+from multiprocessing import shared_memory
+
+import tkinter as tk
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# A descriptor: the slot number, and the length of the data in it.
+# Abandoned reservations are sent with a length of _ABANDONED
+
+_DESCRIPTOR = struct.Struct('<II')
+_ABANDONED = 0xffffffff
+
+
+class Frame:
+    """A payload passed to the handler of a :class:`SharedFrameQueue`.
+
+    .. py:attribute:: data
+
+       A :class:`memoryview` of the payload, in shared memory.   It is
+       only valid until the frame is released.
+
+    .. py:attribute:: slot
+
+       The number of the slot that holds the payload.
+
+    .. automethod:: retain
+    .. automethod:: release
+
+    A :class:`Frame` implements the context manager protocol; exiting the
+    context calls :meth:`release`.
+
+    """
+
+    __slots__ = ('data', 'slot', 'retained', '_owner')
+
+    def __init__(self, owner, slot, data):
+        self._owner = owner
+        self.slot = slot
+        self.data = data
+        self.retained = False
+
+    def retain(self):
+        """Keep the frame (and its slot) after the handler returns.
+
+        The frame must then be released by calling :meth:`release`.
+        """
+
+        self.retained = True
+
+    def release(self):
+        """Release the slot, so that it can be used for another payload.
+
+        :attr:`data` must not be used after this call.
+        """
+
+        owner, self._owner = self._owner, None
+        if owner is not None:
+            owner._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.release()
+
+
+class _Reservation:
+    """A slot reserved by a :class:`FrameWriter`, being filled by a producer."""
+
+    __slots__ = ('data', 'slot', '_writer')
+
+    def __init__(self, writer, slot, data):
+        self._writer = writer
+        self.slot = slot
+        self.data = data
+
+    def commit(self, length=None):
+        """Send the first ``length`` bytes of the slot (by default, all of it) to the handler."""
+
+        if length is None:
+            length = len(self.data)
+        if not 0 <= length <= len(self.data):
+            raise ValueError("length must be between 0 and the slot size")
+        self._finish(length)
+
+    def abandon(self):
+        """Return the slot without sending anything to the handler."""
+
+        self._finish(_ABANDONED)
+
+    def _finish(self, length):
+        writer, self._writer = self._writer, None
+        if writer is None:
+            raise RuntimeError("The slot has already been committed or abandoned")
+        self.data.release()
+        writer._send(self.slot, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        if self._writer is not None:
+            self.abandon()
+
+
+class FrameWriter:
+    """The producer's end of a :class:`SharedFrameQueue`.
+
+    Obtain one by calling :meth:`SharedFrameQueue.writer`.   A :class:`FrameWriter`
+    may be used by any number of threads, and may be passed to child processes
+    as an argument to :class:`multiprocessing.Process` (but not through a queue
+    or pipe).
+
+    .. py:attribute:: slot_size
+
+       The size of each slot, in bytes.
+
+    .. automethod:: reserve
+    .. automethod:: put
+    .. automethod:: close
+
+    """
+
+    def __init__(self, name, slots, slot_size, free, head, conn):
+        self._name = name
+        self._slots = slots
+        self.slot_size = slot_size
+        self._free = free
+        self._head = head
+        self._conn = conn
+        self._shm = None
+        self._owned = False
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        state['_owned'] = False
+        return state
+
+    def _attach(self, shm):
+        """Share the creator's mapping, rather than mapping the memory again."""
+
+        self._shm = shm
+
+    def reserve(self, block=True, timeout=None):
+        """Reserve a slot to be filled in place.
+
+        Returns an object whose ``data`` attribute is a writable :class:`memoryview`
+        of the whole slot, and whose ``commit(length=None)`` method sends the first
+        ``length`` bytes to the handler.   It is a context manager; if the context
+        is left without calling ``commit``, the slot is abandoned.
+
+        If no slot is free, waits for one as :meth:`queue.Queue.put` would, raising
+        :exc:`queue.Full` if none became free.
+        """
+
+        if not self._free.acquire(block, timeout):
+            raise queue.Full
+
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self._name)
+            self._owned = True
+
+        with self._head.get_lock():
+            slot = self._head.value
+            self._head.value = (slot + 1) % self._slots
+
+        offset = slot * self.slot_size
+        return _Reservation(self, slot, self._shm.buf[offset:offset + self.slot_size])
+
+    def put(self, data, block=True, timeout=None):
+        """Copy a bytes-like object into a slot, and send it to the handler."""
+
+        data = memoryview(data).cast('B')
+        if len(data) > self.slot_size:
+            raise ValueError("data is larger than the slot size (%d bytes)" % (self.slot_size,))
+
+        with self.reserve(block, timeout) as slot:
+            slot.data[:len(data)] = data
+            slot.commit(len(data))
+
+    def close(self):
+        """Release this process's mapping of the shared memory."""
+
+        if self._owned and self._shm is not None:
+            self._shm.close()
+        self._shm = None
+
+    def _send(self, slot, length):
+        self._conn.send_bytes(_DESCRIPTOR.pack(slot, length))
+
+
+class SharedFrameQueue:
+    """Deliver payloads from shared memory slots to a handler in the Tk thread.
+
+    **NOTE**:
+
+      The constructor, and :meth:`drain`, must be called from the main Tk thread.
+
+    ``handler``
+        The function to call, in the Tk thread, with each :class:`Frame`.
+
+    ``slot_size``
+        The size of each slot, in bytes; the largest payload that can be sent.
+
+    ``slots``
+        The number of slots.   This is the greatest number of payloads that can
+        be waiting to be handled (or retained by the handler) at once.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        See :class:`~rjgtoys.tkthread.EventQueue`.
+
+    ``max_batch``
+        The maximum number of frames to handle each time the Tk event loop
+        calls back; ``0`` handles all those that are waiting.
+
+    ``context``
+        The :mod:`multiprocessing` context used to create the semaphore and pipe
+        shared with the producers, or ``None`` for the default context.   Child
+        processes that use the :class:`FrameWriter` should be created from the
+        same context.
+
+    :class:`SharedFrameQueue` implements the context manager protocol; exiting the
+    context calls :meth:`drain`.
+
+    .. automethod:: writer
+    .. automethod:: drain
+
+    """
+
+    def __init__(self, handler, slot_size, slots=8, widget=None, max_batch=0, context=None):
+
+        if slot_size <= 0 or slots <= 0:
+            raise ValueError("slot_size and slots must be positive")
+
+        context = context or multiprocessing.get_context()
+
+        self._handler = handler
+        self._widget = widget or tk._default_root
+        self._max_batch = max_batch
+        self._slots = slots
+        self._slot_size = slot_size
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self._free = context.BoundedSemaphore(slots)
+        self._head = context.Value('L', 0)
+        self._conn, send = context.Pipe(duplex=False)
+        self._writer = FrameWriter(self._shm.name, slots, slot_size, self._free, self._head, send)
+        self._writer._attach(self._shm)
+
+        # Slots are handed out in ring order, so they are returned
+        # to the producers in that order too.
+
+        self._lock = threading.Lock()
+        self._tail = 0
+        self._done = [False] * slots
+        self._frames = {}
+        self._closed = False
+
+        self._widget.tk.createfilehandler(self._conn.fileno(), tk.READABLE, self._readable)
+
+    def writer(self):
+        """Return the :class:`FrameWriter` for this queue."""
+
+        return self._writer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.drain()
+
+    def drain(self):
+        """Handle any waiting frames, and release the shared memory.
+
+        Producers must have finished before this is called.   Any frames
+        that have been retained are released.
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+
+        self._widget.tk.deletefilehandler(self._conn.fileno())
+        self._receive(0)
+
+        for frame in list(self._frames.values()):
+            frame.release()
+
+        self._conn.close()
+        self._writer._conn.close()
+        try:
+            self._shm.close()
+        except BufferError:
+            log.warning("Shared memory is still in use, and will not be unmapped")
+        self._shm.unlink()
+
+    def _readable(self, what, how):
+        self._receive(self._max_batch)
+
+    def _receive(self, limit):
+        """Handle up to ``limit`` waiting frames (all of them, if ``limit`` is zero)."""
+
+        count = 0
+        while self._conn.poll():
+            slot, length = _DESCRIPTOR.unpack(self._conn.recv_bytes())
+            if length == _ABANDONED:
+                self._return_slot(slot)
+                continue
+
+            offset = slot * self._slot_size
+            frame = Frame(self, slot, self._shm.buf[offset:offset + length])
+            self._frames[slot] = frame
+            try:
+                self._handler(frame)
+            except Exception:
+                log.exception("Exception raised by event handler")
+            if not frame.retained:
+                frame.release()
+
+            count += 1
+            if count == limit:
+                break
+
+    def _release(self, frame):
+        self._frames.pop(frame.slot, None)
+        try:
+            frame.data.release()
+        except BufferError:
+            log.warning("Frame data is still in use after release")
+        self._return_slot(frame.slot)
+
+    def _return_slot(self, slot):
+        with self._lock:
+            self._done[slot] = True
+            while self._done[self._tail]:
+                self._done[self._tail] = False
+                self._tail = (self._tail + 1) % self._slots
+                self._free.release()
@@ -0,0 +1,220 @@
+"""
+
+An :mod:`asyncio` event loop that is driven by the Tk event loop.
+
+The usual way of running coroutines in a tkinter application is to
+call into an :mod:`asyncio` loop every few milliseconds from an ``after``
+callback, which costs CPU time even when there is nothing to do.
+
+A :class:`TkEventLoop` instead registers the file descriptors that
+:mod:`asyncio` is interested in with Tk, using ``createfilehandler``
+(as :class:`~rjgtoys.tkthread.EventQueue` does), and sets a single Tk
+timer for the next :mod:`asyncio` timer that is due.   Coroutines, futures
+and callbacks therefore all run on the Tk thread, and when they are all
+waiting the application uses no CPU at all::
+
+    root = tkinter.Tk()
+    loop = TkEventLoop(widget=root)
+    asyncio.set_event_loop(loop)
+
+    async def tick(label):
+        while True:
+            label['text'] = time.ctime()
+            await asyncio.sleep(1)
+
+    loop.create_task(tick(label))
+    root.mainloop()
+
+:meth:`TkEventLoop.call_soon_threadsafe` may be used from any thread
+to get a callback run on the Tk thread.
+
+.. autoclass:: TkEventLoop
+
+.. autoclass:: TkSelector
+
+"""
+
+import asyncio
+import math
+import selectors
+import threading
+
+import tkinter as tk
+
+from asyncio import events
+
+
+class TkSelector(selectors._BaseSelectorImpl):
+    """A :mod:`selectors` selector that is implemented by Tk file handlers.
+
+    It never waits: :meth:`select` returns the file descriptors that Tk
+    has reported as ready since the last call.   Whenever a file descriptor
+    becomes ready, ``callback`` (if it is set) is called with no arguments.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+
+    """
+
+    def __init__(self, widget=None, callback=None):
+        super().__init__()
+        self._widget = widget or tk._default_root
+        self.callback = callback
+        self._events = {}
+
+    def register(self, fileobj, events, data=None):
+        key = super().register(fileobj, events, data)
+        mask = 0
+        if events & selectors.EVENT_READ:
+            mask |= tk.READABLE
+        if events & selectors.EVENT_WRITE:
+            mask |= tk.WRITABLE
+        self._widget.tk.createfilehandler(key.fd, mask, self._ready)
+        return key
+
+    def unregister(self, fileobj):
+        key = super().unregister(fileobj)
+        self._widget.tk.deletefilehandler(key.fd)
+        self._events.pop(key.fd, None)
+        return key
+
+    def _ready(self, fd, mask):
+        events = 0
+        if mask & tk.READABLE:
+            events |= selectors.EVENT_READ
+        if mask & tk.WRITABLE:
+            events |= selectors.EVENT_WRITE
+        self._events[fd] = self._events.get(fd, 0) | events
+        if self.callback is not None:
+            self.callback()
+
+    def select(self, timeout=None):
+        ready = []
+        pending, self._events = self._events, {}
+        for fd, events in pending.items():
+            key = self._fd_to_key.get(fd)
+            if key is None:
+                continue
+            events &= key.events
+            if events:
+                ready.append((key, events))
+        return ready
+
+    def close(self):
+        for key in list(self._fd_to_key.values()):
+            self._widget.tk.deletefilehandler(key.fd)
+        self._events = {}
+        super().close()
+
+
+class TkEventLoop(asyncio.SelectorEventLoop):
+    """An :mod:`asyncio` event loop that runs within the Tk event loop.
+
+    Once it is created, a :class:`TkEventLoop` runs callbacks (and so
+    tasks) whenever the Tk event loop is running, for example within
+    ``mainloop()``; there is no need to call :meth:`run_forever`.
+
+    :meth:`run_forever` and :meth:`run_until_complete` are also available;
+    they run the Tk event loop until the :mod:`asyncio` loop is stopped.
+
+    **NOTE**:
+
+       The constructor, and all methods other than :meth:`call_soon_threadsafe`,
+       must be called from the Tk thread.
+
+       Just like any other Tk callback, a callback run by a :class:`TkEventLoop`
+       stops the user interface from responding until it returns, so coroutines
+       should not block.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the default root widget.
+        It is used to create Tk file handlers and timers.
+
+    """
+
+    def __init__(self, widget=None):
+        self._widget = widget or tk._default_root
+        self._timer = None
+        self._timer_due = None
+        self._in_tick = False
+        super().__init__(TkSelector(self._widget, callback=self._tick))
+
+    def call_soon(self, callback, *args, context=None):
+        handle = super().call_soon(callback, *args, context=context)
+        if not self._in_tick:
+            self._schedule()
+        return handle
+
+    def call_at(self, when, callback, *args, context=None):
+        handle = super().call_at(when, callback, *args, context=context)
+        if not self._in_tick:
+            self._schedule()
+        return handle
+
+    def run_forever(self):
+        """Run the Tk event loop until :meth:`stop` is called."""
+
+        self._check_closed()
+        self._check_running()
+        self._thread_id = threading.get_ident()
+        self._schedule()
+        try:
+            while not self._stopping:
+                self._widget.tk.dooneevent(0)
+        finally:
+            self._stopping = False
+            self._thread_id = None
+
+    def close(self):
+        self._cancel_timer()
+        super().close()
+
+    def _tick(self):
+        """Run the callbacks that are ready, as :meth:`run_forever` would do."""
+
+        if self._in_tick or self.is_closed():
+            return
+
+        self._in_tick = True
+        thread_id = self._thread_id
+        running = events._get_running_loop()
+        self._thread_id = threading.get_ident()
+        events._set_running_loop(self)
+        try:
+            self._run_once()
+        finally:
+            events._set_running_loop(running)
+            self._thread_id = thread_id
+            self._in_tick = False
+        self._schedule()
+
+    def _timeout(self):
+        self._timer = None
+        self._tick()
+
+    def _schedule(self):
+        """Set the Tk timer for when callbacks are next due to be run."""
+
+        if self.is_closed():
+            return
+
+        if self._ready:
+            due = 0
+        elif self._scheduled:
+            due = self._scheduled[0].when()
+        else:
+            return
+
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._cancel_timer()
+
+        delay = max(0, math.ceil((due - self.time()) * 1000)) if due else 0
+        self._timer_due = due
+        self._timer = self._widget.after(delay, self._timeout)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._widget.after_cancel(self._timer)
+            self._timer = None
@@ -0,0 +1,278 @@
+"""
+
+Show a stream of images, such as live video or plots rendered by a worker
+thread, without falling behind.
+
+If every frame is put into an :class:`~rjgtoys.tkthread.EventQueue`, a
+user interface that cannot keep up with the producer shows frames later
+and later.   A :class:`FrameSink` keeps only the newest complete frame:
+a frame that arrives before the previous one has been shown replaces it,
+and is counted as dropped::
+
+    label = tkinter.Label(root)
+    label.pack()
+
+    sink = FrameSink(target=label)
+
+    def capture():
+        while True:
+            width, height, pixels = camera.read()
+            sink.put((width, height, pixels))
+
+    threading.Thread(target=capture, daemon=True).start()
+
+.. autoclass:: FrameSink
+
+.. autofunction:: rgb_to_ppm
+
+"""
+
+import threading
+import time
+
+from collections import deque
+
+import tkinter as tk
+
+import logging
+
+from rjgtoys.tkthread import ConflatingEventQueue
+
+log = logging.getLogger(__name__)
+
+
+def rgb_to_ppm(width, height, pixels):
+    """Return image data in PPM format, which Tk reads quickly.
+
+    ``pixels`` is a bytes-like object holding ``height`` rows of ``width``
+    pixels, each three bytes (red, green, blue).
+    """
+
+    header = b'P6 %d %d 255\n' % (width, height)
+    return header + bytes(pixels)
+
+
+def _convert(frame):
+    """The default conversion; see :class:`FrameSink`."""
+
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return frame
+    shape = getattr(frame, 'shape', None)
+    if shape is not None:
+        height, width = shape[:2]
+        return rgb_to_ppm(width, height, frame.tobytes())
+    width, height, pixels = frame
+    return rgb_to_ppm(width, height, pixels)
+
+
+def _latest(event):
+    return None
+
+
+class FrameSink:
+    """Display the newest frame from a producer thread in a :class:`tkinter.PhotoImage`.
+
+    Frames are passed to :meth:`put` by any thread.   Each is converted to
+    image data by the ``convert`` function in the thread that calls :meth:`put`,
+    so that the Tk thread only has to load the converted data.
+
+    The sink is double buffered: it has two images, and loads each frame into
+    the one that is not being displayed before switching the ``target`` to it,
+    so that the displayed image always holds a complete frame.
+
+    **NOTE**:
+
+      The constructor, and :meth:`close`, must be called from the main Tk thread.
+
+    ``target``
+        A widget with an ``image`` option, such as a :class:`tkinter.Label`,
+        or a :class:`tkinter.Canvas` (in which case ``item`` must also be given),
+        or ``None`` to load every frame into a single image that the caller
+        displays; see :attr:`image`.
+
+    ``item``
+        The id of a Canvas image item that is the target.
+
+    ``convert``
+        A function that takes a frame and returns data that :class:`tkinter.PhotoImage`
+        can load: bytes in PPM, PNG or GIF format.   The default accepts such
+        bytes, ``(width, height, pixels)`` tuples of RGB data (see :func:`rgb_to_ppm`),
+        and arrays of shape ``(height, width, 3)`` and type ``uint8``, such as
+        NumPy arrays.
+
+    ``images``
+        The two :class:`tkinter.PhotoImage` objects to use, or ``None`` to create them.
+
+    ``widget``
+        A tkinter widget, or ``None`` to use the ``target`` or the default root widget.
+
+    ``fps_window``
+        The number of recent frames over which :attr:`fps` is measured.
+
+    ``stats_callback``
+        A function that is called, in the Tk thread, every ``stats_interval``
+        seconds with the result of :meth:`stats`.
+
+    :class:`FrameSink` implements the context manager protocol; exiting the
+    context calls :meth:`close`.
+
+    .. py:attribute:: image
+
+       The :class:`tkinter.PhotoImage` that is currently displayed.
+
+    .. automethod:: put
+    .. automethod:: stats
+    .. automethod:: close
+
+    """
+
+    def __init__(
+        self, target=None, *,
+        item=None,
+        convert=None,
+        images=None,
+        widget=None,
+        fps_window=30,
+        stats_callback=None,
+        stats_interval=1.0
+        ):
+
+        widget = widget or target or tk._default_root
+        self._widget = widget
+        self._target = target
+        self._item = item
+        self._convert = convert or _convert
+        if images is None:
+            images = [tk.PhotoImage(master=widget) for _ in range(2 if target else 1)]
+        self._images = list(images)
+        self._front = 0
+        self.image = self._images[0]
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self.received = 0
+        self.displayed = 0
+        self.convert_errors = 0
+        self._shown_at = deque(maxlen=max(fps_window, 2))
+
+        # Only the newest frame is kept waiting
+
+        self._queue = ConflatingEventQueue(
+            handler=self._show, widget=widget, key=_latest,
+            edge_triggered=True, max_batch=0
+        )
+
+        self._stats_callback = stats_callback
+        self._stats_interval = int(stats_interval * 1000)
+        self._stats_timer = None
+        if stats_callback is not None:
+            self._stats_timer = widget.after(self._stats_interval, self._report_stats)
+
+    def put(self, frame):
+        """Convert a frame, and arrange for it to be displayed.
+
+        May be called from any thread.   If the previous frame has not yet been
+        displayed, it is dropped.
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+            self.received += 1
+        try:
+            data = self._convert(frame)
+        except Exception:
+            with self._lock:
+                self.convert_errors += 1
+            log.exception("Exception raised converting frame")
+            return
+        with self._lock:
+            if not self._closed:
+                self._queue.put(data)
+
+    @property
+    def dropped(self):
+        """The number of frames that were replaced by newer ones before they were displayed."""
+
+        return self._queue.conflated
+
+    @property
+    def fps(self):
+        """The rate at which frames have recently been displayed, in frames per second."""
+
+        shown = self._shown_at
+        if len(shown) < 2:
+            return 0.0
+        elapsed = shown[-1] - shown[0]
+        return (len(shown) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Return a snapshot of statistics, as a dictionary:
+
+        ``received``
+            The number of frames passed to :meth:`put`.
+
+        ``displayed``
+            The number of frames displayed.
+
+        ``dropped``
+            The number of frames that were replaced before they were displayed.
+
+        ``convert_errors``
+            The number of frames that could not be converted.
+
+        ``fps``
+            The recent display rate, in frames per second.
+        """
+
+        return dict(
+            received=self.received,
+            displayed=self.displayed,
+            dropped=self.dropped,
+            convert_errors=self.convert_errors,
+            fps=self.fps
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, typ, val, tbk):
+        self.close()
+
+    def close(self):
+        """Display any waiting frame, and stop.
+
+        Frames that are put after this call are ignored.
+        """
+
+        with self._lock:
+            self._closed = True
+        self._queue.drain()
+        if self._stats_timer is not None:
+            self._widget.after_cancel(self._stats_timer)
+            self._stats_timer = None
+            self._report_stats(again=False)
+
+    def _show(self, data):
+        back = (self._front + 1) % len(self._images)
+        image = self._images[back]
+        image.configure(data=data)
+
+        if self._target is not None:
+            if self._item is None:
+                self._target.configure(image=image)
+            else:
+                self._target.itemconfigure(self._item, image=image)
+
+        self._front = back
+        self.image = image
+        self.displayed += 1
+        self._shown_at.append(time.monotonic())
+
+    def _report_stats(self, again=True):
+        if again:
+            self._stats_timer = self._widget.after(self._stats_interval, self._report_stats)
+        try:
+            self._stats_callback(self.stats())
+        except Exception:
+            log.exception("Exception raised by stats callback")
@@ -0,0 +1,377 @@
+"""
+
+The channels that wake up the Tk event loop when events are put into a queue.
+
+Each :class:`~rjgtoys.tkthread.EventQueue` has a wakeup channel: a file
+descriptor that Tk watches with ``createfilehandler``, and that a producer
+thread makes readable to say that events are waiting.   The kinds of channel are:
+
+``'eventfd'``
+    A Linux ``eventfd`` counter (:class:`EventfdWakeup`).   One file descriptor;
+    any number of wakeups cost one 8-byte write, and are collected by a single
+    read; a producer never blocks on it.
+
+``'pipe'``
+    A pipe carrying one byte per wakeup (:class:`PipeWakeup`).   Two file
+    descriptors; available everywhere.
+
+``'socketpair'``
+    A pair of connected sockets carrying one byte per wakeup (:class:`SocketpairWakeup`),
+    whose buffer sizes can be set.   Each one-byte write takes up several
+    hundred bytes of socket buffer, so only a few hundred wakeups can be
+    outstanding before a producer blocks; it suits edge-triggered queues best.
+
+A queue uses the :func:`default_backend` unless it is given a ``wakeup`` parameter.
+The default is ``'eventfd'`` where it is available, because it is the cheapest
+(see ``benchmarks/bench_wakeup.py``) and uses half as many file descriptors;
+otherwise it is ``'pipe'``.
+
+Share one wakeup channel, and one Tk file handler, between many event queues
+----------------------------------------------------------------------------
+
+By default every :class:`~rjgtoys.tkthread.EventQueue` has a channel of its own,
+and registers its own file handler with Tk.   An application with hundreds of
+queues therefore uses hundreds of file descriptors, and Tk has to check every
+one of them each time round its event loop.
+
+A queue created with ``shared_wakeup=True`` instead registers with the
+:class:`WakeupHub` for its Tcl interpreter.   The hub has a single channel and a
+single file handler; a queue that has events to handle adds itself to the
+hub's ready set, and the hub signals its channel only if it is not already
+due to wake up.   When Tk calls the hub, it passes control to each queue
+in the ready set in turn, so the cost of a wakeup depends on the number of
+queues that have work to do rather than on the number of queues.
+
+.. autofunction:: default_backend
+
+.. autofunction:: available_backends
+
+.. autofunction:: make_wakeup
+
+.. autoclass:: EventfdWakeup
+
+.. autoclass:: PipeWakeup
+
+.. autoclass:: SocketpairWakeup
+
+.. autoclass:: WakeupHub
+
+"""
+
+import os
+import socket
+import threading
+
+import tkinter as tk
+
+import logging
+
+log = logging.getLogger(__name__)
+
+# Upper limit on the number of wakeups consumed at once
+
+_READ_ALL = 65536
+
+
+class PipeWakeup:
+    """A wakeup channel made from a pipe, carrying one byte per wakeup.
+
+    This works everywhere that Tk can watch a file descriptor.   Once the pipe
+    is full, :meth:`signal` blocks until the Tk thread catches up.
+
+    A wakeup channel provides:
+
+    ``fileno()``
+        The file descriptor for Tk to watch.
+
+    ``signal(count)``
+        Send ``count`` wakeups; may be called from any thread.
+
+    ``consume(limit)``
+        Consume up to ``limit`` wakeups, and return the number consumed.
+        Called only by the Tk thread, and only when the channel is readable.
+
+    ``close()``
+        Close the channel.
+    """
+
+    def __init__(self):
+        self._r, self._w = os.pipe()
+
+    def fileno(self):
+        return self._r
+
+    def signal(self, count=1):
+        os.write(self._w, b"x" * count)
+
+    def consume(self, limit):
+        return len(os.read(self._r, limit))
+
+    def close(self):
+        for p in (self._r, self._w):
+            try:
+                os.close(p)
+            except OSError:
+                pass
+
+
+class EventfdWakeup:
+    """A wakeup channel made from a Linux ``eventfd`` counter.
+
+    It needs only one file descriptor.   Any number of wakeups are sent
+    by a single 8-byte write, and read back by a single 8-byte read, and
+    :meth:`signal` never blocks.   See :class:`PipeWakeup`.
+
+    ``semaphore``
+        If ``True``, the counter is created with ``EFD_SEMAPHORE``, so that
+        each read consumes exactly one wakeup.   That suits a channel that
+        is consumed one wakeup at a time: otherwise taking one wakeup from
+        a backlog needs a read, and a write to put the rest back.
+    """
+
+    def __init__(self, semaphore=False):
+        flags = os.EFD_NONBLOCK | os.EFD_CLOEXEC
+        if semaphore:
+            flags |= os.EFD_SEMAPHORE
+        self._semaphore = semaphore
+        self._fd = os.eventfd(0, flags)
+
+    def fileno(self):
+        return self._fd
+
+    def signal(self, count=1):
+        os.eventfd_write(self._fd, count)
+
+    def consume(self, limit):
+        if self._semaphore:
+            count = 0
+            while count < limit:
+                try:
+                    os.eventfd_read(self._fd)
+                except BlockingIOError:
+                    break
+                count += 1
+            return count
+
+        try:
+            count = os.eventfd_read(self._fd)
+        except BlockingIOError:
+            return 0
+        if count > limit:
+            # Put back what is not wanted yet; that keeps the fd readable
+            os.eventfd_write(self._fd, count - limit)
+            count = limit
+        return count
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class SocketpairWakeup:
+    """A wakeup channel made from a connected pair of sockets, carrying one byte per wakeup.
+
+    ``buffer_size``, if given, sets the socket buffer sizes, which limit how
+    many wakeups can be outstanding before :meth:`signal` blocks.
+    See :class:`PipeWakeup`.
+    """
+
+    def __init__(self, buffer_size=None):
+        self._r, self._w = socket.socketpair()
+        if buffer_size is not None:
+            self._r.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+            self._w.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+
+    def fileno(self):
+        return self._r.fileno()
+
+    def signal(self, count=1):
+        self._w.sendall(b"x" * count)
+
+    def consume(self, limit):
+        return len(self._r.recv(limit))
+
+    def close(self):
+        self._r.close()
+        self._w.close()
+
+
+_BACKENDS = {
+    'pipe': PipeWakeup,
+    'eventfd': EventfdWakeup,
+    'socketpair': SocketpairWakeup,
+}
+
+
+def available_backends():
+    """Return the names of the wakeup channels that can be used on this platform."""
+
+    names = ['pipe', 'socketpair']
+    if hasattr(os, 'eventfd'):
+        names.insert(0, 'eventfd')
+    return names
+
+
+def default_backend():
+    """Return the name of the fastest wakeup channel available on this platform."""
+
+    return 'eventfd' if hasattr(os, 'eventfd') else 'pipe'
+
+
+def make_wakeup(backend=None, one_at_a_time=False, **options):
+    """Create a wakeup channel.
+
+    ``backend`` is one of the names returned by :func:`available_backends`,
+    or ``None`` for the :func:`default_backend`.   ``options`` are passed
+    to the constructor of the channel.
+
+    ``one_at_a_time`` says that the channel will be consumed one wakeup at
+    a time, as a level-triggered queue with ``max_batch=1`` does; an
+    ``'eventfd'`` channel is then created as a semaphore.
+    """
+
+    backend = backend or default_backend()
+    if backend not in available_backends():
+        raise ValueError("Wakeup backend %r is not available here" % (backend,))
+    if one_at_a_time and backend == 'eventfd':
+        options.setdefault('semaphore', True)
+    return _BACKENDS[backend](**options)
+
+
+class WakeupHub:
+    """A wakeup channel and Tk file handler shared by the queues of one Tcl interpreter.
+
+    Queues do not normally use a hub directly: use ``shared_wakeup=True``
+    when creating the queue.
+
+    A client of the hub must provide:
+
+    ``_signals``
+        An integer attribute that counts the wakeups that the client has been
+        sent and not yet consumed; it is only changed by the hub.
+
+    ``_hub_ready()``
+        A method that the hub calls, in the Tk thread, when the client has
+        been signalled.   It should call :meth:`consume` to find out how
+        many wakeups it has been sent.
+
+    If a client has not consumed all its wakeups when ``_hub_ready`` returns,
+    it is called again on the next wakeup of the hub, after any other clients
+    that are ready.
+
+    **NOTE**:
+
+      :meth:`for_widget`, :meth:`register` and :meth:`unregister` must be
+      called from the main Tk thread.
+
+    .. automethod:: for_widget
+    .. automethod:: register
+    .. automethod:: unregister
+    .. automethod:: signal
+    .. automethod:: consume
+
+    """
+
+    _hubs = {}
+
+    def __init__(self, widget, backend=None):
+        self._widget = widget
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._ready = {}
+        self._pending = False
+        self._channel = make_wakeup(backend)
+        widget.tk.createfilehandler(self._channel.fileno(), tk.READABLE, self._readable)
+
+    @classmethod
+    def for_widget(cls, widget=None):
+        """Return the hub for the Tcl interpreter of a widget, creating it if necessary."""
+
+        widget = widget or tk._default_root
+        hub = cls._hubs.get(widget.tk)
+        if hub is None:
+            hub = cls._hubs[widget.tk] = cls(widget)
+        return hub
+
+    def __len__(self):
+        return len(self._clients)
+
+    def register(self, client):
+        """Add a client to the hub."""
+
+        client._signals = 0
+        self._clients.add(client)
+
+    def unregister(self, client):
+        """Remove a client from the hub.
+
+        The hub closes its channel, and removes its file handler,
+        when it no longer has any clients.
+        """
+
+        with self._lock:
+            self._clients.discard(client)
+            self._ready.pop(client, None)
+            client._signals = 0
+            if self._clients:
+                return
+
+        if self._hubs.get(self._widget.tk) is self:
+            del self._hubs[self._widget.tk]
+
+        self._widget.tk.deletefilehandler(self._channel.fileno())
+        self._channel.close()
+
+    def signal(self, client, count=1):
+        """Send ``count`` wakeups to a client.   May be called from any thread."""
+
+        with self._lock:
+            if client not in self._clients:
+                return
+            client._signals += count
+            self._ready[client] = None
+            if self._pending:
+                return
+            self._pending = True
+
+        self._channel.signal()
+
+    def consume(self, client, limit):
+        """Consume up to ``limit`` of the wakeups sent to a client; return the number consumed."""
+
+        with self._lock:
+            count = min(client._signals, limit)
+            client._signals -= count
+        return count
+
+    def _readable(self, what, how):
+
+        # Clear the pending flag before looking at the ready set, so that
+        # anything signalled after this point will write again.
+
+        self._channel.consume(_READ_ALL)
+        with self._lock:
+            self._pending = False
+            ready, self._ready = self._ready, {}
+
+        for client in ready:
+            if client not in self._clients:
+                continue
+            try:
+                client._hub_ready()
+            except Exception:
+                log.exception("Exception raised by event queue")
+
+        # Clients with wakeups left over are called again
+
+        with self._lock:
+            for client in ready:
+                if client._signals and client in self._clients:
+                    self._ready[client] = None
+            if not self._ready or self._pending:
+                return
+            self._pending = True
+
+        self._channel.signal()
@@ -4,10 +4,13 @@ Test fixtures and helpers
 
 import os
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 
+import tkinter as tk
+import _tkinter
+
 @pytest.fixture
 def widget():
     """A Mock widget."""
@@ -18,6 +21,74 @@ def widget():
 
     return w
 
+PIPE_R = 'pipe_r'   # NB: deliberately not even an integer
+PIPE_W = 'pipe_w'
+
+@pytest.fixture
+def mock_pipe():
+    """Make event queues use a pipe for wakeups, and a fake pipe at that."""
+
+    with patch('rjgtoys.tkthread.wakeup.default_backend', return_value='pipe'), \
+         patch('rjgtoys.tkthread.wakeup.os.pipe', return_value=(PIPE_R, PIPE_W)) as p:
+        yield p
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock_target():
+    """The clock that the ``clock`` fixture replaces.
+
+    A test module that needs another clock can override this fixture.
+    """
+
+    return 'rjgtoys.tkthread.time.perf_counter'
+
+@pytest.fixture
+def clock(clock_target):
+    """Replace a clock with a :class:`FakeClock`."""
+
+    c = FakeClock()
+    with patch(clock_target, c):
+        yield c
+
+# Tcl aborts the process if an interpreter is deleted by a thread
+# other than the one that created it, which can happen if the garbage
+# collector runs in a worker thread.   So keep them all alive.
+
+_interps = []
+
+@pytest.fixture
+def interp():
+    """A real Tcl interpreter, without Tk, that can run file handlers."""
+
+    try:
+        t = tk.Tcl()
+    except tk.TclError as e:
+        pytest.skip("No Tcl interpreter: %s" % (e,))
+
+    _interps.append(t)
+    return t
+
+def run_until(interp, condition, limit=100000):
+    """Run the Tcl event loop until ``condition()`` is true.
+
+    Returns the number of events that were processed.
+    """
+
+    n = 0
+    while not condition():
+        assert n < limit, "Event loop did not converge"
+        interp.tk.dooneevent(_tkinter.DONT_WAIT)
+        n += 1
+    return n
+
 def get_open_files():
     """Get descriptions of open files for this process."""
 
@@ -0,0 +1,120 @@
+"""
+Tests for BackgroundRunner and run_in_background.
+"""
+
+import threading
+from unittest.mock import patch
+
+from rjgtoys.tkthread import background
+from rjgtoys.tkthread.background import BackgroundRunner, run_in_background
+
+from helpers import interp, run_until
+
+
+def test_bg_delivers_result(interp):
+
+    results = []
+    threads = []
+
+    def work(a, b):
+        threads.append(threading.current_thread())
+        return a * b
+
+    def on_result(value):
+        results.append((value, threading.current_thread()))
+
+    with BackgroundRunner(widget=interp, max_workers=2) as runner:
+        runner.run(work, 6, b=7, on_result=on_result)
+        run_until(interp, lambda: results, limit=10000000)
+
+    assert results == [(42, threading.main_thread())]
+    assert threads[0] is not threading.main_thread()
+
+
+def test_bg_delivers_error(interp):
+
+    errors = []
+
+    def work():
+        raise ValueError("Fails")
+
+    with BackgroundRunner(widget=interp) as runner:
+        runner.run(work, on_error=errors.append)
+        # No on_error, so the exception is logged
+        runner.run(work)
+        run_until(interp, lambda: errors, limit=10000000)
+
+    assert isinstance(errors[0], ValueError)
+
+
+def test_bg_result_handler_raises(interp):
+
+    results = []
+
+    def bad_handler(value):
+        raise Exception("Handler fails")
+
+    with BackgroundRunner(widget=interp, max_workers=1) as runner:
+        runner.run(abs, -1, on_result=bad_handler)
+        runner.run(abs, -2, on_result=results.append)
+
+    # Both were delivered, despite the exception
+
+    assert results == [2]
+
+
+def test_bg_supersedes(interp):
+
+    results = []
+    release = threading.Event()
+
+    def search(text):
+        release.wait()
+        return text
+
+    with BackgroundRunner(widget=interp, max_workers=1) as runner:
+        first = runner.run(search, 'a', on_result=results.append, key='search')
+        # This one never starts, because the only worker is busy
+        second = runner.run(search, 'ab', on_result=results.append, key='search')
+        third = runner.run(search, 'abc', on_result=results.append, key='search')
+        # A different key is not affected
+        other = runner.run(search, 'x', on_result=results.append, key='other')
+
+        assert first.cancelled and second.cancelled
+        assert second.future.cancelled()
+
+        release.set()
+        run_until(interp, lambda: len(results) == 2, limit=10000000)
+
+    assert results == ['abc', 'x']
+    assert runner._latest == {}
+
+
+def test_run_in_background(interp):
+
+    results = []
+
+    with patch.object(background, '_default_runner', None), \
+         patch('tkinter._default_root', interp):
+        run_in_background(abs, -3, on_result=results.append)
+        runner = background._default_runner
+        assert isinstance(runner, BackgroundRunner)
+        runner.shutdown()
+
+    assert results == [3]
+
+
+def test_bg_shutdown_cancel(interp):
+
+    results = []
+    release = threading.Event()
+
+    runner = BackgroundRunner(widget=interp, max_workers=1)
+    runner.run(release.wait, on_result=results.append)
+    waiting = runner.run(abs, -1, on_result=results.append)
+
+    threading.Timer(0.05, release.set).start()
+    runner.shutdown(cancel=True)
+
+    assert waiting.future.cancelled()
+    assert results == [True]
@@ -0,0 +1,231 @@
+"""
+Tests for ChildProcess.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from rjgtoys.tkthread.child import ChildProcess
+
+from helpers import get_open_files, interp, run_until
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+def test_child_output(interp):
+
+    output = []
+    exits = []
+
+    child = ChildProcess(
+        python("import sys; print('one'); print('two', file=sys.stderr); print('caf\\u00e9', end='')"),
+        lambda stream, lines: output.extend((stream, line) for line in lines),
+        on_exit=exits.append,
+        widget=interp
+    )
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert exits == [0]
+    assert child.returncode == 0
+    assert sorted(output) == [('stderr', 'two'), ('stdout', 'café'), ('stdout', 'one')]
+
+    stats = child.stats()
+    assert stats['stdout_lines'] == 2
+    assert stats['stderr_lines'] == 1
+    assert stats['stdout_bytes'] == len(b'one\ncaf\xc3\xa9')
+
+
+def test_child_batches_lines(interp):
+
+    batches = []
+    exits = []
+
+    ChildProcess(
+        python("import sys; sys.stdout.write(''.join('%d\\n' % i for i in range(10000)))"),
+        lambda stream, lines: batches.append(lines),
+        on_exit=exits.append,
+        encoding=None,
+        widget=interp
+    )
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    lines = [line for batch in batches for line in batch]
+    assert lines == [b'%d' % i for i in range(10000)]
+    assert len(batches) < 100
+
+
+def test_child_stderr_to_stdout(interp):
+
+    output = []
+    exits = []
+
+    child = ChildProcess(
+        python("import sys; print('err', file=sys.stderr, flush=True); print('out')"),
+        lambda stream, lines: output.extend((stream, line) for line in lines),
+        on_exit=exits.append,
+        stderr=subprocess.STDOUT,
+        widget=interp
+    )
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert output == [('stdout', 'err'), ('stdout', 'out')]
+    assert child.stats()['stderr_lines'] == 0
+
+
+def test_child_exit_code(interp):
+
+    exits = []
+
+    ChildProcess(python("import sys; sys.exit(3)"), lambda s, l: None, on_exit=exits.append, widget=interp)
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert exits == [3]
+
+
+def test_child_backpressure(interp):
+
+    count = [0]
+    exits = []
+
+    def handler(stream, lines):
+        count[0] += len(lines)
+
+    # Much more output than a pipe can hold
+
+    child = ChildProcess(
+        python("import sys\nfor i in range(100000): sys.stdout.write('x' * 60 + '\\n')"),
+        handler,
+        on_exit=exits.append,
+        widget=interp
+    )
+    child.pause()
+
+    # The child fills its pipe, and waits
+
+    try:
+        child.process.wait(timeout=1)
+    except subprocess.TimeoutExpired:
+        pass
+    assert child.process.poll() is None
+    assert count[0] == 0
+
+    child.resume()
+    run_until(interp, lambda: exits, limit=100000000)
+
+    assert count[0] == 100000
+    assert exits == [0]
+
+
+def test_child_interval(interp):
+
+    batches = []
+    exits = []
+
+    ChildProcess(
+        python("import sys, time\nfor i in range(20):\n    print(i, flush=True)\n    time.sleep(0.01)"),
+        lambda stream, lines: batches.append(lines),
+        on_exit=exits.append,
+        interval=0.1,
+        widget=interp
+    )
+
+    run_until(interp, lambda: exits, limit=100000000)
+
+    assert [line for batch in batches for line in batch] == [str(i) for i in range(20)]
+    assert len(batches) < 10
+
+
+def test_many_children_no_threads(interp):
+
+    before = threading.active_count()
+    files = get_open_files()
+    output = {}
+    exits = []
+
+    def handler(n):
+        return lambda stream, lines: output.setdefault(n, []).extend(lines)
+
+    children = [
+        ChildProcess(python("print(%d)" % n), handler(n), on_exit=exits.append, widget=interp)
+        for n in range(30)
+    ]
+
+    assert threading.active_count() == before
+
+    run_until(interp, lambda: len(exits) == 30, limit=100000000)
+
+    assert output == {n: [str(n)] for n in range(30)}
+    assert get_open_files() == files
+
+
+def test_child_handler_raises(interp):
+
+    calls = []
+    exits = []
+
+    def handler(stream, lines):
+        calls.append(lines)
+        raise ValueError("Handler fails")
+
+    ChildProcess(python("print('x')"), handler, on_exit=exits.append, widget=interp)
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert calls == [['x']]
+
+
+def test_child_close(interp):
+
+    child = ChildProcess(python("import time; time.sleep(10)"), lambda s, l: None, widget=interp)
+
+    child.terminate()
+    child.close()
+    child.process.wait()
+
+    assert child.process.returncode != 0
+
+
+LINGER = "import os, time; os.close(1); os.close(2); time.sleep(0.2)"
+
+
+@pytest.mark.skipif(not hasattr(os, 'pidfd_open'), reason="No pidfd_open")
+def test_child_exit_pidfd(interp):
+
+    exits = []
+
+    child = ChildProcess(python(LINGER), lambda s, l: None, on_exit=exits.append, widget=interp)
+
+    run_until(interp, lambda: child._pidfd is not None, limit=10000000)
+
+    assert child._timer is None
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert exits == [0]
+    assert child._pidfd is None
+
+
+def test_child_exit_poll(interp):
+
+    exits = []
+
+    with patch('rjgtoys.tkthread.child.os.pidfd_open', side_effect=OSError, create=True):
+        child = ChildProcess(python(LINGER), lambda s, l: None, on_exit=exits.append, widget=interp)
+        run_until(interp, lambda: child._timer is not None, limit=10000000)
+
+    assert child._pidfd is None
+
+    run_until(interp, lambda: exits, limit=10000000)
+
+    assert exits == [0]
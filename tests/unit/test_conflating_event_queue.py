@@ -0,0 +1,114 @@
+"""
+Tests for the ConflatingEventQueue
+
+"""
+
+from unittest.mock import patch, call
+
+import queue
+
+import pytest
+
+from rjgtoys.tkthread import ConflatingEventQueue
+
+from helpers import widget, interp, run_until, mock_pipe, PIPE_W
+
+
+def test_cq_keeps_latest(widget, mock_pipe):
+
+    handled = []
+
+    q = ConflatingEventQueue(handler=handled.append, widget=widget, max_batch=0)
+
+    with patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        q.put(('job1', 10))
+        q.put(('job2', 5))
+        q.put(('job1', 20))
+        q.put_many([('job3', 1), ('job2', 6), ('job2', 7)])
+
+    # Only new keys cause a wakeup
+
+    mock_write.assert_has_calls(
+        [
+            call(PIPE_W, b"x"),
+            call(PIPE_W, b"x"),
+            call(PIPE_W, b"x"),
+        ]
+    )
+    assert mock_write.call_count == 3
+
+    assert q.qsize() == 3
+    assert q.conflated == 3
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xxx"):
+        q._readable(None, None)
+
+    # Each key keeps the position of its first event
+
+    assert handled == [('job1', 20), ('job2', 7), ('job3', 1)]
+
+
+def test_cq_key_function(widget, mock_pipe):
+
+    handled = []
+
+    q = ConflatingEventQueue(
+        handler=handled.append, widget=widget, key=lambda e: e['job']
+    )
+
+    with patch('rjgtoys.tkthread.wakeup.os.write'):
+        q.put({'job': 1, 'done': 10})
+        q.put({'job': 1, 'done': 43})
+
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    assert handled == [{'job': 1, 'done': 43}]
+
+
+def test_cq_high_rate(interp):
+
+    handled = []
+
+    with ConflatingEventQueue(batch_handler=handled.append, widget=interp, max_batch=0) as q:
+        for i in range(100000):
+            q.put((i % 10, i))
+        run_until(interp, lambda: handled)
+
+    assert handled == [[(k, 99990 + k) for k in range(10)]]
+
+
+def test_ceq_block_overflow_only(widget):
+
+    with pytest.raises(ValueError):
+        ConflatingEventQueue(handler=print, widget=widget, maxsize=1, overflow='drop_oldest')
+
+
+def test_cq_full_queue_replaces_waiting_keys(interp):
+
+    handled = []
+
+    with ConflatingEventQueue(handler=handled.append, widget=interp, maxsize=2, max_batch=0) as q:
+        q.put(('a', 1))
+        q.put(('b', 1))
+
+        # Full, but these only replace waiting events
+
+        q.put(('a', 2), block=False)
+        q.put(('b', 2), timeout=0)
+        q.put_many([('a', 3), ('b', 3)], block=False)
+
+        with pytest.raises(queue.Full):
+            q.put(('c', 1), block=False)
+
+        # The events before the new key are still added
+
+        with pytest.raises(queue.Full):
+            q.put_many([('a', 4), ('c', 1)], block=False)
+
+        assert q.qsize() == 2
+        assert q.conflated == 5
+
+        run_until(interp, lambda: handled)
+
+    assert handled == [('a', 4), ('b', 3)]
@@ -0,0 +1,88 @@
+"""
+Tests for the DequeEventQueue
+
+"""
+
+import threading
+from unittest.mock import Mock, patch, call
+
+import pytest
+
+from rjgtoys.tkthread import DequeEventQueue
+
+from helpers import get_open_files, widget, interp, run_until, mock_pipe, PIPE_W
+
+
+def test_dq_delivers(widget, mock_pipe):
+
+    handled = []
+
+    q = DequeEventQueue(handler=handled.append, widget=widget)
+
+    with patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        q.put('event1')
+        q.put_nowait('event2')
+        q.put_many(['event3', 'event4'])
+        q.put_many([])
+
+    mock_write.assert_has_calls(
+        [
+            call(PIPE_W, b"x"),
+            call(PIPE_W, b"x"),
+            call(PIPE_W, b"xx"),
+        ]
+    )
+    assert q.qsize() == 4
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xxx"):
+        q._readable(None, None)
+
+    assert handled == ['event1', 'event2', 'event3']
+    assert q.qsize() == 1
+
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    assert handled == ['event1', 'event2', 'event3', 'event4']
+
+
+def test_dq_needs_one_handler(widget):
+
+    with pytest.raises(ValueError):
+        DequeEventQueue(widget=widget)
+
+
+def test_dq_many_producers(interp):
+
+    handled = []
+    producers = 4
+    count = 10000
+
+    def produce(q, base):
+        for i in range(count):
+            q.put(base + i)
+
+    with DequeEventQueue(handler=handled.append, widget=interp, max_batch=0, edge_triggered=True) as q:
+        threads = [
+            threading.Thread(target=produce, args=(q, p * count))
+            for p in range(producers)
+        ]
+        for t in threads:
+            t.start()
+        run_until(interp, lambda: len(handled) == producers * count, limit=10000000)
+        for t in threads:
+            t.join()
+
+    assert sorted(handled) == list(range(producers * count))
+
+
+def test_dq_does_not_leak_pipes(widget):
+
+    before = get_open_files()
+
+    with DequeEventQueue(handler=Mock(), widget=widget) as q:
+        pass
+
+    after = get_open_files()
+
+    assert before == after
@@ -2,12 +2,16 @@
 Tests for EventGenerator.
 """
 
+import asyncio
+import threading
+
 import pytest
 from unittest.mock import Mock, patch, call
 
-from rjgtoys.tkthread import EventGenerator
+from rjgtoys.tkthread import EventGenerator, DequeEventQueue
+from rjgtoys.tkthread.aio import loop_thread
 
-from helpers import get_open_files, widget
+from helpers import get_open_files, widget, interp, run_until
 
 def test_eg_puts():
 
@@ -54,3 +58,130 @@ def test_eg_does_not_leak_pipes(widget):
     after = get_open_files()
 
     assert before == after
+
+
+def test_eg_puts_chunks():
+
+    generator = iter(range(5))
+
+    mock_queue = Mock()
+
+    g = EventGenerator(queue=mock_queue, generator=generator, chunk_size=2)
+    g.join()
+
+    mock_queue.put_many.assert_has_calls(
+        [
+            call([0, 1]),
+            call([2, 3]),
+            call([4])
+        ]
+    )
+    mock_queue.put.assert_not_called()
+
+
+def test_eg_passes_queue_options():
+
+    batch_handler = Mock()
+
+    mock_event_queue = Mock()
+
+    with patch('rjgtoys.tkthread.EventQueue', mock_event_queue):
+        g = EventGenerator(widget='mock_widget', batch_handler=batch_handler, max_batch=0, generator=iter(()))
+
+    mock_event_queue.assert_called_once_with(
+        widget='mock_widget', handler=None, maxsize=0, batch_handler=batch_handler, max_batch=0
+    )
+
+
+async def async_source(count, delay=0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield i
+
+
+def test_eg_async_generator(interp):
+
+    handled = []
+
+    before = threading.active_count()
+
+    with EventGenerator(generator=async_source(5), handler=handled.append, widget=interp) as g:
+        # No thread of its own, although the shared loop thread may have started
+        assert threading.active_count() <= before + 1
+        run_until(interp, lambda: len(handled) == 5, limit=10000000)
+
+    assert handled == list(range(5))
+    assert not g.is_alive()
+
+    with pytest.raises(RuntimeError):
+        g.start()
+
+
+def test_eg_many_async_generators(interp):
+
+    sources = 500
+    handled = []
+
+    with DequeEventQueue(handler=handled.append, widget=interp, max_batch=0, edge_triggered=True) as q:
+        before = threading.active_count()
+        generators = [
+            EventGenerator(generator=async_source(3, delay=0.001), queue=q)
+            for _ in range(sources)
+        ]
+        assert threading.active_count() <= before + 1
+        for g in generators:
+            g.join()
+
+    assert sorted(handled) == sorted(list(range(3)) * sources)
+
+
+def test_eg_async_full_queue(interp):
+
+    handled = []
+
+    with EventGenerator(
+        generator=async_source(50), handler=handled.append, widget=interp,
+        maxsize=2, max_batch=0
+        ) as g:
+        run_until(interp, lambda: len(handled) == 50, limit=10000000)
+
+    assert handled == list(range(50))
+
+
+def test_eg_async_full_queue_does_not_block_loop(interp):
+
+    handled = []
+
+    g = EventGenerator(
+        generator=async_source(10), handler=handled.append, widget=interp,
+        maxsize=1
+    )
+
+    # The source waits for room without holding up the shared loop
+
+    async def other():
+        return 'done'
+
+    assert loop_thread().submit(other()).result(timeout=5) == 'done'
+    assert g.is_alive()
+
+    run_until(interp, lambda: len(handled) == 10, limit=10000000)
+    g.join()
+
+    assert handled == list(range(10))
+
+
+def test_eg_async_generator_raises(interp):
+
+    async def failing():
+        yield 1
+        raise ValueError("Source fails")
+
+    handled = []
+
+    with EventGenerator(generator=failing(), handler=handled.append, widget=interp) as g:
+        g.join(timeout=0)
+        g.join()
+
+    assert handled == [1]
@@ -4,32 +4,29 @@ Tests for the EventQueue
 """
 
 import os
+import queue
+import threading
+import time
 from unittest.mock import Mock, patch, call
 
 import tkinter as tk
 
 import pytest
 
-from rjgtoys.tkthread import EventQueue
+from rjgtoys.tkthread import EventQueue, _READ_ALL
 
-from helpers import get_open_files, widget
-
-PIPE_R = 'pipe_r'   # NB: deliberately not even an integer
-PIPE_W = 'pipe_w'
-
-@pytest.fixture
-def mock_pipe():
-    with patch('rjgtoys.tkthread.os.pipe', return_value=(PIPE_R, PIPE_W)) as p:
-        yield p
+from helpers import (
+    get_open_files, widget, interp, run_until, mock_pipe, clock, clock_target, PIPE_R, PIPE_W
+)
 
 @pytest.fixture
 def mock_close():
-    with patch('rjgtoys.tkthread.os.close', return_value=0) as p:
+    with patch('rjgtoys.tkthread.wakeup.os.close', return_value=0) as p:
         yield p
 
 @pytest.fixture
 def mock_close_failing():
-    with patch('rjgtoys.tkthread.os.close', side_effect=OSError('os.close fails')) as p:
+    with patch('rjgtoys.tkthread.wakeup.os.close', side_effect=OSError('os.close fails')) as p:
         yield p
 
 @pytest.fixture
@@ -38,8 +35,9 @@ def mock_read():
     def _os_read(fd, nb):
         assert fd == PIPE_R
         assert nb == 1
+        return b"x"
 
-    with patch('rjgtoys.tkthread.os.read', _os_read) as p:
+    with patch('rjgtoys.tkthread.wakeup.os.read', _os_read) as p:
         yield p
 
 @pytest.fixture
@@ -48,7 +46,7 @@ def mock_write():
     def _os_write(fd, buff):
         assert fd == PIPE_W
 
-    with patch('rjgtoys.tkthread.os.write', _os_write) as p:
+    with patch('rjgtoys.tkthread.wakeup.os.write', _os_write) as p:
         yield p
 
 def assert_widget_has_handler(widget, handler):
@@ -164,14 +162,417 @@ def test_eq_drain_handles_exception(widget, mock_close_failing):
     def handler(e):
         raise Exception("Should never be called")
 
-    with EventQueue(widget=widget, handler=handler) as q:
+    with EventQueue(widget=widget, handler=handler, wakeup='pipe') as q:
         pass
 
+    widget.tk.deletefilehandler.assert_called_once_with(q._channel.fileno())
+
     # Ensure that both calls were made, despite the exception
 
     mock_close_failing.assert_has_calls(
         [
-            call(q._pipe_r),
-            call(q._pipe_w)
+            call(q._channel._r),
+            call(q._channel._w)
         ]
     )
+
+def test_eq_batch_delivers(widget, mock_pipe, mock_write):
+
+    handled = []
+
+    def handle_event(event):
+        handled.append(event)
+
+    q = EventQueue(handler=handle_event, widget=widget, max_batch=3)
+
+    for i in range(5):
+        q.put(i)
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xxx") as mock_read:
+        q._readable(None, None)
+
+    mock_read.assert_called_once_with(PIPE_R, 3)
+
+    assert handled == [0, 1, 2]
+    assert q.qsize() == 2
+
+    # A short read handles only as many events as there were wakeups
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"x"):
+        q._readable(None, None)
+
+    assert handled == [0, 1, 2, 3]
+    assert q.qsize() == 1
+
+
+def test_eq_batch_unlimited(widget, mock_pipe, mock_write):
+
+    q = EventQueue(handler=Mock(), widget=widget, max_batch=0)
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"") as mock_read:
+        q._readable(None, None)
+
+    mock_read.assert_called_once_with(PIPE_R, _READ_ALL)
+
+
+def _run_burst(interp, count, **kwargs):
+    """Push a burst of events through a real event loop.
+
+    Returns the number of event loop iterations.
+    """
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, **kwargs) as q:
+        for i in range(count):
+            q.put(i)
+        loops = run_until(interp, lambda: len(handled) == count)
+
+    assert handled == list(range(count))
+    return loops
+
+
+def test_eq_when_room(interp):
+
+    handled = []
+    depths = []
+
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    q.put_many(range(6))
+    q._when_room(lambda: depths.append(q.qsize()), 2)
+
+    run_until(interp, lambda: len(handled) == 6)
+
+    assert depths == [2]
+
+    # Nothing is called once the queue has been drained
+
+    q._when_room(lambda: depths.append(q.qsize()), 2)
+    q.put(6)
+    q.drain()
+
+    assert handled == list(range(7))
+    assert depths == [2]
+
+
+def test_eq_batch_throughput(interp):
+
+    count = 5000
+
+    single_loops = _run_burst(interp, count)
+    batch_loops = _run_burst(interp, count, max_batch=0)
+
+    assert single_loops >= count
+    assert batch_loops < count / 100
+
+
+def test_eq_edge_triggered_writes_once(widget, mock_pipe):
+
+    handled = []
+
+    q = EventQueue(handler=handled.append, widget=widget, edge_triggered=True, max_batch=0)
+
+    with patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        for i in range(5):
+            q.put(i)
+
+    mock_write.assert_called_once_with(PIPE_W, b"x")
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"x") as mock_read:
+        q._readable(None, None)
+
+    mock_read.assert_called_once_with(PIPE_R, _READ_ALL)
+    assert handled == [0, 1, 2, 3, 4]
+
+    # Once drained, the next put signals again
+
+    with patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        q.put(5)
+        q.put(6)
+
+    mock_write.assert_called_once_with(PIPE_W, b"x")
+
+
+def test_eq_edge_triggered_rearms_after_batch(widget, mock_pipe):
+
+    handled = []
+
+    q = EventQueue(handler=handled.append, widget=widget, edge_triggered=True, max_batch=2)
+
+    with patch('rjgtoys.tkthread.wakeup.os.write'):
+        for i in range(3):
+            q.put(i)
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"x"), \
+         patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        q._readable(None, None)
+
+    assert handled == [0, 1]
+
+    # One event was left behind, so there must be another wakeup
+
+    mock_write.assert_called_once_with(PIPE_W, b"x")
+
+
+def test_eq_edge_triggered_burst(interp):
+
+    count = 100000
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, edge_triggered=True, max_batch=0) as q:
+        # Far more events than the pipe could hold wakeups for
+        for i in range(count):
+            q.put(i)
+        run_until(interp, lambda: len(handled) == count)
+
+    assert handled == list(range(count))
+
+
+def test_eq_put_many(widget, mock_pipe):
+
+    q = EventQueue(handler=Mock(), widget=widget)
+
+    with patch('rjgtoys.tkthread.wakeup.os.write') as mock_write:
+        q.put_many(iter(['event1', 'event2', 'event3']))
+        q.put_many([])
+
+    mock_write.assert_called_once_with(PIPE_W, b"xxx")
+
+    assert q._take(10) == ['event1', 'event2', 'event3']
+
+
+def test_eq_put_many_full(widget, mock_pipe, mock_write):
+
+    q = EventQueue(handler=Mock(), widget=widget, maxsize=3)
+
+    q.put('event0')
+
+    with pytest.raises(queue.Full):
+        q.put_many(['event1', 'event2', 'event3'], block=False)
+
+    # The events that fitted were queued
+
+    assert q._take(10) == ['event0', 'event1', 'event2']
+
+    with pytest.raises(queue.Full):
+        q.put_many(['event1', 'event2', 'event3', 'event4'], timeout=0.01)
+
+    with pytest.raises(ValueError):
+        q.put_many(['event1'], timeout=-1)
+
+
+def test_eq_put_many_waits_for_room(interp):
+
+    handled = []
+    count = 1000
+
+    with EventQueue(handler=handled.append, widget=interp, maxsize=10, max_batch=0) as q:
+        producer = threading.Thread(target=q.put_many, args=(range(count),))
+        producer.start()
+        run_until(interp, lambda: len(handled) == count, limit=10000000)
+        producer.join()
+
+    assert handled == list(range(count))
+
+
+def test_eq_batch_handler(widget, mock_pipe, mock_write):
+
+    batches = []
+
+    def handle_batch(events):
+        batches.append(events)
+        raise Exception("Could not handle %s" % (events,))
+
+    q = EventQueue(batch_handler=handle_batch, widget=widget, max_batch=0)
+
+    q.put_many(['event1', 'event2', 'event3'])
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xx"):
+        q._readable(None, None)
+
+    # Nothing to do, so no call
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b""):
+        q._readable(None, None)
+
+    assert batches == [['event1', 'event2']]
+
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    assert batches == [['event1', 'event2'], ['event3']]
+
+
+def test_eq_needs_one_handler(widget):
+
+    with pytest.raises(ValueError):
+        EventQueue(widget=widget)
+
+    with pytest.raises(ValueError):
+        EventQueue(handler=Mock(), batch_handler=Mock(), widget=widget)
+
+
+def test_eq_time_budget(widget, mock_pipe, mock_write, clock):
+
+    batches = []
+
+    def handle_batch(events):
+        batches.append(events)
+        clock.now += 0.001 * len(events)
+
+    q = EventQueue(batch_handler=handle_batch, widget=widget, max_batch=0, time_budget=0.0045)
+
+    q.put_many(range(20))
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"x") as mock_read:
+        q._readable(None, None)
+
+    mock_read.assert_called_once_with(PIPE_R, _READ_ALL)
+
+    # One event to measure the cost, then a batch to fill the
+    # rest of the budget, then one more because it was not quite full.
+
+    assert batches == [[0], [1, 2, 3], [4]]
+
+    # Ran out of time, so a continuation was scheduled
+
+    widget.after_idle.assert_called_once_with(widget.after, 0, q._resume)
+
+    # Further wakeups do not start another slice
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"x"):
+        q._readable(None, None)
+
+    assert len(batches) == 3
+
+    q._resume()
+
+    assert batches[3] == [5, 6, 7, 8]
+
+
+def test_eq_time_budget_yields(interp):
+
+    handled = []
+    slices = []
+
+    def handle_event(event):
+        time.sleep(0.001)
+        handled.append(event)
+
+    q = EventQueue(handler=handle_event, widget=interp, max_batch=0, time_budget=0.005)
+
+    # Record the events handled by each slice
+
+    run_slice = q._run_slice
+
+    def _run_slice():
+        start = len(handled)
+        run_slice()
+        slices.append(len(handled) - start)
+
+    q._run_slice = _run_slice
+
+    q.put_many(range(50))
+
+    run_until(interp, lambda: len(handled) == 50)
+    q.drain()
+
+    assert handled == list(range(50))
+    assert sum(slices) == 50
+    assert len(slices) >= 5
+    assert max(slices) <= 10
+
+
+def test_eq_overflow_drop_newest(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, maxsize=3, overflow='drop_newest') as q:
+        for i in range(10):
+            q.put(i, block=True)
+        assert q.dropped == 7
+
+    assert handled == [0, 1, 2]
+
+
+def test_eq_overflow_drop_oldest(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, maxsize=3, overflow='drop_oldest') as q:
+        q.put_many(range(10))
+        assert q.qsize() == 3
+        assert q.dropped == 7
+        run_until(interp, lambda: len(handled) == 3)
+
+        # There is exactly one wakeup for each waiting event
+        assert q._take(1) == []
+
+    assert handled == [7, 8, 9]
+
+
+def test_eq_overflow_coalesce(interp):
+
+    handled = []
+
+    with EventQueue(
+        handler=handled.append, widget=interp, maxsize=2,
+        overflow='coalesce', coalesce=lambda waiting, new: waiting + new
+        ) as q:
+        for i in range(1, 6):
+            q.put_nowait(i)
+        assert q.dropped == 3
+
+    assert handled == [1, 2 + 3 + 4 + 5]
+
+
+def test_eq_overflow_coalesce_instrumented(interp):
+
+    with EventQueue(
+        batch_handler=lambda events: None, widget=interp, maxsize=1,
+        overflow='coalesce', coalesce=max, instrument=True
+        ) as q:
+        q.put(1)
+        q.put(3)
+        q.put(2)
+        assert [e.event for e in q.queue] == [3]
+
+    assert q.stats()['dropped'] == 2
+    assert q.stats()['events'] == 1
+
+
+def test_eq_overflow_never_blocks_producer(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, maxsize=1, overflow='drop_oldest') as q:
+        t = threading.Thread(target=q.put_many, args=(range(1000),))
+        t.start()
+        t.join(timeout=5)
+        assert not t.is_alive()
+
+    assert handled == [999]
+
+
+def test_eq_overflow_unbounded_ignored(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, overflow='drop_newest') as q:
+        q.put_many(range(5))
+
+    assert handled == list(range(5))
+    assert q.dropped == 0
+
+
+def test_eq_overflow_bad_options(widget):
+
+    with pytest.raises(ValueError):
+        EventQueue(handler=print, widget=widget, maxsize=1, overflow='explode')
+
+    with pytest.raises(ValueError):
+        EventQueue(handler=print, widget=widget, maxsize=1, overflow='coalesce')
+
+    with pytest.raises(ValueError):
+        EventQueue(handler=print, widget=widget, maxsize=1, coalesce=max)
@@ -0,0 +1,122 @@
+"""
+Tests for TkExecutor.
+"""
+
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rjgtoys.tkthread.executor import TkExecutor
+
+from helpers import get_open_files, widget, interp, run_until
+
+
+def test_executor_submit(interp):
+
+    results = []
+    where = []
+
+    def work(a, b=0):
+        where.append(threading.current_thread())
+        return a + b
+
+    def worker(executor):
+        results.append(executor.submit(work, 1, b=2).result())
+
+    with TkExecutor(widget=interp) as executor:
+        t = threading.Thread(target=worker, args=(executor,))
+        t.start()
+        run_until(interp, lambda: results, limit=10000000)
+        t.join()
+
+    assert results == [3]
+    assert where == [threading.main_thread()]
+
+
+def test_executor_exception(interp):
+
+    def fail():
+        raise ValueError("Fails")
+
+    with TkExecutor(widget=interp) as executor:
+        future = executor.submit(fail)
+        run_until(interp, future.done)
+
+    with pytest.raises(ValueError):
+        future.result()
+
+
+@pytest.mark.parametrize('chunksize', [1, 3])
+def test_executor_map(interp, chunksize):
+
+    results = []
+
+    def worker(executor):
+        results.extend(executor.map(pow, range(10), [2] * 10, chunksize=chunksize))
+
+    with TkExecutor(widget=interp) as executor:
+        channel = executor._queue._channel
+        with patch.object(channel, 'signal', wraps=channel.signal) as mock_write:
+            t = threading.Thread(target=worker, args=(executor,))
+            t.start()
+            run_until(interp, lambda: len(results) == 10, limit=10000000)
+            t.join()
+
+    assert results == [i * i for i in range(10)]
+
+    # All the calls were sent with a single wakeup
+
+    assert mock_write.call_count == 1
+
+
+def test_executor_map_bad_chunksize(widget):
+
+    executor = TkExecutor(widget=widget)
+
+    with pytest.raises(ValueError):
+        executor.map(abs, [1], chunksize=0)
+
+
+def test_executor_shutdown_runs_waiting_calls(widget):
+
+    executor = TkExecutor(widget=widget)
+
+    future = executor.submit(abs, -1)
+
+    executor.shutdown()
+    executor.shutdown()     # Harmless
+
+    assert future.result() == 1
+
+    with pytest.raises(RuntimeError):
+        executor.submit(abs, -1)
+
+    with pytest.raises(RuntimeError):
+        executor.map(abs, [-1])
+
+
+def test_executor_shutdown_cancel(widget):
+
+    work = Mock()
+
+    executor = TkExecutor(widget=widget)
+
+    future = executor.submit(work)
+
+    executor.shutdown(cancel_futures=True)
+
+    assert future.cancelled()
+    work.assert_not_called()
+
+
+def test_executor_does_not_leak_pipes(widget):
+
+    before = get_open_files()
+
+    with TkExecutor(widget=widget):
+        pass
+
+    after = get_open_files()
+
+    assert before == after
@@ -0,0 +1,219 @@
+"""
+Tests for FdEventSource.
+"""
+
+import os
+import socket
+import threading
+
+import _tkinter
+
+import pytest
+
+from rjgtoys.tkthread.fdsource import FdEventSource, LineSplitter
+
+from helpers import interp, run_until
+
+
+def test_line_splitter():
+
+    split = LineSplitter()
+
+    assert split(b"one\ntw") == [b"one"]
+    assert split(b"o\n\nthree") == [b"two", b""]
+    assert split.flush() == [b"three"]
+    assert split.flush() == []
+
+
+def test_line_splitter_limits_line_length():
+
+    split = LineSplitter(max_line=4, encoding='utf-8')
+
+    assert split(b"abcdefghij") == ["abcd", "efgh"]
+    assert split(b"\n") == ["ij"]
+
+
+def test_line_splitter_decodes_split_characters():
+
+    split = LineSplitter(encoding='utf-8')
+
+    assert split(b"caf\xc3") == []
+    assert split(b"\xa9\nna\xc3") == ["caf\u00e9"]
+    assert split.flush() == ["na\ufffd"]
+
+
+def test_fd_source_pause(interp):
+
+    r, w = os.pipe()
+    handled = []
+
+    with FdEventSource(r, handled.append, widget=interp) as source:
+        source.pause()
+        assert source.paused
+        os.write(w, b"x")
+        for _ in range(100):
+            interp.tk.dooneevent(_tkinter.DONT_WAIT)
+        assert handled == []
+
+        source.resume()
+        run_until(interp, lambda: handled)
+
+    assert handled == [b"x"]
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_pipe(interp):
+
+    r, w = os.pipe()
+    handled = []
+    ended = []
+
+    source = FdEventSource(
+        r, handled.append, parser=LineSplitter(), widget=interp,
+        on_eof=lambda: ended.append(True), close_fd=True
+    )
+
+    os.write(w, b"one\ntwo\nthr")
+    run_until(interp, lambda: len(handled) == 2)
+    os.write(w, b"ee\nfour")
+    os.close(w)
+    run_until(interp, lambda: ended)
+
+    assert handled == [b"one", b"two", b"three", b"four"]
+
+    # The pipe was closed at the end
+
+    with pytest.raises(OSError):
+        os.fstat(r)
+
+    source.close()
+
+
+def test_fd_source_batches(interp):
+
+    r, w = os.pipe()
+    batches = []
+
+    with FdEventSource(r, batch_handler=batches.append, parser=LineSplitter(), widget=interp):
+        os.write(w, b"a\nb\nc\n")
+        run_until(interp, lambda: batches)
+
+    assert batches == [[b"a", b"b", b"c"]]
+    assert os.get_blocking(r)
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_bulk_reads(interp):
+
+    r, w = os.pipe()
+    chunks = []
+
+    with FdEventSource(r, chunks.append, read_size=4, max_reads=2, widget=interp):
+        os.write(w, b"0123456789abcdef")
+        run_until(interp, lambda: len(chunks) == 4)
+
+    assert chunks == [b"0123", b"4567", b"89ab", b"cdef"]
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_socket_object(interp):
+
+    a, b = socket.socketpair()
+    handled = []
+
+    with FdEventSource(a, handled.append, widget=interp, close_fd=True):
+        b.send(b"hello")
+        run_until(interp, lambda: handled)
+        b.close()
+        run_until(interp, lambda: a.fileno() == -1)
+
+    assert handled == [b"hello"]
+
+
+def test_fd_source_custom_reader(interp):
+
+    r, w = os.pipe()
+    os.set_blocking(r, False)
+    handled = []
+
+    def reader():
+        try:
+            return os.read(r, 1).decode()
+        except BlockingIOError:
+            return None
+
+    with FdEventSource(r, handled.append, reader=reader, widget=interp):
+        os.write(w, b"xyz")
+        run_until(interp, lambda: len(handled) == 3)
+
+    assert handled == ["x", "y", "z"]
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_handler_raises(interp):
+
+    r, w = os.pipe()
+    handled = []
+
+    def handler(line):
+        handled.append(line)
+        raise ValueError("Handler fails")
+
+    with FdEventSource(r, handler, parser=LineSplitter(), widget=interp):
+        os.write(w, b"1\n2\n")
+        run_until(interp, lambda: len(handled) == 2)
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_parser_raises(interp):
+
+    r, w = os.pipe()
+    handled = []
+    ended = []
+
+    source = FdEventSource(
+        r, handled.append, parser=LineSplitter(encoding='ascii', errors='strict'),
+        read_size=3, on_eof=lambda: ended.append(True), widget=interp
+    )
+
+    os.write(w, b"ok\n\xff\n")
+    run_until(interp, lambda: ended)
+
+    assert handled == ["ok"]
+    assert source.closed
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_no_threads(interp):
+
+    r, w = os.pipe()
+    where = []
+
+    before = threading.active_count()
+    with FdEventSource(r, lambda e: where.append(threading.current_thread()), widget=interp):
+        assert threading.active_count() == before
+        os.write(w, b"x")
+        run_until(interp, lambda: where)
+
+    assert where == [threading.main_thread()]
+
+    os.close(r)
+    os.close(w)
+
+
+def test_fd_source_needs_one_handler(interp):
+
+    with pytest.raises(ValueError):
+        FdEventSource(0, widget=interp)
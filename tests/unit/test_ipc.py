@@ -0,0 +1,230 @@
+"""
+Tests for EventListener, using EventClient and plain sockets as clients.
+"""
+
+import os
+import pickle
+import socket
+import struct
+import threading
+
+import _tkinter
+
+import pytest
+
+from rjgtoys.tkthread import EventQueue
+from rjgtoys.tkthread.ipc import EventClient, EventListener, RawCodec, MsgpackCodec
+
+from helpers import get_open_files, interp, run_until
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "events.sock")
+
+
+def frame(payload):
+    return struct.pack('!I', len(payload)) + payload
+
+
+def test_listener_pickle(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    with EventListener(path, q, widget=interp) as listener:
+        with EventClient(path) as client:
+            client.send([1, 'two', (3, 4)])
+            client.put({'five': 5})
+            run_until(interp, lambda: len(handled) == 4)
+
+        stats = listener.stats()
+
+    assert handled == [1, 'two', (3, 4), {'five': 5}]
+    assert stats['accepted'] == 1
+    [client] = stats['clients']
+    assert client['frames'] == 2
+    assert client['events'] == 4
+    assert client['dropped'] == 0
+    assert client['pid'] == os.getpid()
+    assert client['events_per_second'] > 0
+
+    assert not os.path.exists(path)
+    q.drain()
+
+
+def test_listener_raw_partial_frames(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    with EventListener(path, q, codec='raw', widget=interp):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        data = frame(RawCodec().encode([b"alpha", b"", b"beta"])) + frame(RawCodec().encode([b"gamma"]))
+
+        # Dribble the frames one byte at a time
+
+        for i in range(len(data)):
+            sock.send(data[i:i + 1])
+            interp.tk.dooneevent(_tkinter.DONT_WAIT)
+
+        run_until(interp, lambda: len(handled) == 4)
+        sock.close()
+
+    assert handled == [b"alpha", b"", b"beta", b"gamma"]
+    q.drain()
+
+
+def test_listener_many_clients(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    with EventListener(path, q, widget=interp) as listener:
+        clients = [EventClient(path) for _ in range(10)]
+        for n, client in enumerate(clients):
+            client.send([(n, i) for i in range(100)])
+        run_until(interp, lambda: len(handled) == 1000)
+
+        assert len(listener.stats()['clients']) == 10
+
+        for client in clients:
+            client.close()
+        run_until(interp, lambda: not listener.stats()['clients'])
+
+        stats = listener.stats()
+
+    assert stats['accepted'] == 10
+    assert stats['events'] == 1000
+    for n in range(10):
+        assert [e for e in handled if e[0] == n] == [(n, i) for i in range(100)]
+    q.drain()
+
+
+def test_listener_never_fills_pipe_wakeups(interp, path):
+
+    # One frame holds more events than a pipe has room for wakeups
+
+    count = 70000
+    handled = []
+    q = EventQueue(batch_handler=handled.extend, widget=interp, wakeup='pipe')
+
+    with EventListener(path, q, widget=interp) as listener:
+        client = EventClient(path)
+        sender = threading.Thread(target=client.send, args=(list(range(count)),))
+        sender.start()
+
+        run_until(interp, lambda: len(handled) == count, limit=100000000)
+        sender.join()
+
+        [stats] = listener.stats()['clients']
+        client.close()
+
+    assert handled == list(range(count))
+    assert stats['dropped'] == 0
+    assert stats['pending'] == 0
+    q.drain()
+
+
+def test_listener_waits_for_room(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    with EventListener(path, q, max_pending=10, widget=interp) as listener:
+        with EventClient(path) as client:
+            client.send(list(range(100)))
+
+            def stalled():
+                clients = listener.stats()['clients']
+                return clients and clients[0]['pending']
+
+            run_until(interp, stalled)
+
+            # Held back until the queue empties, without polling it
+
+            assert q.qsize() == 10
+            assert interp.call('after', 'info') == ''
+
+            run_until(interp, lambda: len(handled) == 100)
+
+            [stats] = listener.stats()['clients']
+
+    assert handled == list(range(100))
+    assert stats['dropped'] == 0
+    assert stats['pending'] == 0
+    q.drain()
+
+
+def test_listener_counts_drops(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp, maxsize=5, max_batch=1)
+
+    with EventListener(path, q, widget=interp) as listener:
+        with EventClient(path) as client:
+            client.send(list(range(20)))
+            run_until(interp, lambda: listener.stats()['events'] == 20)
+            [stats] = listener.stats()['clients']
+            run_until(interp, lambda: len(handled) == 5)
+
+    assert handled == [0, 1, 2, 3, 4]
+    assert stats['dropped'] == 15
+    assert listener.stats()['dropped'] == 15
+    q.drain()
+
+
+def test_listener_bad_frames(interp, path):
+
+    handled = []
+    q = EventQueue(handler=handled.append, widget=interp)
+
+    with EventListener(path, q, max_frame=100, widget=interp) as listener:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        sock.sendall(frame(b"not a pickle"))
+        sock.sendall(frame(b"x" * 1000))
+        with EventClient(path) as client:
+            client.put('after')
+            run_until(interp, lambda: handled)
+        sock.sendall(frame(pickle.dumps(['ok'])))
+        run_until(interp, lambda: len(handled) == 2)
+        [stats] = listener.stats()['clients']
+        sock.close()
+
+    assert sorted(handled) == ['after', 'ok']
+    assert stats['errors'] == 2
+    q.drain()
+
+
+def test_listener_closes_everything(interp, path):
+
+    q = EventQueue(handler=lambda e: None, widget=interp)
+    q.put(None)
+    run_until(interp, lambda: q.empty())
+
+    files = get_open_files()
+
+    listener = EventListener(path, q, widget=interp)
+    client = EventClient(path)
+    run_until(interp, lambda: listener.stats()['clients'])
+    listener.close()
+    client.close()
+
+    assert get_open_files() == files
+    q.drain()
+
+
+def test_listener_unknown_codec(interp, path):
+
+    with pytest.raises(ValueError):
+        EventListener(path, None, codec='morse', widget=interp)
+
+
+def test_msgpack_codec():
+
+    msgpack = pytest.importorskip('msgpack')
+
+    codec = MsgpackCodec()
+    assert codec.decode(codec.encode([1, "two", b"3"])) == [1, "two", b"3"]
@@ -0,0 +1,127 @@
+"""
+Tests for GeneratorPool and PooledGenerator.
+"""
+
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rjgtoys.tkthread import pool as pool_module
+from rjgtoys.tkthread.pool import GeneratorPool, PooledGenerator
+
+from helpers import get_open_files, interp
+
+
+def test_pool_many_sources(interp):
+
+    sources = 100
+    count = 50
+
+    handled = {}
+
+    def make_handler(i):
+        return handled.setdefault(i, []).append
+
+    with GeneratorPool(workers=4, widget=interp, chunk_size=8) as pool:
+        generators = [
+            pool.add(generator=iter(range(count)), handler=make_handler(i))
+            for i in range(sources)
+        ]
+        assert threading.active_count() < sources
+
+    assert handled == {i: list(range(count)) for i in range(sources)}
+    assert not any(g.is_alive() for g in generators)
+
+
+def test_pool_batch_handler(interp):
+
+    batches = []
+
+    with GeneratorPool(workers=1, widget=interp) as pool:
+        with PooledGenerator(generator=iter(range(10)), batch_handler=batches.append, pool=pool) as g:
+            pass
+        assert not g.is_alive()
+
+    assert [e for b in batches for e in b] == list(range(10))
+
+
+def test_pool_interleaves_fairly(interp):
+
+    handled = []
+
+    def source(name):
+        for i in range(4):
+            yield (name, i)
+
+    with GeneratorPool(workers=1, widget=interp, chunk_size=2) as pool:
+        # Don't let the worker start until both sources are ready
+        a = PooledGenerator(generator=source('a'), handler=handled.append, pool=pool, start=False)
+        b = PooledGenerator(generator=source('b'), handler=handled.append, pool=pool, start=False)
+        with pool._lock:
+            a.start()
+            b.start()
+
+    assert handled == [
+        ('a', 0), ('a', 1), ('b', 0), ('b', 1),
+        ('a', 2), ('a', 3), ('b', 2), ('b', 3)
+    ]
+
+
+def test_pool_generator_raises(interp):
+
+    handled = []
+
+    def source():
+        yield 1
+        raise ValueError("Source fails")
+
+    def bad_handler(event):
+        raise Exception("Handler fails")
+
+    with GeneratorPool(workers=2, widget=interp) as pool:
+        g = pool.add(generator=source(), handler=handled.append)
+        pool.add(generator=iter([1]), handler=bad_handler)
+        g.drain()
+        assert not g.is_alive()
+
+    assert handled == [1]
+
+
+def test_pooled_generator_checks(interp):
+
+    with GeneratorPool(workers=1, widget=interp) as pool:
+        with pytest.raises(ValueError):
+            PooledGenerator(generator=iter(()), pool=pool)
+
+        g = pool.add(generator=iter(()), handler=Mock())
+        with pytest.raises(RuntimeError):
+            g.start()
+
+    with pytest.raises(RuntimeError):
+        pool.add(generator=iter(()), handler=Mock())
+
+
+def test_pool_default(interp):
+
+    handled = []
+
+    with patch.object(pool_module, '_default_pool', None), \
+         patch('tkinter._default_root', interp):
+        with PooledGenerator(generator=iter(range(3)), handler=handled.append):
+            pass
+        pool_module._default_pool.shutdown()
+
+    assert handled == [0, 1, 2]
+
+
+def test_pool_does_not_leak_pipes(interp):
+
+    before = get_open_files()
+
+    with GeneratorPool(workers=2, widget=interp) as pool:
+        pool.add(generator=iter(range(3)), handler=Mock())
+
+    after = get_open_files()
+
+    assert before == after
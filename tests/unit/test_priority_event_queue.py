@@ -0,0 +1,124 @@
+"""
+Tests for the PriorityEventQueue
+
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rjgtoys.tkthread import PriorityEventQueue
+
+from helpers import widget, interp, run_until, mock_pipe
+
+
+@pytest.fixture
+def mock_write():
+    with patch('rjgtoys.tkthread.wakeup.os.write') as p:
+        yield p
+
+
+def test_pq_urgent_first(widget, mock_pipe, mock_write):
+
+    handled = []
+
+    q = PriorityEventQueue(handler=handled.append, widget=widget, max_batch=0)
+
+    q.put('low1', priority=2)
+    q.put('normal1', priority=1)
+    q.put_many(['urgent1', 'urgent2'])
+    q.put_nowait('low2', priority=2)
+
+    assert q.qsize() == 5
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xxxxx"):
+        q._readable(None, None)
+
+    assert handled == ['urgent1', 'urgent2', 'normal1', 'low1', 'low2']
+    widget.after_idle.assert_not_called()
+
+
+def test_pq_bad_priority(widget, mock_pipe, mock_write):
+
+    q = PriorityEventQueue(handler=Mock(), widget=widget, lanes=2)
+
+    with pytest.raises(ValueError):
+        q.put('event', priority=2)
+
+    with pytest.raises(ValueError):
+        PriorityEventQueue(handler=Mock(), widget=widget, lanes=0)
+
+
+def test_pq_starvation_guard(widget, mock_pipe, mock_write):
+
+    handled = []
+
+    q = PriorityEventQueue(handler=handled.append, widget=widget, starvation_limit=3)
+
+    q.put_many(range(10), priority=0)
+    q.put_many(['b1', 'b2'], priority=1)
+    q.put_many(['c1', 'c2'], priority=2)
+
+    handled = q._take(14)
+
+    assert handled == [0, 1, 2, 'b1', 3, 4, 5, 'c1', 6, 7, 8, 'b2', 9, 'c2']
+
+
+def test_pq_idle_lane(widget, mock_pipe, mock_write):
+
+    handled = []
+
+    q = PriorityEventQueue(handler=handled.append, widget=widget, max_batch=2, idle_lane=True)
+
+    q.put_many(['idle1', 'idle2', 'idle3'], priority=2)
+    q.put('urgent')
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xx"):
+        q._readable(None, None)
+
+    # Only the urgent event is handled directly
+
+    assert handled == ['urgent']
+    widget.after_idle.assert_called_once_with(q._idle)
+
+    q._idle()
+
+    assert handled == ['urgent', 'idle1', 'idle2']
+    assert widget.after_idle.call_count == 2
+
+    q._idle()
+
+    assert handled == ['urgent', 'idle1', 'idle2', 'idle3']
+    assert widget.after_idle.call_count == 2
+
+
+def test_pq_drain_idle_lane(widget, mock_pipe, mock_write):
+
+    handled = []
+
+    q = PriorityEventQueue(handler=handled.append, widget=widget, idle_lane=True)
+
+    q.put('idle', priority=2)
+    q.put('normal', priority=1)
+
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    assert handled == ['normal', 'idle']
+
+
+def test_pq_edge_triggered_idle_does_not_spin(interp):
+
+    handled = []
+
+    with PriorityEventQueue(
+        handler=handled.append, widget=interp, idle_lane=True,
+        edge_triggered=True, max_batch=0
+        ) as q:
+        q.put_many(range(100), priority=2)
+        q.put('urgent')
+        loops = run_until(interp, lambda: len(handled) == 101)
+
+    assert handled[0] == 'urgent'
+    assert handled[1:] == list(range(100))
+    assert loops < 10
@@ -0,0 +1,197 @@
+"""
+Tests for ProcessEventGenerator.
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from rjgtoys.tkthread.process import ProcessEventGenerator
+
+from helpers import get_open_files, interp, run_until
+
+
+# Generators must be defined at the top level, so that the child can import them
+
+def numbers(count, pid=False):
+    for i in range(count):
+        yield (i, os.getpid()) if pid else i
+
+
+def failing(count):
+    yield from range(count)
+    raise ValueError("Generator fails")
+
+
+def crashing():
+    yield 1
+    os._exit(3)
+
+
+def forever():
+    i = 0
+    while True:
+        yield i
+        i += 1
+
+
+def _refuse():
+    raise AttributeError("Cannot be unpickled")
+
+
+class Unloadable:
+    """Pickles in the child, but fails to unpickle in the parent."""
+
+    def __reduce__(self):
+        return (_refuse, ())
+
+
+def unloadable():
+    yield 1
+    while True:
+        yield Unloadable()
+
+
+def unpicklable():
+    yield 1
+    yield threading.Lock()
+
+
+def test_process_generator(interp):
+
+    handled = []
+
+    with ProcessEventGenerator(
+        generator=numbers, args=(5,), kwargs=dict(pid=True),
+        handler=handled.append, widget=interp
+        ) as g:
+        run_until(interp, lambda: len(handled) == 5, limit=10000000)
+
+    assert [i for (i, _) in handled] == list(range(5))
+    assert {pid for (_, pid) in handled} != {os.getpid()}
+    assert not g.is_alive()
+
+
+def test_process_batches(interp):
+
+    batches = []
+
+    with ProcessEventGenerator(
+        generator=numbers, args=(100,), batch_handler=batches.append,
+        widget=interp, chunk_size=10
+        ) as g:
+        pass
+
+    assert [len(b) for b in batches] == [10] * 10
+    assert sum(batches, []) == list(range(100))
+
+
+def test_process_backpressure(interp):
+
+    handled = []
+
+    g = ProcessEventGenerator(
+        generator=forever, handler=handled.append, widget=interp, maxsize=4, chunk_size=16
+        )
+
+    # The child cannot get more than maxsize values ahead
+
+    time.sleep(0.5)
+    sent = []
+    while g._events.poll():
+        sent.extend(g._events.recv()[1])
+    assert sent == [0, 1, 2, 3]
+
+    # Acknowledging them lets it continue
+
+    g._acks.send(4)
+    g._receive()
+    assert handled == [4, 5, 6, 7]
+
+    g.cancel()
+    assert not g.is_alive()
+
+
+def test_process_exception(interp):
+
+    handled = []
+
+    g = ProcessEventGenerator(generator=failing, args=(3,), handler=handled.append, widget=interp)
+
+    with pytest.raises(ValueError) as e:
+        g.drain()
+
+    assert handled == [0, 1, 2]
+    assert "Generator fails" in str(e.value.__cause__)
+
+    # The exception is raised only once
+    g.drain()
+
+
+def test_process_child_exits(interp):
+
+    g = ProcessEventGenerator(generator=crashing, handler=lambda e: None, widget=interp, chunk_size=1)
+
+    with pytest.raises(RuntimeError, match="exit code 3"):
+        g.drain()
+
+
+def test_process_unpickling_fails(interp):
+
+    handled = []
+
+    g = ProcessEventGenerator(
+        generator=unloadable, handler=handled.append, widget=interp,
+        chunk_size=1, maxsize=2
+    )
+
+    run_until(interp, lambda: not g.is_alive(), limit=10000000)
+
+    with pytest.raises(AttributeError, match="Cannot be unpickled"):
+        g.drain()
+
+    assert handled == [1]
+    assert not g.is_alive()
+
+
+def test_process_pickling_fails(interp):
+
+    handled = []
+
+    g = ProcessEventGenerator(
+        generator=unpicklable, handler=handled.append, widget=interp,
+        chunk_size=1
+    )
+
+    run_until(interp, lambda: not g.is_alive(), limit=10000000)
+
+    with pytest.raises(TypeError, match="pickle"):
+        g.drain()
+
+    assert handled == [1]
+
+
+def test_process_drain_timeout(interp):
+
+    g = ProcessEventGenerator(generator=forever, handler=lambda e: None, widget=interp, maxsize=10)
+    g.drain(timeout=0.1)
+
+    assert not g.is_alive()
+
+
+def test_process_files_closed(interp):
+
+    before = get_open_files()
+
+    with ProcessEventGenerator(generator=numbers, args=(3,), handler=lambda e: None, widget=interp):
+        pass
+
+    assert get_open_files() <= before
+
+
+def test_process_needs_one_handler(interp):
+
+    with pytest.raises(ValueError):
+        ProcessEventGenerator(generator=numbers, widget=interp, start=False)
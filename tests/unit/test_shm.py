@@ -0,0 +1,180 @@
+"""
+Tests for SharedFrameQueue.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+
+import pytest
+
+from rjgtoys.tkthread.shm import SharedFrameQueue
+
+from helpers import get_open_files, interp, run_until
+
+
+def produce(writer, count):
+    """Runs in a child process."""
+
+    for i in range(count):
+        with writer.reserve() as slot:
+            slot.data[:4] = i.to_bytes(4, 'little')
+            slot.commit(4)
+    writer.close()
+
+
+def test_shm_thread_producer(interp):
+
+    received = []
+
+    def handler(frame):
+        assert isinstance(frame.data, memoryview)
+        received.append(bytes(frame.data))
+
+    with SharedFrameQueue(handler=handler, slot_size=16, slots=2, widget=interp) as q:
+        writer = q.writer()
+
+        def producer():
+            for i in range(10):
+                writer.put(b"frame %d" % (i,))
+
+        t = threading.Thread(target=producer)
+        t.start()
+        run_until(interp, lambda: len(received) == 10, limit=10000000)
+        t.join()
+
+    assert received == [b"frame %d" % (i,) for i in range(10)]
+
+
+def test_shm_process_producer(interp):
+
+    received = []
+    context = multiprocessing.get_context('spawn')
+
+    with SharedFrameQueue(
+        handler=lambda f: received.append(int.from_bytes(f.data, 'little')),
+        slot_size=4, slots=3, widget=interp, context=context
+        ) as q:
+        p = context.Process(target=produce, args=(q.writer(), 20))
+        p.start()
+        run_until(interp, lambda: len(received) == 20, limit=100000000)
+        p.join()
+
+    assert received == list(range(20))
+    assert p.exitcode == 0
+
+
+def test_shm_zero_copy(interp):
+
+    received = []
+
+    def handler(frame):
+        frame.retain()
+        received.append(frame)
+
+    with SharedFrameQueue(handler=handler, slot_size=8, slots=2, widget=interp) as q:
+        writer = q.writer()
+        with writer.reserve() as slot:
+            slot.data[:] = b"abcdefgh"
+            slot.commit(3)
+        run_until(interp, lambda: received)
+
+        frame = received[0]
+        assert frame.data.nbytes == 3
+
+        # The view is of the shared memory itself
+
+        base = q._shm.buf
+        assert frame.data.obj is base.obj
+        assert bytes(frame.data) == b"abc"
+        frame.release()
+
+
+def test_shm_retain_and_backpressure(interp):
+
+    retained = []
+
+    def handler(frame):
+        frame.retain()
+        retained.append(frame)
+
+    with SharedFrameQueue(handler=handler, slot_size=4, slots=2, widget=interp) as q:
+        writer = q.writer()
+        writer.put(b"a")
+        writer.put(b"b")
+        run_until(interp, lambda: len(retained) == 2)
+
+        # Both slots are held by the handler
+
+        with pytest.raises(queue.Full):
+            writer.put(b"c", block=False)
+
+        # Slots are returned in ring order
+
+        retained[1].release()
+        with pytest.raises(queue.Full):
+            writer.put(b"c", block=False)
+
+        assert bytes(retained[0].data) == b"a"
+        retained[0].release()
+        writer.put(b"c", block=False)
+        writer.put(b"d", block=False)
+        run_until(interp, lambda: len(retained) == 4)
+
+        assert [bytes(f.data) for f in retained[2:]] == [b"c", b"d"]
+
+    # drain released the retained frames
+
+    with pytest.raises(ValueError):
+        bytes(retained[2].data)
+
+
+def test_shm_abandon(interp):
+
+    received = []
+
+    with SharedFrameQueue(handler=received.append, slot_size=4, slots=1, widget=interp) as q:
+        writer = q.writer()
+        with pytest.raises(RuntimeError):
+            with writer.reserve() as slot:
+                raise RuntimeError("Producer fails")
+        run_until(interp, lambda: not q._conn.poll())
+
+        writer.put(b"ok", timeout=1)
+        run_until(interp, lambda: received)
+
+    assert len(received) == 1
+
+
+def test_shm_put_too_large(interp):
+
+    with SharedFrameQueue(handler=lambda f: None, slot_size=4, widget=interp) as q:
+        with pytest.raises(ValueError):
+            q.writer().put(b"too large")
+
+
+def test_shm_handler_exception(interp):
+
+    def handler(frame):
+        raise ValueError("Handler fails")
+
+    with SharedFrameQueue(handler=handler, slot_size=4, slots=1, widget=interp) as q:
+        writer = q.writer()
+        writer.put(b"1")
+        run_until(interp, lambda: not q._conn.poll())
+        # The slot was still released
+        writer.put(b"2", block=False)
+
+
+def test_shm_drain_releases_resources(interp):
+
+    before = get_open_files()
+
+    q = SharedFrameQueue(handler=lambda f: None, slot_size=1024, widget=interp)
+    name = q._shm.name
+    q.writer().put(b"x")
+    q.drain()
+
+    assert not os.path.exists('/dev/shm/' + name)
+    assert get_open_files() <= before
@@ -0,0 +1,130 @@
+"""
+Tests for the instrumentation of event queues
+
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rjgtoys.tkthread import (
+    EventQueue, DequeEventQueue, ConflatingEventQueue, PriorityEventQueue
+)
+
+from helpers import widget, interp, run_until, mock_pipe, clock, clock_target
+
+
+@pytest.fixture
+def mock_write():
+    with patch('rjgtoys.tkthread.wakeup.os.write') as p:
+        yield p
+
+
+@pytest.mark.parametrize('cls', [EventQueue, DequeEventQueue, PriorityEventQueue])
+def test_stats(widget, mock_pipe, mock_write, clock, cls):
+
+    handled = []
+
+    def handle_event(event):
+        handled.append(event)
+        clock.now += 0.001
+
+    q = cls(handler=handle_event, widget=widget, max_batch=0, instrument=True)
+
+    q.put('event1')
+    clock.now += 0.002
+    q.put_many(['event2', 'event3'])
+    clock.now += 0.003
+
+    with patch('rjgtoys.tkthread.wakeup.os.read', return_value=b"xxx"):
+        q._readable(None, None)
+
+    # The handler gets the events, not the timestamps
+
+    assert handled == ['event1', 'event2', 'event3']
+
+    stats = q.stats()
+
+    assert stats['events'] == 3
+    assert stats['wakeups'] == 1
+    assert stats['events_per_wakeup'] == 3
+    assert stats['depth'] == 0
+    assert stats['max_depth'] == 3
+    assert stats['handler_time'] == pytest.approx(0.003)
+
+    latency = stats['latency']
+
+    assert latency['max'] == pytest.approx(0.005)
+    assert latency['mean'] == pytest.approx((0.005 + 0.003 + 0.003) / 3)
+    assert latency['p50'] == pytest.approx(0.005)
+    assert sum(count for (bound, count) in latency['histogram']) == 3
+
+
+def test_stats_conflated(widget, mock_pipe, mock_write, clock):
+
+    handled = []
+
+    q = ConflatingEventQueue(handler=handled.append, widget=widget, instrument=True)
+
+    q.put(('a', 1))
+    q.put(('a', 2))
+
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    assert handled == [('a', 2)]
+    assert q.stats()['conflated'] == 1
+    assert q.stats()['events'] == 1
+
+
+def test_stats_not_instrumented(widget, mock_pipe):
+
+    q = EventQueue(handler=Mock(), widget=widget)
+
+    with pytest.raises(RuntimeError):
+        q.stats()
+
+
+def test_stats_callback(widget, mock_pipe, mock_write):
+
+    callback = Mock()
+
+    q = EventQueue(handler=Mock(), widget=widget, stats_callback=callback, stats_interval=0.5)
+
+    widget.after.assert_called_once_with(500, q._report_stats)
+
+    q._report_stats()
+
+    assert widget.after.call_count == 2
+    callback.assert_called_once()
+    assert callback.call_args[0][0]['events'] == 0
+
+    # A failing callback is logged, and does not stop the reports
+
+    callback.side_effect = Exception("Callback fails")
+    q._report_stats()
+    assert widget.after.call_count == 3
+
+    callback.side_effect = None
+    with patch('rjgtoys.tkthread.wakeup.os.close'):
+        q.drain()
+
+    widget.after_cancel.assert_called_once_with(widget.after.return_value)
+    assert callback.call_count == 3
+
+
+def test_stats_real_loop(interp):
+
+    handled = []
+
+    with EventQueue(
+        handler=handled.append, widget=interp, max_batch=0,
+        edge_triggered=True, instrument=True
+        ) as q:
+        q.put_many(range(1000))
+        run_until(interp, lambda: len(handled) == 1000)
+        stats = q.stats()
+
+    assert stats['events'] == 1000
+    assert stats['wakeups'] == 1
+    assert 0 < stats['latency']['p50'] <= stats['latency']['p99'] <= stats['latency']['max']
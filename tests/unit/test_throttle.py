@@ -0,0 +1,107 @@
+"""
+Tests for Throttle, and throttled EventQueues
+
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from rjgtoys.tkthread import Throttle, EventQueue
+
+from helpers import widget, interp, run_until, clock
+
+
+@pytest.fixture
+def clock_target():
+    return 'rjgtoys.tkthread.time.monotonic'
+
+
+def test_throttle_trailing_edge(widget, clock):
+
+    handler = Mock()
+
+    t = Throttle(handler, 10, widget=widget)
+
+    t('event1')
+    handler.assert_called_once_with('event1')
+
+    clock.now += 0.03
+    t('event2')
+    t('event3')
+
+    # Held back, with a timer for the rest of the interval
+
+    handler.assert_called_once_with('event1')
+    widget.after.assert_called_once_with(70, t._trailing, None)
+    assert t.suppressed == 1
+
+    clock.now += 0.07
+    t._trailing(None)
+
+    handler.assert_called_with('event3')
+    assert handler.call_count == 2
+
+    # Long enough after the last delivery to go straight through
+
+    clock.now += 0.2
+    t('event4')
+    handler.assert_called_with('event4')
+    assert widget.after.call_count == 1
+
+
+def test_throttle_per_key(widget, clock):
+
+    handled = []
+
+    t = Throttle(handled.append, 10, widget=widget, key=lambda e: e[0])
+
+    t(('a', 1))
+    t(('b', 1))
+    t(('a', 2))
+
+    assert handled == [('a', 1), ('b', 1)]
+    widget.after.assert_called_once_with(100, t._trailing, 'a')
+
+    t.flush()
+
+    widget.after_cancel.assert_called_once_with(widget.after.return_value)
+    assert handled == [('a', 1), ('b', 1), ('a', 2)]
+
+
+def test_throttle_handler_raises(widget, clock):
+
+    handler = Mock(side_effect=Exception("Handler fails"))
+
+    t = Throttle(handler, 10, widget=widget)
+    t('event1')
+    t('event2')
+    t.flush()
+
+    assert handler.call_count == 2
+
+
+def test_throttle_bad_rate(widget):
+
+    with pytest.raises(ValueError):
+        Throttle(Mock(), 0, widget=widget)
+
+
+def test_eq_max_rate(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, max_batch=0, max_rate=20) as q:
+        for i in range(1000):
+            q.put(i)
+        run_until(interp, lambda: handled)
+
+    # The first event goes straight through, and drain() delivers the last
+
+    assert handled == [0, 999]
+
+
+def test_eq_max_rate_needs_handler(widget):
+
+    with pytest.raises(ValueError):
+        EventQueue(batch_handler=Mock(), widget=widget, max_rate=10)
@@ -0,0 +1,119 @@
+"""
+Tests for TkEventLoop.
+"""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from rjgtoys.tkthread.tkloop import TkEventLoop
+
+from helpers import get_open_files, interp, run_until
+
+
+@pytest.fixture
+def loop(interp):
+    loop = TkEventLoop(widget=interp)
+    yield loop
+    loop.close()
+
+
+def test_tkloop_task_in_tk_loop(interp, loop):
+
+    results = []
+
+    async def work():
+        await asyncio.sleep(0)
+        results.append(asyncio.get_running_loop())
+        await asyncio.sleep(0.01)
+        results.append(threading.current_thread())
+
+    loop.create_task(work())
+    run_until(interp, lambda: len(results) == 2, limit=10000000)
+
+    assert results == [loop, threading.main_thread()]
+    assert not loop.is_running()
+
+
+def test_tkloop_run_until_complete(loop):
+
+    async def work(a, b):
+        await asyncio.sleep(0.01)
+        return a + b
+
+    assert loop.run_until_complete(work(1, 2)) == 3
+
+
+def test_tkloop_idle_has_no_timer(interp, loop):
+
+    async def work():
+        await asyncio.sleep(0)
+
+    loop.run_until_complete(work())
+
+    assert loop._timer is None
+    assert interp.tk.call('after', 'info') == ''
+
+
+def test_tkloop_call_soon_threadsafe(interp, loop):
+
+    results = []
+
+    def worker():
+        loop.call_soon_threadsafe(results.append, threading.current_thread())
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    run_until(interp, lambda: results, limit=10000000)
+
+    assert results == [t]
+
+
+def test_tkloop_reader(interp, loop):
+
+    r, w = os.pipe()
+    received = []
+
+    def readable():
+        received.append(os.read(r, 100))
+
+    loop.add_reader(r, readable)
+    os.write(w, b"hello")
+    run_until(interp, lambda: received, limit=10000000)
+
+    assert received == [b"hello"]
+
+    assert loop.remove_reader(r)
+    os.close(r)
+    os.close(w)
+
+
+def test_tkloop_stream(loop):
+
+    async def exchange():
+        r, w = os.pipe()
+        reader = asyncio.StreamReader()
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(r, 'rb')
+        )
+        os.write(w, b"one\ntwo\n")
+        os.close(w)
+        return [line async for line in reader]
+
+    assert loop.run_until_complete(exchange()) == [b"one\n", b"two\n"]
+
+
+def test_tkloop_close(interp):
+
+    before = get_open_files()
+
+    loop = TkEventLoop(widget=interp)
+    loop.call_later(10, print)
+    loop.close()
+
+    assert get_open_files() == before
+    assert interp.tk.call('after', 'info') == ''
@@ -0,0 +1,137 @@
+"""
+Tests for FrameSink.
+"""
+
+import threading
+from unittest.mock import Mock
+
+from rjgtoys.tkthread.video import FrameSink, rgb_to_ppm
+
+from helpers import interp, run_until
+
+
+def test_rgb_to_ppm():
+
+    assert rgb_to_ppm(2, 1, b"\x01\x02\x03\x04\x05\x06") == b"P6 2 1 255\n\x01\x02\x03\x04\x05\x06"
+
+
+class FakeArray:
+    shape = (1, 2, 3)
+
+    def tobytes(self):
+        return b"abcdef"
+
+
+def test_sink_default_conversion(interp):
+
+    images = [Mock(), Mock()]
+
+    with FrameSink(widget=interp, images=images) as sink:
+        sink.put(FakeArray())
+        run_until(interp, lambda: sink.displayed == 1)
+        sink.put((2, 1, b"abcdef"))
+        run_until(interp, lambda: sink.displayed == 2)
+        sink.put(b"raw data")
+        run_until(interp, lambda: sink.displayed == 3)
+
+    loaded = [c.kwargs['data'] for i in images for c in i.configure.call_args_list]
+    assert loaded == [b"P6 2 1 255\nabcdef", b"P6 2 1 255\nabcdef", b"raw data"]
+
+
+def test_sink_double_buffered(interp):
+
+    images = [Mock(name='a'), Mock(name='b')]
+    label = Mock()
+
+    with FrameSink(label, widget=interp, images=images) as sink:
+        sink.put(b"1")
+        run_until(interp, lambda: sink.displayed == 1)
+        assert sink.image is images[1]
+        images[1].configure.assert_called_once_with(data=b"1")
+        label.configure.assert_called_once_with(image=images[1])
+
+        sink.put(b"2")
+        run_until(interp, lambda: sink.displayed == 2)
+        assert sink.image is images[0]
+        label.configure.assert_called_with(image=images[0])
+
+
+def test_sink_canvas_item(interp):
+
+    images = [Mock(), Mock()]
+    canvas = Mock()
+
+    with FrameSink(canvas, item=7, widget=interp, images=images) as sink:
+        sink.put(b"1")
+        run_until(interp, lambda: sink.displayed == 1)
+
+    canvas.itemconfigure.assert_called_once_with(7, image=images[1])
+
+
+def test_sink_drops_superseded_frames(interp):
+
+    image = Mock()
+
+    with FrameSink(widget=interp, images=[image]) as sink:
+        for i in range(10):
+            sink.put(b"%d" % (i,))
+        run_until(interp, lambda: sink.displayed == 1)
+
+    image.configure.assert_called_once_with(data=b"9")
+    assert sink.stats() == dict(received=10, displayed=1, dropped=9, convert_errors=0, fps=0.0)
+
+
+def test_sink_converts_in_producer_thread(interp):
+
+    where = []
+
+    def convert(frame):
+        where.append(threading.current_thread())
+        return frame
+
+    with FrameSink(widget=interp, images=[Mock()], convert=convert) as sink:
+        t = threading.Thread(target=sink.put, args=(b"1",))
+        t.start()
+        t.join()
+        run_until(interp, lambda: sink.displayed == 1)
+
+    assert where == [t]
+
+
+def test_sink_convert_error(interp):
+
+    def convert(frame):
+        raise ValueError("Bad frame")
+
+    with FrameSink(widget=interp, images=[Mock()], convert=convert) as sink:
+        sink.put(b"1")
+
+    assert sink.convert_errors == 1
+    assert sink.displayed == 0
+
+
+def test_sink_fps(interp):
+
+    with FrameSink(widget=interp, images=[Mock()]) as sink:
+        sink._shown_at.extend([10.0, 10.5, 11.0])
+        assert sink.fps == 2.0
+
+
+def test_sink_stats_callback(interp):
+
+    reports = []
+
+    with FrameSink(widget=interp, images=[Mock()], stats_callback=reports.append, stats_interval=0.01) as sink:
+        sink.put(b"1")
+        run_until(interp, lambda: reports, limit=10000000)
+
+    assert reports[-1]['displayed'] == 1
+
+
+def test_sink_put_after_close(interp):
+
+    sink = FrameSink(widget=interp, images=[Mock()])
+    sink.close()
+    sink.put(b"1")
+
+    assert sink.received == 0
@@ -0,0 +1,229 @@
+"""
+Tests for the shared WakeupHub.
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from rjgtoys.tkthread import EventQueue, DequeEventQueue
+from rjgtoys.tkthread.wakeup import WakeupHub, available_backends, default_backend, make_wakeup
+
+from helpers import get_open_files, interp, run_until
+
+
+class Client:
+    """A minimal hub client that records its calls."""
+
+    def __init__(self, hub, limit=None):
+        self.hub = hub
+        self.limit = limit
+        self.consumed = []
+        hub.register(self)
+
+    def _hub_ready(self):
+        self.consumed.append(self.hub.consume(self, self.limit or 1000))
+
+
+def test_hub_shared_by_queues(interp):
+
+    # Let Tcl create any files its notifier needs before counting
+
+    handled = []
+    with EventQueue(handler=handled.append, widget=interp, shared_wakeup=True) as q:
+        q.put(None)
+        run_until(interp, lambda: handled)
+
+    before = get_open_files()
+    handled = []
+
+    queues = [
+        EventQueue(handler=handled.append, widget=interp, shared_wakeup=True)
+        for _ in range(100)
+    ]
+
+    hub = WakeupHub.for_widget(interp)
+    assert len(hub) == 100
+
+    # Only one wakeup channel for all of them
+
+    assert len(get_open_files() - before) == (1 if default_backend() == 'eventfd' else 2)
+
+    for i, q in enumerate(queues):
+        q.put(i)
+    run_until(interp, lambda: len(handled) == 100)
+
+    assert sorted(handled) == list(range(100))
+
+    for q in queues:
+        q.drain()
+
+    assert get_open_files() == before
+    assert WakeupHub._hubs.get(interp.tk) is None
+
+
+def test_hub_calls_only_ready_clients(interp):
+
+    hub = WakeupHub.for_widget(interp)
+    clients = [Client(hub) for _ in range(10)]
+
+    hub.signal(clients[3], 2)
+    hub.signal(clients[7])
+    run_until(interp, lambda: clients[3].consumed and clients[7].consumed)
+
+    assert [c.consumed for c in clients] == [[], [], [], [2], [], [], [], [1], [], []]
+
+    for c in clients:
+        hub.unregister(c)
+
+
+def test_hub_recalls_client_with_leftovers(interp):
+
+    hub = WakeupHub.for_widget(interp)
+    client = Client(hub, limit=2)
+
+    hub.signal(client, 5)
+    run_until(interp, lambda: sum(client.consumed) == 5)
+
+    assert client.consumed == [2, 2, 1]
+
+    hub.unregister(client)
+
+
+def test_hub_unregistered_client_not_called(interp):
+
+    hub = WakeupHub.for_widget(interp)
+    keep = Client(hub)
+    gone = Client(hub)
+
+    hub.signal(gone)
+    hub.unregister(gone)
+    hub.signal(keep)
+    run_until(interp, lambda: keep.consumed)
+
+    assert gone.consumed == []
+    hub.unregister(keep)
+
+
+def test_hub_level_triggered_batches(interp):
+
+    batches = []
+
+    with EventQueue(batch_handler=batches.append, widget=interp, max_batch=3, shared_wakeup=True) as q:
+        q.put_many(range(7))
+        run_until(interp, lambda: sum(map(len, batches)) == 7)
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_hub_edge_triggered(interp):
+
+    handled = []
+
+    with DequeEventQueue(
+        handler=handled.append, widget=interp, max_batch=0,
+        edge_triggered=True, shared_wakeup=True
+        ) as q:
+
+        def producer():
+            for i in range(1000):
+                q.put(i)
+
+        t = threading.Thread(target=producer)
+        t.start()
+        t.join()
+        run_until(interp, lambda: len(handled) == 1000, limit=10000000)
+
+    assert handled == list(range(1000))
+
+
+def test_hub_time_budget(interp):
+
+    handled = []
+
+    with EventQueue(handler=handled.append, widget=interp, time_budget=0.01, shared_wakeup=True) as q:
+        q.put_many(range(50))
+        run_until(interp, lambda: len(handled) == 50, limit=10000000)
+
+    assert handled == list(range(50))
+
+
+def test_hub_drain_handles_waiting(interp):
+
+    handled = []
+
+    q = EventQueue(handler=handled.append, widget=interp, shared_wakeup=True)
+    q.put_many(range(5))
+    q.drain()
+
+    assert handled == list(range(5))
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_backend_counts_wakeups(backend):
+
+    channel = make_wakeup(backend)
+
+    channel.signal()
+    channel.signal(4)
+    assert channel.consume(2) == 2
+    assert channel.consume(100) == 3
+
+    channel.close()
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_backend_one_at_a_time(backend):
+
+    channel = make_wakeup(backend, one_at_a_time=True)
+
+    channel.signal(3)
+    assert channel.consume(1) == 1
+    assert channel.consume(1) == 1
+    assert channel.consume(5) == 1
+
+    channel.close()
+
+
+@pytest.mark.skipif('eventfd' not in available_backends(), reason="No eventfd")
+def test_eventfd_semaphore_for_single_events(interp):
+
+    single = EventQueue(handler=lambda e: None, widget=interp, wakeup='eventfd')
+    batched = EventQueue(handler=lambda e: None, widget=interp, wakeup='eventfd', max_batch=0)
+
+    assert single._channel._semaphore
+    assert not batched._channel._semaphore
+
+    # A backlog is consumed one wakeup per read, with nothing written back
+
+    single.put_many(range(3))
+    with patch('rjgtoys.tkthread.wakeup.os.eventfd_write') as write:
+        assert single._consume(1) == 1
+        write.assert_not_called()
+
+    single.drain()
+    batched.drain()
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_backend_queue(interp, backend):
+
+    batches = []
+
+    with EventQueue(batch_handler=batches.append, widget=interp, max_batch=2, wakeup=backend) as q:
+        q.put_many(range(5))
+        run_until(interp, lambda: sum(map(len, batches)) == 5)
+
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_backend_unknown():
+
+    with pytest.raises(ValueError):
+        make_wakeup('carrier-pigeon')
+
+
+def test_default_backend():
+
+    assert default_backend() in available_backends()